@@ -1,28 +1,148 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import re
 from textwrap import dedent
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from app.agents.base import LLMJsonAgent
+from app.agents.prompt import PromptPacker, compact_openapi, compact_text
+from app.config import get_settings
+from app.generation.api_tests import count_operations, parse_openapi_spec, partition_openapi_spec
 from app.schemas.pipeline import AnalystPlan
+from app.utils.logging import configure_logging
+from app.utils.tracing import span
+
+logger = configure_logging()
 
 SYSTEM_PROMPT = """
 You are Requirements Analyst for testing. Return compact JSON with keys: features (list), flows (list), entities (list), constraints (list), risks (list), coverage_matrix (dict from area->list of cases), gaps (list of missing areas). No prose outside JSON.
 """
 
+PLAN_LIST_KEYS = ["features", "flows", "entities", "constraints", "risks", "gaps"]
+
+
+def _normalize_plan(data: Dict[str, Any]) -> AnalystPlan:
+    for key in PLAN_LIST_KEYS:
+        if key in data:
+            data[key] = [str(item) for item in data.get(key, [])]
+    if "coverage_matrix" in data:
+        data["coverage_matrix"] = {str(k): [str(x) for x in v] for k, v in data["coverage_matrix"].items()}
+    return AnalystPlan.parse_obj(data)
+
+
+def _norm(value: str) -> str:
+    return re.sub(r"\s+", " ", value).strip().lower()
+
+
+def _union(values: Iterable[str], exclude: Iterable[str] = ()) -> List[str]:
+    seen = {_norm(item) for item in exclude}
+    merged: List[str] = []
+    for value in values:
+        key = _norm(value)
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(value)
+    return merged
+
+
+def merge_plans(plans: List[AnalystPlan]) -> AnalystPlan:
+    coverage: Dict[str, List[str]] = {}
+    area_names: Dict[str, str] = {}
+    for plan in plans:
+        for area, cases in plan.coverage_matrix.items():
+            name = area_names.setdefault(_norm(area), area)
+            coverage[name] = _union([*coverage.get(name, []), *cases])
+    features = _union(feature for plan in plans for feature in plan.features)
+    # a gap reported by one shard is not a gap if another shard covers it
+    gaps = _union((gap for plan in plans for gap in plan.gaps), exclude=[*coverage, *features])
+    return AnalystPlan(
+        features=features,
+        flows=_union(flow for plan in plans for flow in plan.flows),
+        entities=_union(entity for plan in plans for entity in plan.entities),
+        constraints=_union(item for plan in plans for item in plan.constraints),
+        risks=_union(risk for plan in plans for risk in plan.risks),
+        coverage_matrix=coverage,
+        gaps=gaps,
+    )
+
 
 class AnalystAgent(LLMJsonAgent):
-    async def analyze(self, requirements: str, openapi: Optional[str] = None, model: Optional[str] = None) -> AnalystPlan:
+    name = "analyst"
+
+    async def analyze(
+        self,
+        requirements: str,
+        openapi: Optional[str] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        sharded: Optional[bool] = None,
+        known_areas: Optional[List[str]] = None,
+    ) -> AnalystPlan:
+        if openapi and sharded is not False:
+            settings = get_settings()
+            spec = parse_openapi_spec(openapi)
+            if sharded or count_operations(spec) > settings.analyst_shard_threshold:
+                return await self.analyze_sharded(
+                    requirements, spec, model=model, use_cache=use_cache, known_areas=known_areas
+                )
+        return await self._analyze(requirements, openapi, model=model, use_cache=use_cache, known_areas=known_areas)
+
+    async def analyze_sharded(
+        self,
+        requirements: str,
+        spec: Dict[str, Any],
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        known_areas: Optional[List[str]] = None,
+    ) -> AnalystPlan:
+        settings = get_settings()
+        shards = partition_openapi_spec(spec, by=settings.analyst_shard_by, max_operations=settings.analyst_shard_size)
+        if len(shards) <= 1:
+            return await self._analyze(
+                requirements, json.dumps(spec), model=model, use_cache=use_cache, known_areas=known_areas
+            )
+        logger.info("Analyzing OpenAPI spec in %s shards: %s", len(shards), ", ".join(shards))
+        gate = asyncio.Semaphore(max(1, settings.analyst_shard_concurrency))
+
+        async def analyze_shard(name: str, shard: Dict[str, Any]) -> AnalystPlan:
+            async with gate:
+                return await self._analyze(
+                    requirements,
+                    json.dumps(shard),
+                    model=model,
+                    use_cache=use_cache,
+                    focus=name,
+                    known_areas=known_areas,
+                )
+
+        plans = await asyncio.gather(*(analyze_shard(name, shard) for name, shard in shards.items()))
+        return merge_plans(list(plans))
+
+    async def _analyze(
+        self,
+        requirements: str,
+        openapi: Optional[str],
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        focus: Optional[str] = None,
+        known_areas: Optional[List[str]] = None,
+    ) -> AnalystPlan:
+        packer = PromptPacker(self.name)
+        packer.add("requirements", requirements, compact_text)
+        packer.add("openapi", openapi or "", compact_openapi)
+        sections = packer.pack()
+        scope = f"This OpenAPI excerpt covers only the '{focus}' area of a larger API; analyze that area.\n" if focus else ""
+        if known_areas:
+            # stable area names let incremental runs carry unchanged test cases over
+            scope += f"Reuse these existing coverage area names where they still apply: {', '.join(known_areas)}\n"
         prompt = dedent(
             f"""
             Analyze requirements and/or OpenAPI to produce structured intent map for testing.
-            Requirements:\n{requirements}\n---\nOpenAPI (if any):\n{openapi or ''}
+            {scope}Requirements:\n{sections['requirements']}\n---\nOpenAPI (if any):\n{sections['openapi']}
             """
         )
-        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT)
-        for key in ["features", "flows", "entities", "constraints", "risks", "gaps"]:
-            if key in data:
-                data[key] = [str(item) for item in data.get(key, [])]
-        if "coverage_matrix" in data:
-            data["coverage_matrix"] = {str(k): [str(x) for x in v] for k, v in data["coverage_matrix"].items()}
-        return AnalystPlan.parse_obj(data)
+        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT, use_cache=use_cache)
+        with span("validate", model="AnalystPlan"):
+            return _normalize_plan(data)
@@ -1,30 +1,132 @@
 from __future__ import annotations
 
+import asyncio
+import json
 from textwrap import dedent
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pydantic import ValidationError
 
 from app.agents.base import LLMJsonAgent
-from app.schemas.pipeline import AnalystPlan, ManualBundle, AutotestBundle
+from app.agents.prompt import PromptPacker, compact_json
+from app.config import get_settings
+from app.schemas.pipeline import AnalystPlan, AutotestBundle, AutotestCase
+from app.utils.errors import InvalidLLMOutput
+from app.utils.logging import configure_logging
+from app.utils.tracing import span
+
+logger = configure_logging()
+
+KINDS = ("ui", "api")
+
+SYSTEM_PROMPTS = {
+    "ui": """
+You are a QA automation engineer writing Playwright UI tests. Return JSON with key 'ui': list of tests {name,steps,assertions,target,negative(bool)}. Steps are user actions in the browser. Include positive and negative cases.
+""",
+    "api": """
+You are a QA automation engineer writing pytest+httpx API tests. Return JSON with key 'api': list of tests {name,steps,assertions,target,negative(bool)}. Steps are HTTP calls, target is the endpoint. Include positive and negative cases.
+""",
+}
+
+# the plan sections each half actually needs
+PLAN_SECTIONS = {
+    "ui": {"features", "flows", "risks", "coverage_matrix"},
+    "api": {"features", "entities", "constraints", "risks", "coverage_matrix"},
+}
 
-SYSTEM_PROMPT = """
-You are a QA automation engineer. Return JSON with keys 'ui' and 'api', each list of tests {name,steps,assertions,target,negative(bool)}. Use Playwright for UI targets and pytest+httpx for API targets. Include positive and negative cases.
-"""
+
+def _normalize_test(test: Dict[str, Any], kind: Optional[str] = None) -> Dict[str, Any]:
+    test["name"] = str(test.get("name", ""))
+    test["steps"] = [str(s) for s in test.get("steps", [])]
+    test["assertions"] = [str(a) for a in test.get("assertions", [])]
+    test["target"] = str(test.get("target", kind or ""))
+    return test
 
 
 class AutotestsAgent(LLMJsonAgent):
-    async def generate(self, plan: AnalystPlan, manual: ManualBundle, model: Optional[str] = None) -> AutotestBundle:
+    name = "autotests"
+
+    async def generate(
+        self,
+        plan: AnalystPlan,
+        case_count: int,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        on_case: Optional[Callable[[str, AutotestCase], Awaitable[None]]] = None,
+        kinds: Iterable[str] = KINDS,
+    ) -> AutotestBundle:
+        kinds = list(kinds)
+        halves = await asyncio.gather(
+            *(
+                self.generate_half(kind, plan, case_count, model=model, use_cache=use_cache, on_case=on_case)
+                for kind in kinds
+            ),
+            return_exceptions=True,
+        )
+        # let the other half finish before failing, so the caller can keep what did succeed
+        for half in halves:
+            if isinstance(half, BaseException):
+                raise half
+        return AutotestBundle(**dict(zip(kinds, halves)))
+
+    async def generate_half(
+        self,
+        kind: str,
+        plan: AnalystPlan,
+        case_count: int,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        on_case: Optional[Callable[[str, AutotestCase], Awaitable[None]]] = None,
+    ) -> List[AutotestCase]:
+        retries = max(0, get_settings().autotests_half_retries)
+        attempt = 0
+        with span("autotests.half", kind=kind):
+            while True:
+                try:
+                    # a retry must not be served the same broken completion from the cache
+                    return await self._generate_half(
+                        kind, plan, case_count, model=model, use_cache=use_cache and attempt == 0, on_case=on_case
+                    )
+                except (InvalidLLMOutput, ValidationError) as exc:
+                    # streamed cases have already been handed out, a retry would emit them twice
+                    if attempt >= retries or on_case is not None:
+                        raise
+                    attempt += 1
+                    logger.warning("Autotests %s half returned invalid output (%s); retrying", kind, exc)
+
+    async def _generate_half(
+        self,
+        kind: str,
+        plan: AnalystPlan,
+        case_count: int,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        on_case: Optional[Callable[[str, AutotestCase], Awaitable[None]]] = None,
+    ) -> List[AutotestCase]:
+        packer = PromptPacker(self.name)
+        context = plan.dict(include=PLAN_SECTIONS[kind])
+        packer.add("plan", json.dumps(context, indent=2), lambda _: compact_json(context))
+        sections = packer.pack()
+        target = "UI (Playwright)" if kind == "ui" else "API (pytest+httpx)"
         prompt = dedent(
             f"""
-            Build autotest plans using manual cases and plan.
-            Plan:\n{plan.json(indent=2)}\nManual cases count: {len(manual.cases)}
+            Build {target} autotest plans using manual cases and plan.
+            Plan:\n{sections['plan']}\nManual cases count: {case_count}
             """
         )
-        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT)
-        for key in ["ui", "api"]:
-            if key in data:
-                for test in data[key]:
-                    test["name"] = str(test.get("name", ""))
-                    test["steps"] = [str(s) for s in test.get("steps", [])]
-                    test["assertions"] = [str(a) for a in test.get("assertions", [])]
-                    test["target"] = str(test.get("target", ""))
-        return AutotestBundle.parse_obj(data)
+        system = SYSTEM_PROMPTS[kind]
+        if on_case is not None:
+            cases: List[AutotestCase] = []
+            with span("llm.stream", agent=self.name, kind=kind) as stream_span:
+                async for _, item in self.run_stream(
+                    prompt, keys=[kind], model=model, system=system, use_cache=use_cache
+                ):
+                    case = AutotestCase.parse_obj(_normalize_test(item, kind))
+                    cases.append(case)
+                    await on_case(kind, case)
+                if stream_span is not None:
+                    stream_span.set(items=len(cases))
+            return cases
+        data = await self.run(prompt, model=model, system=system, use_cache=use_cache)
+        with span("validate", model="AutotestCase", kind=kind):
+            return [AutotestCase.parse_obj(_normalize_test(test, kind)) for test in data.get(kind) or []]
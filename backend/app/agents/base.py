@@ -1,27 +1,68 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 from app.llm.client import CloudRuLLMClient
-from app.utils.errors import LLMServiceError
+from app.llm.pool import get_llm_client
+from app.llm.stream import IncrementalJsonParser
+from app.utils.errors import InvalidLLMOutput
+from app.utils.tracing import span
+
+
+def _messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+    messages: List[Dict[str, str]] = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+    return messages
 
 
 class LLMJsonAgent:
+    name = "agent"
+
     def __init__(self, client: Optional[CloudRuLLMClient] = None):
-        self.client = client or CloudRuLLMClient()
+        self._client = client
+
+    @property
+    def client(self) -> CloudRuLLMClient:
+        return self._client or get_llm_client()
 
-    async def run(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None) -> Dict[str, Any]:
-        messages: List[Dict[str, str]] = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
+    async def run(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        system: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
         completion = await self.client.chat_completion(
-            messages=messages,
+            messages=_messages(prompt, system),
             model=model,
+            use_cache=use_cache,
+            agent=self.name,
             response_format={"type": "json_object"},
         )
-        try:
-            return json.loads(completion)
-        except Exception as exc:  # noqa: BLE001
-            raise LLMServiceError(detail=f"Invalid JSON from LLM: {exc}\nRaw: {completion}")
+        with span("parse", chars=len(completion)):
+            try:
+                return json.loads(completion)
+            except Exception as exc:  # noqa: BLE001
+                raise InvalidLLMOutput(detail=f"Invalid JSON from LLM: {exc}\nRaw: {completion}")
+
+    async def run_stream(
+        self,
+        prompt: str,
+        keys: Iterable[str],
+        model: Optional[str] = None,
+        system: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        parser = IncrementalJsonParser(keys)
+        async for chunk in self.client.chat_completion_stream(
+            messages=_messages(prompt, system),
+            model=model,
+            use_cache=use_cache,
+            agent=self.name,
+            response_format={"type": "json_object"},
+        ):
+            for item in parser.feed(chunk):
+                yield item
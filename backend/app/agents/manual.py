@@ -1,28 +1,164 @@
 from __future__ import annotations
 
+import asyncio
+import re
 from textwrap import dedent
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
 
 from app.agents.base import LLMJsonAgent
-from app.schemas.pipeline import AnalystPlan, ManualBundle
+from app.agents.prompt import PromptPacker, compact_json
+from app.config import get_settings
+from app.schemas.pipeline import AnalystPlan, ManualBundle, ManualTestCase
+from app.utils.logging import configure_logging
+from app.utils.tracing import span
+
+logger = configure_logging()
 
 SYSTEM_PROMPT = """
 You are a senior QA writing Allure TestOps manual tests. Respond ONLY with JSON having key 'cases': list of cases with fields title,severity,owner,priority,feature,story,suite,tags (list),steps (list),expected (list). Follow AAA in steps, at least 10 cases.
 """
+# the system prompt asks for at least this many cases
+MIN_CASES = 10
+
+
+def estimate_case_count(plan: AnalystPlan) -> int:
+    return max(MIN_CASES, sum(len(cases) for cases in plan.coverage_matrix.values()))
+
+
+def _normalize_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    case["steps"] = [str(s) for s in case.get("steps", [])]
+    case["expected"] = [str(e) for e in case.get("expected", [])]
+    return case
+
+
+def _norm(value: str) -> str:
+    return re.sub(r"\s+", " ", value).strip().lower()
+
+
+def _tokens(value: str) -> Set[str]:
+    return {token for token in re.findall(r"\w+", value.lower()) if len(token) >= 2}
+
+
+def _feature_for(area: str, features: List[str]) -> Optional[str]:
+    area_tokens = _tokens(area)
+    best, best_score = None, 0
+    for feature in features:
+        score = len(_tokens(feature) & area_tokens)
+        if score > best_score:
+            best, best_score = feature, score
+    return best
+
+
+def partition_plan(plan: AnalystPlan, by: str = "area") -> Dict[str, AnalystPlan]:
+    # every shard keeps the shared context (features, flows, ...) but only its own coverage areas
+    groups: Dict[str, Dict[str, List[str]]] = {}
+    for area, cases in plan.coverage_matrix.items():
+        key = (_feature_for(area, plan.features) if by == "feature" else None) or area
+        groups.setdefault(key, {})[area] = cases
+    return {name: plan.copy(update={"coverage_matrix": matrix}) for name, matrix in groups.items()}
+
+
+def merge_manual_bundles(bundles: Iterable[ManualBundle]) -> ManualBundle:
+    seen: Set[str] = set()
+    cases: List[ManualTestCase] = []
+    for bundle in bundles:
+        for case in bundle.cases:
+            key = _norm(case.title)
+            if key not in seen:
+                seen.add(key)
+                cases.append(case)
+    return ManualBundle(cases=cases)
 
 
 class ManualTestsAgent(LLMJsonAgent):
-    async def generate(self, plan: AnalystPlan, model: Optional[str] = None) -> ManualBundle:
+    name = "manual"
+
+    async def generate(
+        self,
+        plan: AnalystPlan,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        on_case: Optional[Callable[[ManualTestCase], Awaitable[None]]] = None,
+        sharded: Optional[bool] = None,
+    ) -> ManualBundle:
+        if sharded is not False:
+            settings = get_settings()
+            if sharded or len(plan.coverage_matrix) >= settings.manual_shard_min_areas:
+                return await self.generate_sharded(plan, model=model, use_cache=use_cache, on_case=on_case)
+        return await self._generate(plan, model=model, use_cache=use_cache, on_case=on_case)
+
+    async def generate_sharded(
+        self,
+        plan: AnalystPlan,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        on_case: Optional[Callable[[ManualTestCase], Awaitable[None]]] = None,
+    ) -> ManualBundle:
+        settings = get_settings()
+        shards = partition_plan(plan, by=settings.manual_shard_by)
+        if len(shards) <= 1:
+            return await self._generate(plan, model=model, use_cache=use_cache, on_case=on_case)
+        logger.info("Generating manual cases in %s shards: %s", len(shards), ", ".join(shards))
+        gate = asyncio.Semaphore(max(1, settings.manual_shard_concurrency))
+        streamed: Set[str] = set()
+
+        async def emit(case: ManualTestCase) -> None:
+            # shards stream concurrently; forward each title once, the merged bundle fixes the order
+            key = _norm(case.title)
+            if key not in streamed:
+                streamed.add(key)
+                await on_case(case)
+
+        async def generate_shard(name: str, shard: AnalystPlan) -> ManualBundle:
+            async with gate:
+                with span("manual.shard", focus=name, areas=len(shard.coverage_matrix)):
+                    return await self._generate(
+                        shard,
+                        model=model,
+                        use_cache=use_cache,
+                        on_case=emit if on_case is not None else None,
+                        focus=name,
+                    )
+
+        bundles = await asyncio.gather(*(generate_shard(name, shard) for name, shard in shards.items()))
+        return merge_manual_bundles(bundles)
+
+    async def _generate(
+        self,
+        plan: AnalystPlan,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        on_case: Optional[Callable[[ManualTestCase], Awaitable[None]]] = None,
+        focus: Optional[str] = None,
+    ) -> ManualBundle:
+        packer = PromptPacker(self.name)
+        packer.add("plan", plan.json(indent=2), lambda _: compact_json(plan.dict()))
+        sections = packer.pack()
+        scope = (
+            f"Write cases only for the '{focus}' part of the plan (its coverage_matrix); other areas are covered "
+            "separately, so the 10 case minimum applies to the whole suite, not to this part.\n"
+            if focus
+            else ""
+        )
         prompt = dedent(
             f"""
             Using the analyzed plan below, produce manual test cases.
-            Plan JSON:\n{plan.json(indent=2)}
+            {scope}Plan JSON:\n{sections['plan']}
             """
         )
-        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT)
-        cases = data.get("cases", [])
-        for case in cases:
-            case["steps"] = [str(s) for s in case.get("steps", [])]
-            case["expected"] = [str(e) for e in case.get("expected", [])]
-        data["cases"] = cases
-        return ManualBundle.parse_obj(data)
+        if on_case is not None:
+            cases: List[ManualTestCase] = []
+            with span("llm.stream", agent=self.name) as stream_span:
+                async for _, item in self.run_stream(
+                    prompt, keys=["cases"], model=model, system=SYSTEM_PROMPT, use_cache=use_cache
+                ):
+                    case = ManualTestCase.parse_obj(_normalize_case(item))
+                    cases.append(case)
+                    await on_case(case)
+                if stream_span is not None:
+                    stream_span.set(items=len(cases))
+            return ManualBundle(cases=cases)
+        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT, use_cache=use_cache)
+        with span("validate", model="ManualBundle"):
+            data["cases"] = [_normalize_case(case) for case in data.get("cases", [])]
+            return ManualBundle.parse_obj(data)
@@ -4,7 +4,9 @@ from textwrap import dedent
 from typing import Optional
 
 from app.agents.base import LLMJsonAgent
+from app.agents.prompt import PromptPacker, compact_json
 from app.schemas.pipeline import AnalystPlan, ManualBundle, AutotestBundle, OptimizationReport
+from app.utils.tracing import span
 
 SYSTEM_PROMPT = """
 You are a QA optimization assistant. Return JSON with keys duplicates(list), conflicts(list), gaps(list), suggestions(list) using the provided plan and tests.
@@ -12,20 +14,27 @@ You are a QA optimization assistant. Return JSON with keys duplicates(list), con
 
 
 class OptimizationAgent(LLMJsonAgent):
+    name = "optimize"
+
     async def optimize(
         self,
         plan: AnalystPlan,
         manual: ManualBundle,
         autotests: AutotestBundle,
         model: Optional[str] = None,
+        use_cache: bool = True,
     ) -> OptimizationReport:
+        packer = PromptPacker(self.name)
+        packer.add("plan", plan.json(indent=2), lambda _: compact_json(plan.dict()))
+        sections = packer.pack()
         prompt = dedent(
             f"""
             Identify duplicates, conflicts, and gaps across plan, manual tests, and autotests.
-            Plan: {plan.json(indent=2)}
+            Plan: {sections['plan']}
             Manual cases: {len(manual.cases)}
             Autotest counts: ui={len(autotests.ui)}, api={len(autotests.api)}
             """
         )
-        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT)
-        return OptimizationReport.parse_obj(data)
+        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT, use_cache=use_cache)
+        with span("validate", model="OptimizationReport"):
+            return OptimizationReport.parse_obj(data)
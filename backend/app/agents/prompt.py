@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.generation.api_tests import parse_openapi_spec
+from app.llm.metrics import record_prompt_packing
+from app.utils.logging import configure_logging
+from app.utils.tracing import span
+
+logger = configure_logging()
+
+try:
+    import tiktoken  # type: ignore
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # noqa: BLE001
+    _ENCODING = None
+
+OPENAPI_NOISE_KEYS = {"description", "example", "examples", "externalDocs", "termsOfService", "contact", "license"}
+NAMED_CONTAINERS = {"properties", "schemas", "paths", "responses", "securitySchemes", "parameters"}
+INLINE_SCHEMA_MIN_CHARS = 120
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # ~4 characters per token is close enough for budgeting English/JSON prompts
+    return math.ceil(len(text) / 4)
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def compact_text(text: str) -> str:
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def compact_code(code: str) -> str:
+    return "\n".join(line.rstrip() for line in code.splitlines() if line.strip())
+
+
+def _strip_noise(node: Any, named_children: bool = False) -> Any:
+    # under properties/schemas/paths the keys are user-chosen names, not OpenAPI keywords
+    if isinstance(node, dict):
+        return {
+            key: _strip_noise(value, key in NAMED_CONTAINERS)
+            for key, value in node.items()
+            if named_children or (key not in OPENAPI_NOISE_KEYS and not str(key).startswith("x-"))
+        }
+    if isinstance(node, list):
+        return [_strip_noise(item) for item in node]
+    return node
+
+
+def _rewrite_refs(node: Any, renames: Dict[str, str]) -> Any:
+    if isinstance(node, dict):
+        if isinstance(node.get("$ref"), str) and node["$ref"] in renames:
+            return {**node, "$ref": renames[node["$ref"]]}
+        return {key: _rewrite_refs(value, renames) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_rewrite_refs(item, renames) for item in node]
+    return node
+
+
+def _dedupe_schemas(spec: Dict[str, Any]) -> Dict[str, Any]:
+    components = spec.get("components") if isinstance(spec.get("components"), dict) else None
+    schemas = components.get("schemas") if components and isinstance(components.get("schemas"), dict) else {}
+    seen: Dict[str, str] = {}
+    renames: Dict[str, str] = {}
+    for name, schema in list(schemas.items()):
+        fingerprint = compact_json(schema)
+        if fingerprint in seen:
+            renames[f"#/components/schemas/{name}"] = f"#/components/schemas/{seen[fingerprint]}"
+            del schemas[name]
+        else:
+            seen[fingerprint] = name
+
+    # identical inline schemas repeated across operations are hoisted into components
+    inline_counts: Dict[str, int] = {}
+
+    def count(node: Any) -> None:
+        if isinstance(node, dict):
+            schema = node.get("schema")
+            if isinstance(schema, dict) and "$ref" not in schema:
+                fingerprint = compact_json(schema)
+                if len(fingerprint) >= INLINE_SCHEMA_MIN_CHARS:
+                    inline_counts[fingerprint] = inline_counts.get(fingerprint, 0) + 1
+            for value in node.values():
+                count(value)
+        elif isinstance(node, list):
+            for item in node:
+                count(item)
+
+    hoisted: Dict[str, str] = {}
+
+    def hoist(node: Any) -> Any:
+        if isinstance(node, dict):
+            result = {}
+            for key, value in node.items():
+                if key == "schema" and isinstance(value, dict):
+                    fingerprint = compact_json(value)
+                    if inline_counts.get(fingerprint, 0) > 1:
+                        if fingerprint not in hoisted:
+                            name = seen.get(fingerprint)
+                            suffix = len(hoisted) + 1
+                            while name is None or (name in schemas and name != seen.get(fingerprint)):
+                                name = f"Shared{suffix}"
+                                suffix += 1
+                            hoisted[fingerprint] = name
+                        result[key] = {"$ref": f"#/components/schemas/{hoisted[fingerprint]}"}
+                        continue
+                result[key] = hoist(value)
+            return result
+        if isinstance(node, list):
+            return [hoist(item) for item in node]
+        return node
+
+    paths = spec.get("paths")
+    if isinstance(paths, dict):
+        count(paths)
+        spec["paths"] = hoist(paths)
+        if hoisted:
+            components = spec.setdefault("components", {})
+            target = components.setdefault("schemas", {})
+            for fingerprint, name in hoisted.items():
+                target.setdefault(name, json.loads(fingerprint))
+    return _rewrite_refs(spec, renames) if renames else spec
+
+
+def compact_openapi(content: str) -> str:
+    spec = parse_openapi_spec(content)
+    if not isinstance(spec, dict) or not ({"openapi", "swagger", "components"} & set(spec)):
+        # the fallback path-only parse would lose information; keep the text as-is
+        return compact_text(content)
+    return compact_json(_dedupe_schemas(_strip_noise(spec)))
+
+
+def _truncate(text: str, tokens: int) -> str:
+    if tokens <= 0:
+        return ""
+    current = count_tokens(text)
+    if current <= tokens:
+        return text
+    keep = max(0, int(len(text) * tokens / current) - 40)
+    return text[:keep] + f"\n...[truncated {current - tokens} tokens]"
+
+
+class PromptPacker:
+    def __init__(self, agent: str, budget: Optional[int] = None):
+        settings = get_settings()
+        self.agent = agent
+        self.budget = budget if budget is not None else settings.prompt_budgets.get(agent, settings.prompt_budget_default)
+        self.sections: List[Dict[str, Any]] = []
+
+    def add(self, name: str, raw: str, compact: Optional[Callable[[str], str]] = None, required: bool = False) -> None:
+        self.sections.append({"name": name, "raw": raw, "compact": compact, "required": required})
+
+    def pack(self) -> Dict[str, str]:
+        with span("prompt.pack", agent=self.agent) as pack_span:
+            packed, before, after = self._pack()
+            if pack_span is not None:
+                pack_span.set(tokens_before=before, tokens_after=after, budget=self.budget)
+        return packed
+
+    def _pack(self) -> Tuple[Dict[str, str], int, int]:
+        packed: Dict[str, str] = {}
+        report: Dict[str, Dict[str, int]] = {}
+        for section in self.sections:
+            text = section["raw"]
+            if section["compact"] and text:
+                try:
+                    text = section["compact"](text)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning("Prompt compaction of %s.%s failed: %s", self.agent, section["name"], exc)
+            packed[section["name"]] = text
+            report[section["name"]] = {"before": count_tokens(section["raw"]), "after": count_tokens(text)}
+
+        total = sum(item["after"] for item in report.values())
+        if self.budget > 0 and total > self.budget:
+            # shrink the largest optional sections first until the prompt fits
+            optional = sorted(
+                (s["name"] for s in self.sections if not s["required"]),
+                key=lambda name: report[name]["after"],
+                reverse=True,
+            )
+            for name in optional:
+                excess = total - self.budget
+                if excess <= 0:
+                    break
+                allowed = max(0, report[name]["after"] - excess)
+                packed[name] = _truncate(packed[name], allowed)
+                tokens = count_tokens(packed[name])
+                total -= report[name]["after"] - tokens
+                report[name]["after"] = tokens
+
+        before = sum(item["before"] for item in report.values())
+        after = sum(item["after"] for item in report.values())
+        logger.info(
+            "Packed %s prompt: %s -> %s tokens (budget %s) %s", self.agent, before, after, self.budget, report
+        )
+        record_prompt_packing(self.agent, before, after)
+        return packed, before, after
@@ -4,7 +4,9 @@ from textwrap import dedent
 from typing import Optional
 
 from app.agents.base import LLMJsonAgent
+from app.agents.prompt import PromptPacker, compact_code
 from app.schemas.pipeline import StandardsReport
+from app.utils.tracing import span
 
 SYSTEM_PROMPT = """
 You are a QA standards auditor. Return JSON with keys: issues (list of {type,severity,location,message,suggestion}), valid (bool). Focus on AAA, Allure labels, naming, structure.
@@ -12,12 +14,25 @@ You are a QA standards auditor. Return JSON with keys: issues (list of {type,sev
 
 
 class StandardsAgent(LLMJsonAgent):
-    async def audit(self, manual_code: str, autotest_code: str, model: Optional[str] = None) -> StandardsReport:
+    name = "standards"
+
+    async def audit(
+        self,
+        manual_code: str,
+        autotest_code: str,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> StandardsReport:
+        packer = PromptPacker(self.name)
+        packer.add("manual", manual_code, compact_code)
+        packer.add("autotests", autotest_code, compact_code)
+        sections = packer.pack()
         prompt = dedent(
             f"""
             Review the following manual and automation code for standards compliance.
-            Manual code:\n{manual_code}\n---\nAutotests:\n{autotest_code}
+            Manual code:\n{sections['manual']}\n---\nAutotests:\n{sections['autotests']}
             """
         )
-        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT)
-        return StandardsReport.parse_obj(data)
+        data = await self.run(prompt, model=model, system=SYSTEM_PROMPT, use_cache=use_cache)
+        with span("validate", model="StandardsReport"):
+            return StandardsReport.parse_obj(data)
@@ -0,0 +1,131 @@
+import os
+import re
+import zlib
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.storage.artifacts import CHUNK_SIZE, StoredArtifact, get_blob_store
+
+GZIP_MIN_SIZE = 1024
+GZIP_MEDIA_TYPES = ("text/", "application/json", "application/x-ndjson", "application/xml", "application/javascript")
+GZIP_SUFFIX = "-gzip"
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/").strip('"').removesuffix(GZIP_SUFFIX) for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # a single byte range; anything else (multiple ranges, other units) is answered with the whole file
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    first = int(start)
+    if end and int(end) < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable(header)
+    return first, min(int(end), size - 1) if end else size - 1
+
+
+def accepts_gzip(header: str) -> bool:
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def read_chunks(handle: BinaryIO, start: int, length: int) -> Iterator[bytes]:
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def gzip_chunks(handle: BinaryIO) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    try:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        handle.close()
+
+
+def file_response(request: Request, artifact: StoredArtifact) -> Response:
+    # the open handle pins the file: an artifact replaced while it is sent is still served whole
+    handle = artifact.open()
+    try:
+        size = os.fstat(handle.fileno()).st_size if artifact.path is not None else artifact.size
+    except BaseException:
+        handle.close()
+        raise
+    etag = artifact.sha256
+    kind = artifact.media_type
+    headers: Dict[str, str] = {
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        handle.close()
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or etag_matches(if_range, etag)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            handle.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            first, last = byte_range
+            headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+            headers["Content-Length"] = str(last - first + 1)
+            return StreamingResponse(
+                read_chunks(handle, first, last - first + 1), status_code=206, media_type=kind, headers=headers
+            )
+
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        if artifact.linked:
+            # blobs are stored gzip-compressed: send them as they are
+            handle.close()
+            handle = get_blob_store().open_compressed(artifact.sha256)
+            stored = os.fstat(handle.fileno()).st_size
+            headers["ETag"] = f'"{etag}{GZIP_SUFFIX}"'
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(stored)
+            return StreamingResponse(read_chunks(handle, 0, stored), media_type=kind, headers=headers)
+        if size >= GZIP_MIN_SIZE and kind.startswith(GZIP_MEDIA_TYPES):
+            headers["ETag"] = f'"{etag}{GZIP_SUFFIX}"'
+            headers["Content-Encoding"] = "gzip"
+            return StreamingResponse(gzip_chunks(handle), media_type=kind, headers=headers)
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(read_chunks(handle, 0, size), media_type=kind, headers=headers)
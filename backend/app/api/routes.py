@@ -1,17 +1,57 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse
+import asyncio
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
-from app.llm.client import CloudRuLLMClient
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+
+from app.api.files import etag_matches, file_response
+from app.llm.pool import get_llm_client
+from app.config import get_settings
+from app.orchestrator.batch import batch_of, batch_progress, create_batch, load_batch, run_batch
+from app.orchestrator.queue import Job, QueueFull, get_job_queue
 from app.orchestrator.runner import PipelineRunner
-from app.schemas.pipeline import RunInput
+from app.schemas.pipeline import BatchInput, RunInput
 from app.storage import artifacts
+from app.storage.archive import BatchArchive, RunArchive
+from app.storage.events import SNAPSHOT_FILE, load_record
+from app.storage.retention import collect_garbage
+from app.storage.run_index import RUN_STATUSES, get_run_index, run_status
 from app.utils.logging import configure_logging
+from app.utils.metrics import registry as metrics_registry
+from app.utils.tracing import to_otlp
 
 router = APIRouter()
 logger = configure_logging()
 runner = PipelineRunner()
 
 
+async def execute_job(job: Job) -> None:
+    # a job picked up again after a crash continues from the checkpoints of the lost attempt
+    resume = job.payload.get("resume", False) or job.recovered
+    if job.kind == "batch":
+        await run_batch(runner, job.run_id, resume=resume)
+    else:
+        await runner.run_and_record(job.run_id, RunInput.parse_obj(job.payload["input"]), resume=resume)
+
+
+async def enqueue_job(run_id: str, payload: Dict[str, Any], lane: str, kind: str = "run") -> Job:
+    try:
+        return await asyncio.to_thread(lambda: get_job_queue().enqueue(run_id, payload, lane=lane, kind=kind))
+    except QueueFull as exc:
+        raise HTTPException(
+            status_code=429,
+            detail={"message": str(exc), "queue_depth": exc.depth, "estimated_wait_seconds": exc.retry_after},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+
+async def enqueue_run(run_id: str, body: RunInput, resume: bool = False) -> dict:
+    job = await enqueue_job(run_id, {"input": body.dict(), "resume": resume}, lane=body.priority)
+    return {"run_id": run_id, "job_id": job.id, "status": job.status}
+
+
 @router.get("/health")
 async def health():
     return {"status": "ok"}
@@ -19,55 +59,256 @@ async def health():
 
 @router.get("/models")
 async def models():
-    client = CloudRuLLMClient()
-    return await client.list_models()
+    return await get_llm_client().list_models()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def run_folder(run_id: str) -> Path:
+    # ids come from the URL or the request body: "..", "." or nested paths must not reach outside the runs folder
+    root = artifacts.runs_root().resolve()
+    base = (root / run_id).resolve()
+    if base.parent != root:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return base
+
+
+def register_run(body: RunInput) -> str:
+    if body.base_run_id and not artifacts.has_artifact(run_folder(body.base_run_id), "analyst.json"):
+        raise HTTPException(status_code=404, detail="Base run not found")
+    # runs execute concurrently and resume by id: two submissions must never share a folder
+    base = artifacts.create_run_folder(uuid.uuid4().hex[:12])
+    artifacts.write_json(base / "input.json", body.dict())
+    get_run_index().register(base.name, body, artifacts.timestamp())
+    return base.name
 
 
 @router.post("/runs")
-async def create_run(body: RunInput, background_tasks: BackgroundTasks):
-    run_id = body.model or body.requirements or body.openapi
-    run_id = str(run_id)[:8] if run_id else None
-    base = artifacts.create_run_folder(run_id)
-    run_id = base.name
+async def create_run(body: RunInput):
+    run_id = await asyncio.to_thread(register_run, body)
+    return await enqueue_run(run_id, body)
+
+
+@router.post("/runs/batch")
+async def create_batch_run(body: BatchInput):
+    limit = get_settings().batch_max_items
+    if len(body.items) > limit:
+        raise HTTPException(status_code=422, detail=f"A batch may contain at most {limit} items")
+    batch = await asyncio.to_thread(create_batch, uuid.uuid4().hex[:12], body)
+    job = await enqueue_job(batch.id, {"resume": False}, lane=body.priority, kind="batch")
+    return {"batch_id": batch.id, "job_id": job.id, "status": job.status, "runs": batch.items}
+
+
+@router.get("/runs/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    try:
+        # progress replays the record of every run in the batch
+        return await asyncio.to_thread(lambda: batch_progress(load_batch(batch_id)))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Batch not found")
 
-    async def task():
-        try:
-            await runner.run(run_id, body)
-        except Exception as exc:  # noqa: BLE001
-            logger.error("Run %s failed: %s", run_id, exc)
-            fail_path = base / "error.txt"
-            fail_path.write_text(str(exc))
 
-    background_tasks.add_task(task)
-    return {"run_id": run_id}
+def _open_batch_archive(batch_id: str) -> Tuple[BatchArchive, Optional[Path], bool]:
+    batch = load_batch(batch_id)
+    archive = BatchArchive(batch_id, batch.items)
+    finished = batch_progress(batch)["status"] not in ("queued", "running") and not get_job_queue().active(batch_id)
+    return archive, archive.cached(), finished
+
+
+@router.get("/runs/batch/{batch_id}/download")
+async def download_batch(batch_id: str, request: Request):
+    try:
+        archive, cached, finished = await asyncio.to_thread(_open_batch_archive, batch_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return archive_response(request, batch_id, archive, cached, finished)
+
+
+def cancel_job(run_id: str, exists: bool, run_ids: Optional[List[str]] = None) -> dict:
+    cancelled = get_job_queue().cancel(run_id)
+    if not cancelled["queued"] and not cancelled["running"]:
+        if not exists:
+            raise HTTPException(status_code=404, detail="Run not found")
+        batch_id = batch_of(run_id) if run_ids is None else None
+        if batch_id is not None and get_job_queue().active(batch_id):
+            # the batch runs all its items in one job: a single item cannot be stopped on its own
+            raise HTTPException(
+                status_code=409,
+                detail=f"Run {run_id} is part of batch {batch_id}; cancel it with DELETE /api/runs/batch/{batch_id}",
+            )
+        raise HTTPException(status_code=409, detail="Run is not queued or running")
+    if cancelled["queued"]:
+        get_run_index().mark_cancelled(run_ids or [run_id])
+    return {"run_id": run_id, "cancelled": cancelled}
+
+
+@router.delete("/runs/batch/{batch_id}")
+async def cancel_batch(batch_id: str):
+    try:
+        run_ids = (await asyncio.to_thread(load_batch, batch_id)).items
+    except FileNotFoundError:
+        run_ids = []
+    return await asyncio.to_thread(cancel_job, batch_id, bool(run_ids), run_ids)
+
+
+@router.delete("/runs/{run_id}")
+async def cancel_run(run_id: str):
+    return await asyncio.to_thread(lambda: cancel_job(run_id, run_folder(run_id).exists()))
+
+
+def prepare_resume(run_id: str) -> RunInput:
+    base = run_folder(run_id)
+    if not (base / "input.json").exists():
+        raise HTTPException(status_code=404, detail="Run not found")
+    if get_job_queue().active(run_id):
+        raise HTTPException(status_code=409, detail="Run is still in progress")
+    body = RunInput.parse_file(base / "input.json")
+    (base / "error.txt").unlink(missing_ok=True)
+    return body
+
+
+@router.post("/runs/{run_id}/resume")
+async def resume_run(run_id: str):
+    body = await asyncio.to_thread(prepare_resume, run_id)
+    return {**await enqueue_run(run_id, body, resume=True), "resumed": True}
+
+
+@router.post("/storage/gc")
+async def storage_gc():
+    return await asyncio.to_thread(collect_garbage, None, get_job_queue().active)
 
 
 @router.get("/runs")
-async def list_runs():
-    ids = artifacts.list_runs()
-    runs = []
-    for rid in ids:
-        run_file = artifacts.runs_root() / rid / "run.json"
-        if run_file.exists():
-            runs.append(run_file.read_text())
+async def list_runs(
+    status: Optional[List[str]] = Query(None),
+    model: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    statuses = [value for item in status or [] for value in item.split(",") if value]
+    unknown = sorted(set(statuses) - set(RUN_STATUSES))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown run status: {', '.join(unknown)}")
+    try:
+        # opening the index may backfill it from disk: keep that off the event loop too
+        return await asyncio.to_thread(
+            lambda: get_run_index().query(
+                status=statuses,
+                model=model,
+                created_after=created_after,
+                created_before=created_before,
+                limit=limit,
+                cursor=cursor,
+            )
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+def _inline_files(base: Path, manifest: List[Dict[str, Any]], names: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    # inlined content shares one byte budget per request; whatever does not fit is fetched per file
+    budget = get_settings().run_inline_max_bytes
+    sizes = {entry["name"]: entry["size"] for entry in manifest}
+    files: Dict[str, str] = {}
+    omitted: List[str] = []
+    for name in dict.fromkeys(names):
+        if name not in sizes:
+            continue
+        if sizes[name] > budget:
+            omitted.append(name)
+            continue
+        if name == SNAPSHOT_FILE:
+            # the snapshot on disk lags behind the event log while the run is in progress
+            record = load_record(base)
+            content = record.json() if record is not None else None
         else:
-            runs.append(rid)
-    return {"runs": runs}
+            raw = artifacts.read_artifact(base, name)
+            try:
+                content = raw.decode("utf-8") if raw is not None else None
+            except UnicodeDecodeError:
+                content = None
+        size = len(content.encode("utf-8")) if content is not None else 0
+        if content is None or size > budget:
+            omitted.append(name)
+            continue
+        budget -= size
+        files[name] = content
+    return files, omitted
 
 
 @router.get("/runs/{run_id}")
-async def get_run(run_id: str):
+async def get_run(run_id: str, include: Optional[List[str]] = Query(None)):
+    base = await asyncio.to_thread(run_folder, run_id)
     try:
-        files = artifacts.load_run(run_id)
+        manifest = await asyncio.to_thread(artifacts.run_manifest, base)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Run not found")
-    return {"run_id": run_id, "files": files}
+    names = [name.strip() for value in include or [] for name in value.split(",") if name.strip()]
+    files, omitted = await asyncio.to_thread(_inline_files, base, manifest, names)
+    return {"run_id": run_id, "manifest": manifest, "files": files, "omitted": omitted}
 
 
-@router.get("/runs/{run_id}/download")
-async def download(run_id: str):
+@router.get("/runs/{run_id}/files/{name:path}")
+async def get_run_file(run_id: str, name: str, request: Request):
+    base = await asyncio.to_thread(run_folder, run_id)
+    if not await asyncio.to_thread(base.is_dir):
+        raise HTTPException(status_code=404, detail="Run not found")
+    if name == SNAPSHOT_FILE:
+        record = await asyncio.to_thread(load_record, base)
+        if record is not None:
+            return Response(content=record.json(), media_type="application/json", headers={"Cache-Control": "no-cache"})
+    artifact = await asyncio.to_thread(artifacts.find_artifact, base, name)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="File not found")
     try:
-        zip_path = artifacts.zip_run(run_id)
+        return await asyncio.to_thread(file_response, request, artifact)
     except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+
+@router.get("/runs/{run_id}/trace")
+async def get_trace(run_id: str, format: Literal["json", "otlp"] = "json"):
+    record = await asyncio.to_thread(lambda: load_record(run_folder(run_id)))
+    if record is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    trace = record.trace
+    if not trace:
+        raise HTTPException(status_code=404, detail="Run has no trace yet")
+    return to_otlp(trace) if format == "otlp" else trace
+
+
+def archive_response(request: Request, name: str, archive: RunArchive, cached: Optional[Path], finished: bool) -> Response:
+    headers = {"ETag": f'"{archive.etag}"', "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), archive.etag):
+        return Response(status_code=304, headers=headers)
+    if cached is not None:
+        return FileResponse(cached, filename=f"{name}.zip", headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{name}.zip"'
+    return StreamingResponse(archive.stream(cache=finished), media_type="application/zip", headers=headers)
+
+
+def _open_archive(run_id: str, base: Path) -> Tuple[RunArchive, Optional[Path], bool]:
+    archive = RunArchive(run_id, base)
+    # only a finished run's archive is kept: files of a running one may change while it streams
+    record = load_record(base)
+    finished = (
+        record is not None
+        and run_status(record) not in ("queued", "running")
+        and not get_job_queue().active(run_id)
+    )
+    return archive, archive.cached(), finished
+
+
+@router.get("/runs/{run_id}/download")
+async def download(run_id: str, request: Request):
+    base = await asyncio.to_thread(run_folder, run_id)
+    if not await asyncio.to_thread(base.is_dir):
         raise HTTPException(status_code=404, detail="Run not found")
-    return FileResponse(zip_path, filename=f"{run_id}.zip")
+    # hashing the artifacts touches every file, keep it off the event loop
+    archive, cached, finished = await asyncio.to_thread(_open_archive, run_id, base)
+    return archive_response(request, run_id, archive, cached, finished)
@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Dict, Optional
 from pydantic import BaseSettings, Field
 
 
@@ -12,9 +13,67 @@ class Settings(BaseSettings):
     model_default: str = Field(
         default="ai-sage/GigaChat3-10B-A1.8B", env="CLOUDRU_MODEL"
     )
+    llm_transport: str = Field(default="live", env="LLM_TRANSPORT")
+    llm_allow_local_base_url: bool = Field(default=False, env="LLM_ALLOW_LOCAL_BASE_URL")
+    llm_cassette_path: str = Field(default="", env="LLM_CASSETTE_PATH")
+    llm_stub_latency: float = Field(default=0.0, env="LLM_STUB_LATENCY")
+    llm_stub_jitter: float = Field(default=0.0, env="LLM_STUB_JITTER")
+    llm_stub_seed: Optional[int] = Field(default=None, env="LLM_STUB_SEED")
     request_timeout: int = Field(default=30, env="CLOUDRU_TIMEOUT")
     retries: int = Field(default=2, env="CLOUDRU_RETRIES")
+    llm_retry_backoff: float = Field(default=1.0, env="LLM_RETRY_BACKOFF")
+    llm_retry_backoff_max: float = Field(default=30.0, env="LLM_RETRY_BACKOFF_MAX")
+    llm_concurrency: int = Field(default=4, env="LLM_CONCURRENCY")
+    llm_min_concurrency: int = Field(default=1, env="LLM_MIN_CONCURRENCY")
+    llm_max_concurrency: int = Field(default=16, env="LLM_MAX_CONCURRENCY")
+    llm_latency_target: float = Field(default=20.0, env="LLM_LATENCY_TARGET")
+    llm_requests_per_minute: int = Field(default=0, env="LLM_REQUESTS_PER_MINUTE")
+    llm_tokens_per_minute: int = Field(default=0, env="LLM_TOKENS_PER_MINUTE")
     data_path: str = Field(default="./data", env="DATA_PATH")
+    llm_max_connections: int = Field(default=64, env="LLM_MAX_CONNECTIONS")
+    llm_max_keepalive: int = Field(default=32, env="LLM_MAX_KEEPALIVE")
+    llm_keepalive_expiry: float = Field(default=60.0, env="LLM_KEEPALIVE_EXPIRY")
+    llm_http2: bool = Field(default=False, env="LLM_HTTP2")
+    llm_prewarm_connections: int = Field(default=0, env="LLM_PREWARM_CONNECTIONS")
+    llm_coalesce: bool = Field(default=True, env="LLM_COALESCE")
+    prompt_budget_default: int = Field(default=8000, env="PROMPT_BUDGET_DEFAULT")
+    prompt_budgets: Dict[str, int] = Field(
+        default={"analyst": 12000, "manual": 6000, "autotests": 6000, "standards": 10000, "optimize": 6000},
+        env="PROMPT_BUDGETS",
+    )
+    analyst_shard_threshold: int = Field(default=60, env="ANALYST_SHARD_THRESHOLD")
+    analyst_shard_size: int = Field(default=40, env="ANALYST_SHARD_SIZE")
+    analyst_shard_by: str = Field(default="tag", env="ANALYST_SHARD_BY")
+    analyst_shard_concurrency: int = Field(default=4, env="ANALYST_SHARD_CONCURRENCY")
+    manual_shard_min_areas: int = Field(default=15, env="MANUAL_SHARD_MIN_AREAS")
+    manual_shard_by: str = Field(default="area", env="MANUAL_SHARD_BY")
+    manual_shard_concurrency: int = Field(default=4, env="MANUAL_SHARD_CONCURRENCY")
+    autotests_half_retries: int = Field(default=1, env="AUTOTESTS_HALF_RETRIES")
+    speculative_autotests: bool = Field(default=False, env="SPECULATIVE_AUTOTESTS")
+    speculative_tolerance: float = Field(default=0.3, env="SPECULATIVE_TOLERANCE")
+    artifact_fsync: bool = Field(default=False, env="ARTIFACT_FSYNC")
+    run_snapshot_every: int = Field(default=50, env="RUN_SNAPSHOT_EVERY")
+    run_inline_max_bytes: int = Field(default=1024 * 1024, env="RUN_INLINE_MAX_BYTES")
+    artifact_store: bool = Field(default=False, env="ARTIFACT_STORE")
+    retention_max_age_days: float = Field(default=0, env="RETENTION_MAX_AGE_DAYS")
+    retention_max_bytes: int = Field(default=0, env="RETENTION_MAX_BYTES")
+    retention_keep_last: int = Field(default=50, env="RETENTION_KEEP_LAST")
+    retention_gc_interval: int = Field(default=3600, env="RETENTION_GC_INTERVAL")
+    llm_cache_enabled: bool = Field(default=False, env="LLM_CACHE_ENABLED")
+    llm_cache_max_bytes: int = Field(default=256 * 1024 * 1024, env="LLM_CACHE_MAX_BYTES")
+    llm_cache_max_age: int = Field(default=7 * 24 * 3600, env="LLM_CACHE_MAX_AGE")
+    queue_workers: int = Field(default=2, env="QUEUE_WORKERS")
+    queue_max_depth: int = Field(default=100, env="QUEUE_MAX_DEPTH")
+    queue_lease_seconds: float = Field(default=60.0, env="QUEUE_LEASE_SECONDS")
+    queue_max_attempts: int = Field(default=3, env="QUEUE_MAX_ATTEMPTS")
+    queue_poll_interval: float = Field(default=1.0, env="QUEUE_POLL_INTERVAL")
+    queue_aging_seconds: float = Field(default=300.0, env="QUEUE_AGING_SECONDS")
+    queue_retention: int = Field(default=7 * 24 * 3600, env="QUEUE_RETENTION")
+    step_timeout: float = Field(default=600.0, env="STEP_TIMEOUT")
+    step_timeouts: Dict[str, float] = Field(default={}, env="STEP_TIMEOUTS")
+    run_timeout: float = Field(default=1800.0, env="RUN_TIMEOUT")
+    batch_concurrency: int = Field(default=4, env="BATCH_CONCURRENCY")
+    batch_max_items: int = Field(default=100, env="BATCH_MAX_ITEMS")
 
     class Config:
         env_file = ".env"
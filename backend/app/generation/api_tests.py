@@ -1,14 +1,40 @@
+import copy
+import hashlib
 import json
 import textwrap
-from typing import Dict, Any, List
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
 
-from app.llm.client import CloudRuLLMClient
+from app.llm.pool import get_llm_client
 from app.utils.logging import configure_logging
 
 logger = configure_logging()
 
+SPEC_CACHE_SIZE = 32
+_spec_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# parsed from worker threads (baselines, change sets, prompt compaction) as well as the event loop
+_spec_cache_lock = threading.Lock()
+
 
 def parse_openapi_spec(openapi_content: str) -> Dict[str, Any]:
+    # the same spec is parsed by the analyst, prompt compaction and incremental diffs, often across
+    # several runs of a batch; YAML parsing dominates, so keep recent results and hand out copies
+    key = hashlib.sha256(openapi_content.encode("utf-8")).hexdigest()
+    with _spec_cache_lock:
+        parsed = _spec_cache.get(key)
+        if parsed is not None:
+            _spec_cache.move_to_end(key)
+    if parsed is None:
+        parsed = _parse_openapi_spec(openapi_content)
+        with _spec_cache_lock:
+            _spec_cache[key] = parsed
+            while len(_spec_cache) > SPEC_CACHE_SIZE:
+                _spec_cache.popitem(last=False)
+    return copy.deepcopy(parsed)
+
+
+def _parse_openapi_spec(openapi_content: str) -> Dict[str, Any]:
     try:
         import yaml  # type: ignore
 
@@ -29,6 +55,122 @@ def parse_openapi_spec(openapi_content: str) -> Dict[str, Any]:
         return {"paths": paths}
 
 
+HTTP_METHODS = ("get", "put", "post", "delete", "patch", "head", "options", "trace")
+
+
+def _path_prefix(path: str) -> str:
+    for segment in path.strip("/").split("/"):
+        if segment and not segment.startswith("{"):
+            return segment
+    return "root"
+
+
+def count_operations(spec: Dict[str, Any]) -> int:
+    paths = spec.get("paths", {}) if isinstance(spec, dict) else {}
+    return sum(
+        1 for item in paths.values() if isinstance(item, dict) for method in item if method in HTTP_METHODS
+    )
+
+
+def _collect_refs(node: Any, refs: List[str]) -> None:
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/components/"):
+            refs.append(ref)
+        for value in node.values():
+            _collect_refs(value, refs)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_refs(item, refs)
+
+
+def _referenced_components(spec: Dict[str, Any], paths: Dict[str, Any]) -> Dict[str, Any]:
+    components = spec.get("components") if isinstance(spec.get("components"), dict) else {}
+    selected: Dict[str, Dict[str, Any]] = {}
+    pending: List[str] = []
+    _collect_refs(paths, pending)
+    while pending:
+        parts = pending.pop().split("/")
+        if len(parts) != 4:
+            continue
+        section, name = parts[2], parts[3]
+        if name in selected.get(section, {}):
+            continue
+        value = components.get(section, {}).get(name) if isinstance(components.get(section), dict) else None
+        if value is None:
+            continue
+        selected.setdefault(section, {})[name] = value
+        _collect_refs(value, pending)
+    # security schemes are referenced by name rather than $ref
+    if "securitySchemes" in components:
+        selected["securitySchemes"] = components["securitySchemes"]
+    return selected
+
+
+def split_operations(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    operations: Dict[str, Dict[str, Any]] = {}
+    paths = spec.get("paths") if isinstance(spec.get("paths"), dict) else {}
+    for path, item in paths.items():
+        if not isinstance(item, dict):
+            continue
+        for method in HTTP_METHODS:
+            operation = item.get(method)
+            if not isinstance(operation, dict):
+                continue
+            operations[f"{method.upper()} {path}"] = {
+                "method": method,
+                "path": path,
+                "operation": operation,
+                "components": _referenced_components(spec, {path: {method: operation}}),
+            }
+    return operations
+
+
+def partition_openapi_spec(spec: Dict[str, Any], by: str = "tag", max_operations: int = 40) -> Dict[str, Dict[str, Any]]:
+    paths = spec.get("paths", {}) if isinstance(spec, dict) else {}
+    groups: Dict[str, List[Tuple[str, str, Any, Dict[str, Any]]]] = {}
+    for path, item in paths.items():
+        if not isinstance(item, dict):
+            continue
+        shared = {key: value for key, value in item.items() if key not in HTTP_METHODS}
+        for method, operation in item.items():
+            if method not in HTTP_METHODS:
+                continue
+            tags = operation.get("tags") if isinstance(operation, dict) else None
+            key = str(tags[0]) if by == "tag" and tags else _path_prefix(path)
+            groups.setdefault(key, []).append((path, method, operation, shared))
+
+    # small groups are packed together so a spec with many tiny tags does not fan out into many calls
+    buckets: List[Tuple[List[str], List[Tuple[str, str, Any, Dict[str, Any]]]]] = []
+    for key in sorted(groups):
+        operations = groups[key]
+        for start in range(0, len(operations), max_operations):
+            chunk = operations[start : start + max_operations]
+            if buckets and len(buckets[-1][1]) + len(chunk) <= max_operations:
+                buckets[-1][0].append(key)
+                buckets[-1][1].extend(chunk)
+            else:
+                buckets.append(([key], list(chunk)))
+
+    header = {key: value for key, value in spec.items() if key not in ("paths", "components")}
+    shards: Dict[str, Dict[str, Any]] = {}
+    for keys, operations in buckets:
+        shard_paths: Dict[str, Dict[str, Any]] = {}
+        for path, method, operation, shared in operations:
+            shard_paths.setdefault(path, dict(shared))[method] = operation
+        name = base = "+".join(dict.fromkeys(keys))
+        suffix = 2
+        while name in shards:
+            name = f"{base}#{suffix}"
+            suffix += 1
+        shard = {**header, "paths": shard_paths}
+        components = _referenced_components(spec, shard_paths)
+        if components:
+            shard["components"] = components
+        shards[name] = shard
+    return shards
+
+
 def _negative_status(responses: Dict[str, Any]) -> str:
     for code in ("401", "403", "404", "422", "400"):
         if code in responses:
@@ -38,13 +180,14 @@ def _negative_status(responses: Dict[str, Any]) -> str:
 
 async def _maybe_llm(prompt: str, fallback: str) -> str:
     try:
-        client = CloudRuLLMClient()
+        client = get_llm_client()
         content = await client.chat_completion(
             messages=[
                 {"role": "system", "content": "You generate runnable pytest API tests using httpx."},
                 {"role": "user", "content": prompt},
             ],
             max_tokens=3000,
+            agent="api_tests",
         )
         if content and "httpx" in content:
             return content
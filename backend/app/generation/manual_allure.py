@@ -4,7 +4,7 @@ import json
 import textwrap
 from typing import List, Dict, Any
 
-from app.llm.client import CloudRuLLMClient
+from app.llm.pool import get_llm_client
 from app.utils.logging import configure_logging
 
 logger = configure_logging()
@@ -66,13 +66,14 @@ def _render_manual_case(
 
 async def _maybe_llm(prompt: str, fallback: str) -> str:
     try:
-        client = CloudRuLLMClient()
+        client = get_llm_client()
         content = await client.chat_completion(
             messages=[
                 {"role": "system", "content": "You are a QA lead generating Allure TestOps manual tests in Python. Output only code."},
                 {"role": "user", "content": prompt},
             ],
             max_tokens=4000,
+            agent="manual_allure",
         )
         if content and any(dec in content for dec in ["@allure.manual", "@pytest.mark.manual"]):
             return content
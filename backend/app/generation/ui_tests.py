@@ -2,7 +2,7 @@ import textwrap
 import textwrap
 from typing import List
 
-from app.llm.client import CloudRuLLMClient
+from app.llm.pool import get_llm_client
 from app.utils.logging import configure_logging
 
 logger = configure_logging()
@@ -61,13 +61,14 @@ def _render_ui_test(name: str, actions: List[str], assertions: List[str]) -> str
 
 async def _maybe_llm(prompt: str, fallback: str) -> str:
     try:
-        client = CloudRuLLMClient()
+        client = get_llm_client()
         content = await client.chat_completion(
             messages=[
                 {"role": "system", "content": "You generate Playwright pytest async UI tests."},
                 {"role": "user", "content": prompt},
             ],
             max_tokens=2500,
+            agent="ui_tests",
         )
         if content and "playwright".lower() in content.lower():
             return content
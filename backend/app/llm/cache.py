@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+
+def request_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # get/put block on the disk: the client calls them through asyncio.to_thread
+    def __init__(self, root: Path, max_bytes: int, max_age: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # path -> (atime, mtime, size); built by one scan, then kept up to date by get/put
+        self._entries: Optional[Dict[Path, Tuple[float, float, int]]] = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls) -> Optional["ResponseCache"]:
+        settings = get_settings()
+        if not settings.llm_cache_enabled:
+            return None
+        root = Path(settings.data_path or "./data") / "llm_cache"
+        return cls(root, settings.llm_cache_max_bytes, settings.llm_cache_max_age)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _expired(self, mtime: float, now: float) -> bool:
+        return self.max_age > 0 and now - mtime > self.max_age
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        now = time.time()
+        try:
+            mtime = path.stat().st_mtime
+            if self._expired(mtime, now):
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    self._forget(path)
+                    self.evictions += 1
+                    self.misses += 1
+                return None
+            content = json.loads(path.read_text())["content"]
+            # mtime records when the entry was stored (age), atime is the LRU clock
+            os.utime(path, (now, mtime))
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(path) if self._entries is not None else None
+            if entry is not None:
+                self._entries[path] = (now, entry[1], entry[2])
+            self.hits += 1
+        return content
+
+    def put(self, key: str, content: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            tmp.write_text(json.dumps({"content": content}))
+            os.replace(tmp, path)
+            stat = path.stat()
+        except OSError as exc:
+            tmp.unlink(missing_ok=True)
+            logger.warning("Failed to write LLM cache entry %s: %s", key, exc)
+            return
+        with self._lock:
+            self._index()
+            self._forget(path)
+            self._entries[path] = (stat.st_atime, stat.st_mtime, stat.st_size)
+            self._size += stat.st_size
+            if self._size > self.max_bytes > 0:
+                self._evict(time.time())
+
+    def _forget(self, path: Path) -> None:
+        entry = self._entries.pop(path, None) if self._entries is not None else None
+        if entry is not None:
+            self._size -= entry[2]
+
+    def _index(self) -> Dict[Path, Tuple[float, float, int]]:
+        # the directory is scanned once per process; afterwards the running total decides when to evict
+        if self._entries is None:
+            self._entries, self._size = {}, 0
+            for path in self.root.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                self._entries[path] = (stat.st_atime, stat.st_mtime, stat.st_size)
+                self._size += stat.st_size
+        return self._entries
+
+    def _evict(self, now: float) -> None:
+        # expired entries first, then least recently read until the cache fits its budget again
+        entries = self._index()
+        for path in [path for path, (_, mtime, _) in entries.items() if self._expired(mtime, now)]:
+            path.unlink(missing_ok=True)
+            self._forget(path)
+            self.evictions += 1
+        if self.max_bytes > 0 and self._size > self.max_bytes:
+            for path, _ in sorted(entries.items(), key=lambda item: item[1][0]):
+                path.unlink(missing_ok=True)
+                self._forget(path)
+                self.evictions += 1
+                if self._size <= self.max_bytes:
+                    break
+
+    def prune(self) -> None:
+        # rescans the directory, e.g. to pick up entries written by other processes
+        with self._lock:
+            self._entries = None
+            self._evict(time.time())
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self.root.glob("*/*.json"):
+                path.unlink(missing_ok=True)
+            self._entries, self._size = {}, 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -1,29 +1,129 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
-from openai import AsyncOpenAI
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, RateLimitError
 
 from app.config import get_settings
+from app.llm.cache import ResponseCache, request_key
+from app.llm.limits import estimate_tokens, limiter_for
+from app.llm.metrics import record_llm_call
+from app.llm.singleflight import SingleFlight
 from app.utils.logging import configure_logging
 from app.utils.errors import LLMServiceError
+from app.utils.tracing import span
 
 logger = configure_logging()
 
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _is_throttled(exc: Optional[BaseException]) -> bool:
+    return isinstance(exc, RateLimitError) or (isinstance(exc, APIStatusError) and exc.status_code == 429)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code in RETRYABLE_STATUS
+
+
+def _usage(usage: Any) -> Tuple[int, int]:
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HeldStream:
+    # a streamed completion keeps its limiter slot until the last chunk is read or the stream is closed,
+    # so streams count against the concurrency limit and the latency sample covers the whole generation
+    def __init__(self, stream: Any, release: Callable[[str], Awaitable[None]]):
+        self.stream = stream
+        self._release = release
+        self._released = False
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        outcome = "error"
+        try:
+            async for chunk in self.stream:
+                yield chunk
+            outcome = "ok"
+        finally:
+            await self.release(outcome)
+
+    async def release(self, outcome: str) -> None:
+        if self._released:
+            return
+        self._released = True
+        await self._release(outcome)
+
+    async def aclose(self) -> None:
+        try:
+            close = getattr(self.stream, "close", None)
+            if close is not None:
+                await close()
+        finally:
+            await self.release("error")
+
 
 class CloudRuLLMClient:
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         self.settings = get_settings()
         base_url = self.settings.cloudru_base_url.rstrip("/")
         parsed = urlparse(base_url)
-        if parsed.hostname in {"localhost", "127.0.0.1", "::1"}:
+        if parsed.hostname in {"localhost", "127.0.0.1", "::1"} and not self.settings.llm_allow_local_base_url:
             logger.warning(
                 "Configured CLOUDRU_BASE_URL points to %s; overriding to official external endpoint", base_url
             )
             base_url = "https://foundation-models.api.cloud.ru/v1"
         self.base_url = base_url
-        self.client = AsyncOpenAI(api_key=self.settings.cloudru_api_key, base_url=self.base_url)
+        self.http_client = http_client
+        self.client = AsyncOpenAI(
+            api_key=self.settings.cloudru_api_key or "offline",
+            base_url=self.base_url,
+            timeout=self.settings.request_timeout,
+            max_retries=0,
+            http_client=http_client,
+        )
+        self.cache = ResponseCache.from_settings()
+        self.flights = SingleFlight()
+
+    async def aclose(self) -> None:
+        await self.client.close()
 
     def _require_api_key(self):
+        if self.settings.llm_transport in ("stub", "replay") and self.http_client is not None:
+            return
         if not self.settings.cloudru_api_key:
             raise LLMServiceError(
                 detail="CLOUDRU_API_KEY is not set; Cloud.ru foundation models API is external-only and requires a valid token.",
@@ -39,18 +139,174 @@ class CloudRuLLMClient:
             logger.error("Failed to list models: %s", exc)
             raise LLMServiceError(detail=str(exc))
 
-    async def chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None, **kwargs) -> str:
+    def _retry_delay(self, exc: BaseException, attempt: int) -> Optional[float]:
+        base = self.settings.llm_retry_backoff
+        cap = self.settings.llm_retry_backoff_max
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            # the server's Retry-After is a minimum: retrying sooner is throttled again and burns the retry budget
+            if retry_after > cap:
+                return None
+            return retry_after + random.uniform(0, base)
+        return random.uniform(0, min(cap, base * 2**attempt))
+
+    async def _create(self, **params) -> Any:
+        limiter = limiter_for(params["model"])
+        estimate = estimate_tokens(params["messages"], params.get("max_tokens"))
+        attempt = 0
+        while True:
+            with span("llm.wait", model=params["model"], estimated_tokens=estimate):
+                await limiter.acquire(estimate)
+            started = time.monotonic()
+            outcome = "error"
+            held = False
+            try:
+                with span("llm.request", attempt=attempt + 1, stream=bool(params.get("stream"))):
+                    result = await self.client.chat.completions.create(**params)
+                outcome = "ok"
+                if params.get("stream"):
+                    held = True
+                    return HeldStream(
+                        result, lambda result_outcome: limiter.release(time.monotonic() - started, result_outcome)
+                    )
+                return result
+            except Exception as exc:  # noqa: BLE001
+                if _is_throttled(exc):
+                    outcome = "throttled"
+                if attempt >= self.settings.retries or not _is_retryable(exc):
+                    raise
+                delay = self._retry_delay(exc, attempt)
+                if delay is None:
+                    logger.warning(
+                        "Chat completion asked to retry after more than %ss; giving up", self.settings.llm_retry_backoff_max
+                    )
+                    raise
+            finally:
+                if not held:
+                    await limiter.release(time.monotonic() - started, outcome)
+            attempt += 1
+            logger.warning("Chat completion attempt %s failed (%s); retrying in %.2fs", attempt, outcome, delay)
+            await asyncio.sleep(delay)
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        agent: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        model = model or self.settings.model_default
+        with span("llm.call", agent=agent or "unknown", model=model):
+            return await self._chat_completion(messages, model, use_cache, agent, **kwargs)
+
+    async def _chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        use_cache: bool,
+        agent: Optional[str],
+        **kwargs,
+    ) -> str:
         self._require_api_key()
+        started = time.monotonic()
+        key = request_key(model, messages, kwargs)
+        if self.cache and use_cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                record_llm_call(model, agent, "cached", time.monotonic() - started)
+                return cached
+        try:
+            if self.settings.llm_coalesce:
+                (content, usage), shared = await self.flights.do(
+                    key, lambda: self._complete(key, model, messages, **kwargs)
+                )
+            else:
+                content, usage = await self._complete(key, model, messages, **kwargs)
+                shared = False
+        except LLMServiceError:
+            record_llm_call(model, agent, "error", time.monotonic() - started)
+            raise
+        if shared:
+            record_llm_call(model, agent, "coalesced", time.monotonic() - started)
+        else:
+            record_llm_call(model, agent, "ok", time.monotonic() - started, *usage)
+        return content
+
+    async def _complete(
+        self, key: str, model: str, messages: List[Dict[str, str]], **kwargs
+    ) -> Tuple[str, Tuple[int, int]]:
         try:
-            completion = await self.client.chat.completions.create(
-                model=model or self.settings.model_default,
+            completion = await self._create(
+                model=model,
                 messages=messages,
                 **kwargs,
             )
             choices = completion.choices
             if not choices:
                 raise LLMServiceError(detail="No completion returned")
-            return choices[0].message.content or ""
+            content = choices[0].message.content or ""
+        except LLMServiceError:
+            raise
         except Exception as exc:  # noqa: BLE001
             logger.error("Chat completion failed: %s", exc)
-            raise LLMServiceError(detail=str(exc))
+            raise LLMServiceError(detail=str(exc), status_code=429 if _is_throttled(exc) else 502)
+        if self.cache and content:
+            await asyncio.to_thread(self.cache.put, key, content)
+        return content, _usage(getattr(completion, "usage", None))
+
+    def stats(self) -> Dict[str, int]:
+        stats = {"coalesced": self.flights.coalesced, "inflight": self.flights.inflight()}
+        if self.cache:
+            stats.update({f"cache_{name}": value for name, value in self.cache.stats().items()})
+        return stats
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        use_cache: bool = True,
+        agent: Optional[str] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        self._require_api_key()
+        model = model or self.settings.model_default
+        started = time.monotonic()
+        key = request_key(model, messages, kwargs) if self.cache else None
+        if key and use_cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                record_llm_call(model, agent, "cached", time.monotonic() - started)
+                yield cached
+                return
+        chunks: List[str] = []
+        usage = (0, 0)
+        stream: Optional[HeldStream] = None
+        try:
+            # without include_usage the API sends no usage on streams and their tokens never reach the metrics
+            stream = await self._create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **{"stream_options": {"include_usage": True}, **kwargs},
+            )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = _usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+        except Exception as exc:  # noqa: BLE001
+            record_llm_call(model, agent, "error", time.monotonic() - started)
+            logger.error("Streaming chat completion failed: %s", exc)
+            raise LLMServiceError(detail=str(exc), status_code=429 if _is_throttled(exc) else 502)
+        finally:
+            # a consumer that stops early (or is cancelled) must still hand the limiter slot back
+            if stream is not None:
+                await stream.aclose()
+        record_llm_call(model, agent, "ok", time.monotonic() - started, *usage)
+        if key and chunks:
+            await asyncio.to_thread(self.cache.put, key, "".join(chunks))
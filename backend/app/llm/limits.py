@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.utils.metrics import registry as metrics
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> int:
+    prompt_chars = sum(len(str(message.get("content") or "")) for message in messages)
+    return prompt_chars // 4 + (max_tokens or 0)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        # requests larger than the whole bucket wait for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self.inflight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, latency: float, outcome: str) -> None:
+        async with self._cond:
+            self.inflight -= 1
+            if outcome == "throttled":
+                self.limit = max(self.minimum, self.limit / 2)
+            elif outcome == "ok":
+                if self.latency_target > 0 and latency > self.latency_target:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class ModelLimiter:
+    def __init__(
+        self,
+        concurrency: AdaptiveLimiter,
+        requests: Optional[TokenBucket] = None,
+        tokens: Optional[TokenBucket] = None,
+    ):
+        self.concurrency = concurrency
+        self.requests = requests
+        self.tokens = tokens
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens:
+            await self.tokens.acquire(estimated_tokens)
+        await self.concurrency.acquire()
+
+    async def release(self, latency: float, outcome: str) -> None:
+        await self.concurrency.release(latency, outcome)
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+
+
+def limiter_for(model: str) -> ModelLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        settings = get_settings()
+        limiter = ModelLimiter(
+            AdaptiveLimiter(
+                settings.llm_concurrency,
+                settings.llm_min_concurrency,
+                settings.llm_max_concurrency,
+                settings.llm_latency_target,
+            ),
+            TokenBucket(settings.llm_requests_per_minute) if settings.llm_requests_per_minute > 0 else None,
+            TokenBucket(settings.llm_tokens_per_minute) if settings.llm_tokens_per_minute > 0 else None,
+        )
+        _limiters[model] = limiter
+    return limiter
+
+
+metrics.gauge(
+    "llm_concurrency_limit",
+    "Current adaptive concurrency limit per model",
+    ("model",),
+    lambda: {(model,): limiter.concurrency.limit for model, limiter in _limiters.items()},
+)
+metrics.gauge(
+    "llm_inflight_requests",
+    "Upstream requests currently holding a concurrency slot",
+    ("model",),
+    lambda: {(model,): limiter.concurrency.inflight for model, limiter in _limiters.items()},
+)
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.schemas.pipeline import LLMUsage
+from app.utils.metrics import registry
+from app.utils.tracing import current_span
+
+LLM_CALLS = registry.counter("llm_calls_total", "LLM chat completions by outcome", ("model", "agent", "outcome"))
+LLM_PROMPT_TOKENS = registry.counter("llm_prompt_tokens_total", "Prompt tokens sent upstream", ("model", "agent"))
+LLM_COMPLETION_TOKENS = registry.counter(
+    "llm_completion_tokens_total", "Completion tokens received from upstream", ("model", "agent")
+)
+PROMPT_TOKENS = registry.counter(
+    "llm_prompt_packing_tokens_total", "Estimated prompt tokens before and after packing", ("agent", "stage")
+)
+LLM_LATENCY = registry.histogram("llm_call_latency_seconds", "LLM call latency including queueing", ("model", "agent"))
+
+_run_usage: ContextVar[Optional[Dict[str, LLMUsage]]] = ContextVar("run_usage", default=None)
+
+
+@contextmanager
+def track_run_usage(usage: Dict[str, LLMUsage]) -> Iterator[Dict[str, LLMUsage]]:
+    token = _run_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _run_usage.reset(token)
+
+
+def record_llm_call(
+    model: str,
+    agent: Optional[str],
+    outcome: str,
+    latency: float,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+) -> None:
+    agent = agent or "unknown"
+    active = current_span()
+    if active is not None:
+        active.set(outcome=outcome, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    LLM_CALLS.inc((model, agent, outcome))
+    LLM_LATENCY.observe((model, agent), latency)
+    if prompt_tokens:
+        LLM_PROMPT_TOKENS.inc((model, agent), prompt_tokens)
+    if completion_tokens:
+        LLM_COMPLETION_TOKENS.inc((model, agent), completion_tokens)
+    usage = _run_usage.get()
+    if usage is not None:
+        totals = usage.setdefault(agent, LLMUsage())
+        totals.calls += 1
+        totals.prompt_tokens += prompt_tokens
+        totals.completion_tokens += completion_tokens
+        totals.latency_seconds += latency
+        if outcome in ("cached", "coalesced"):
+            totals.cached += 1
+        elif outcome == "error":
+            totals.failed += 1
+
+
+def record_prompt_packing(agent: str, before: int, after: int) -> None:
+    PROMPT_TOKENS.inc((agent, "before"), before)
+    PROMPT_TOKENS.inc((agent, "after"), after)
+    usage = _run_usage.get()
+    if usage is not None:
+        totals = usage.setdefault(agent, LLMUsage())
+        totals.packed_tokens_before += before
+        totals.packed_tokens_after += after
@@ -0,0 +1,99 @@
+import asyncio
+import importlib.util
+from typing import Dict, Tuple
+
+import httpx
+
+from app.config import Settings, get_settings
+from app.llm.client import CloudRuLLMClient
+from app.llm.transport import build_transport
+from app.utils.logging import configure_logging
+from app.utils.metrics import registry as metrics
+
+logger = configure_logging()
+
+
+def build_http_client(settings: Settings) -> httpx.AsyncClient:
+    http2 = settings.llm_http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed; falling back to HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(settings.request_timeout, connect=min(10, settings.request_timeout))
+    inner = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+    return httpx.AsyncClient(transport=build_transport(settings, inner), timeout=timeout)
+
+
+class LLMClientRegistry:
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], CloudRuLLMClient] = {}
+
+    def get(self) -> CloudRuLLMClient:
+        settings = get_settings()
+        key = (settings.cloudru_base_url, settings.cloudru_api_key)
+        client = self._clients.get(key)
+        if client is None:
+            client = CloudRuLLMClient(http_client=build_http_client(settings))
+            self._clients[key] = client
+        return client
+
+    async def prewarm(self) -> int:
+        settings = get_settings()
+        count = settings.llm_prewarm_connections
+        if count <= 0 or not settings.cloudru_api_key or settings.llm_transport in ("stub", "replay"):
+            return 0
+        client = self.get()
+        headers = {"Authorization": f"Bearer {settings.cloudru_api_key}"}
+
+        async def touch() -> bool:
+            try:
+                await client.http_client.get(f"{client.base_url}/models", headers=headers)
+                return True
+            except httpx.HTTPError as exc:
+                logger.warning("LLM connection pre-warm failed: %s", exc)
+                return False
+
+        # concurrent requests force the pool to open distinct keep-alive connections
+        warmed = sum(await asyncio.gather(*(touch() for _ in range(count))))
+        logger.info("Pre-warmed %s/%s LLM connections to %s", warmed, count, client.base_url)
+        return warmed
+
+    def stats(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for client in self._clients.values():
+            for name, value in client.stats().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+registry = LLMClientRegistry()
+
+# everything but the in-flight count only ever grows
+GAUGE_STATS = {"inflight"}
+
+metrics.collected_counter(
+    "llm_client_events_total",
+    "Response cache and request coalescing counters of the shared LLM clients",
+    ("stat",),
+    lambda: {(name,): value for name, value in registry.stats().items() if name not in GAUGE_STATS},
+)
+metrics.gauge(
+    "llm_client_inflight",
+    "Distinct LLM requests in flight in the shared clients",
+    (),
+    lambda: {(): registry.stats().get("inflight", 0)},
+)
+
+
+def get_llm_client() -> CloudRuLLMClient:
+    return registry.get()
@@ -0,0 +1,58 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Extracts objects from top-level JSON arrays while the document is still streaming:
+# feeding '{"cases": [{...}, {...' yields the first case as soon as its closing brace arrives.
+class IncrementalJsonParser:
+    def __init__(self, keys: Iterable[str]):
+        self.keys = set(keys)
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_key: Optional[str] = None
+        self._item: Optional[List[str]] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        items: List[Tuple[str, Dict[str, Any]]] = []
+        for char in chunk:
+            if self._item is not None:
+                self._item.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._string)
+                elif len(self._stack) == 1:
+                    # only top-level keys matter; values deeper down are not buffered
+                    self._string.append(char)
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string.clear()
+            elif char == ":" and len(self._stack) == 1:
+                self._current_key = self._last_string
+            elif char in "{[":
+                self._stack.append(char)
+                if char == "[" and len(self._stack) == 2:
+                    self._array_key = self._current_key if self._current_key in self.keys else None
+                elif char == "{" and len(self._stack) == 3 and self._array_key and self._stack[1] == "[":
+                    self._item = ["{"]
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and len(self._stack) == 2 and self._item is not None:
+                    raw = "".join(self._item)
+                    self._item = None
+                    try:
+                        items.append((self._array_key, json.loads(raw)))
+                    except ValueError:
+                        pass
+                elif char == "]" and len(self._stack) == 1:
+                    self._array_key = None
+        return items
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import random
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.llm.transport import stub_completion, stub_models, stub_stream
+
+# Local OpenAI-compatible stand-in for load tests:
+#   STUB_LATENCY=1.5 STUB_JITTER=0.5 uvicorn app.llm.stub_server:app --port 9000
+#   CLOUDRU_BASE_URL=http://localhost:9000/v1 LLM_ALLOW_LOCAL_BASE_URL=1 uvicorn app.main:app
+LATENCY = float(os.getenv("STUB_LATENCY", "0"))
+JITTER = float(os.getenv("STUB_JITTER", "0"))
+_random = random.Random(int(os.environ["STUB_SEED"]) if os.getenv("STUB_SEED") else None)
+
+app = FastAPI(title="TestOps Copilot LLM stub")
+
+
+async def _delay() -> None:
+    delay = LATENCY + (_random.uniform(-JITTER, JITTER) if JITTER else 0.0)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+@app.get("/v1/models")
+async def models() -> Dict[str, Any]:
+    return stub_models()
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await _delay()
+    if body.get("stream"):
+        return StreamingResponse(iter(stub_stream(body)), media_type="text/event-stream")
+    return stub_completion(body)
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config import Settings
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+TRANSPORT_MODES = {"live", "record", "replay", "stub"}
+
+# A single payload every agent can parse: pydantic ignores the keys a schema does not declare.
+STUB_CONTENT = {
+    "features": ["stub feature"],
+    "flows": ["stub flow"],
+    "entities": [],
+    "constraints": [],
+    "risks": [],
+    "coverage_matrix": {"stub area": ["stub case"]},
+    "gaps": [],
+    "cases": [
+        {
+            "title": "Stub case",
+            "severity": "NORMAL",
+            "owner": "qa-team",
+            "priority": "P2",
+            "feature": "stub feature",
+            "story": "stub area",
+            "suite": "manual",
+            "tags": ["NORMAL"],
+            "steps": ["Arrange stub", "Act stub"],
+            "expected": ["Assert stub"],
+        }
+    ],
+    "ui": [{"name": "stub_ui", "steps": ["open"], "assertions": ["visible"], "target": "ui", "negative": False}],
+    "api": [{"name": "stub_api", "steps": ["call"], "assertions": ["200"], "target": "api", "negative": False}],
+    "issues": [],
+    "valid": True,
+    "duplicates": [],
+    "conflicts": [],
+    "suggestions": [],
+}
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    try:
+        normalized = json.dumps(json.loads(body or b"{}"), sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        normalized = body.decode("utf-8", "replace")
+    return hashlib.sha256(f"{method} {path} {normalized}".encode("utf-8")).hexdigest()
+
+
+def stub_models() -> Dict[str, Any]:
+    return {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]}
+
+
+def stub_completion(body: Dict[str, Any], content: Optional[str] = None) -> Dict[str, Any]:
+    content = content if content is not None else json.dumps(STUB_CONTENT)
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in body.get("messages", []))
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub-model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_chars // 4 + len(content) // 4,
+        },
+    }
+
+
+def stub_stream(body: Dict[str, Any], content: Optional[str] = None, chunk_size: int = 64) -> List[str]:
+    completion = stub_completion(body, content)
+    text = completion["choices"][0]["message"]["content"]
+    events = []
+    for idx in range(0, len(text), chunk_size):
+        chunk = {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+            "choices": [{"index": 0, "delta": {"content": text[idx : idx + chunk_size]}, "finish_reason": None}],
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        # like the OpenAI API: one last chunk without choices carries the usage of the whole stream
+        chunk = {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+            "choices": [],
+            "usage": completion["usage"],
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return events
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: Optional[int] = None, content: Optional[str] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.content = content
+        self._random = random.Random(seed)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if request.url.path.endswith("/models"):
+            return httpx.Response(200, json=stub_models(), request=request)
+        body = json.loads(await request.aread() or b"{}")
+        if body.get("stream"):
+            payload = "".join(stub_stream(body, self.content)).encode("utf-8")
+            return httpx.Response(
+                200, content=payload, headers={"content-type": "text/event-stream"}, request=request
+            )
+        return httpx.Response(200, json=stub_completion(body, self.content), request=request)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, cassette: Path):
+        self.inner = inner
+        self.cassette = cassette
+        self.cassette.parent.mkdir(parents=True, exist_ok=True)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        entry = {
+            "key": request_fingerprint(request.method, request.url.path, body),
+            "status": response.status_code,
+            "headers": {"content-type": response.headers.get("content-type", "application/json")},
+            "body": content.decode("utf-8", "replace"),
+        }
+        with self.cassette.open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        }
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Path, latency: float = 0.0):
+        self.latency = latency
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        if cassette.exists():
+            for line in cassette.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry["key"], []).append(entry)
+        else:
+            logger.warning("LLM cassette %s does not exist; every replayed request will miss", cassette)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        key = request_fingerprint(request.method, request.url.path, await request.aread())
+        entries = self.entries.get(key)
+        if not entries:
+            error = {"error": {"message": f"No recorded response for {request.method} {request.url.path}"}}
+            return httpx.Response(404, json=error, request=request)
+        # identical requests recorded several times are replayed round-robin
+        idx = self._cursor.get(key, 0)
+        self._cursor[key] = idx + 1
+        entry = entries[idx % len(entries)]
+        return httpx.Response(
+            entry["status"], headers=entry["headers"], content=entry["body"].encode("utf-8"), request=request
+        )
+
+
+def cassette_path(settings: Settings) -> Path:
+    if settings.llm_cassette_path:
+        return Path(settings.llm_cassette_path)
+    return Path(settings.data_path or "./data") / "cassettes" / "llm.jsonl"
+
+
+def build_transport(settings: Settings, inner: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    mode = settings.llm_transport
+    if mode not in TRANSPORT_MODES:
+        logger.warning("Unknown LLM_TRANSPORT %r; using live transport", mode)
+        return inner
+    if mode == "stub":
+        return StubTransport(settings.llm_stub_latency, settings.llm_stub_jitter, settings.llm_stub_seed)
+    if mode == "replay":
+        return ReplayTransport(cassette_path(settings), settings.llm_stub_latency)
+    if mode == "record":
+        return RecordingTransport(inner, cassette_path(settings))
+    return inner
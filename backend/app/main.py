@@ -1,9 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routes import router
+from app.api.routes import execute_job, router
+from app.config import get_settings
+from app.llm.pool import registry as llm_registry
+from app.orchestrator.queue import WorkerPool, get_job_queue
+from app.storage.retention import RetentionCollector
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    await llm_registry.prewarm()
+    workers = WorkerPool(get_job_queue(), execute_job, settings.queue_workers, settings.queue_poll_interval)
+    workers.start()
+    app.state.workers = workers
+    retention = RetentionCollector(settings.retention_gc_interval, get_job_queue().active)
+    retention.start()
+    app.state.retention = retention
+    yield
+    await retention.stop()
+    await workers.stop()
+    await llm_registry.aclose()
+
 
-app = FastAPI(title="TestOps Copilot")
+app = FastAPI(title="TestOps Copilot", lifespan=lifespan)
+app.state.llm = llm_registry
 app.include_router(router, prefix="/api")
 
 app.add_middleware(
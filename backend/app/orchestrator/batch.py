@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+from app.orchestrator.checkpoints import digest
+from app.orchestrator.runner import PIPELINE, PipelineRunner
+from app.schemas.pipeline import BatchInput, BatchRecord, RunInput, StepStatus
+from app.storage import artifacts
+from app.storage.events import load_record
+from app.storage.run_index import get_run_index
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+FINISHED_STEPS = {
+    StepStatus.success,
+    StepStatus.failed,
+    StepStatus.skipped,
+    StepStatus.cancelled,
+    StepStatus.timed_out,
+}
+
+
+def create_batch(batch_id: str, body: BatchInput) -> BatchRecord:
+    run_ids: List[str] = []
+    by_input: Dict[str, str] = {}
+    created_at = artifacts.timestamp()
+    for item in body.items:
+        # identical items are generated once and share the run
+        key = digest(item.dict())
+        if key not in by_input:
+            run_id = f"{batch_id}-{len(by_input) + 1:03d}"
+            base = artifacts.create_run_folder(run_id)
+            artifacts.write_json(base / "input.json", item.dict())
+            get_run_index().register(run_id, item, created_at)
+            by_input[key] = run_id
+        run_ids.append(by_input[key])
+    record = BatchRecord(id=batch_id, items=run_ids, created_at=created_at)
+    folder = artifacts.batches_root() / batch_id
+    folder.mkdir(parents=True, exist_ok=True)
+    artifacts.write_json(folder / "batch.json", record.dict())
+    return record
+
+
+def load_batch(batch_id: str) -> BatchRecord:
+    path = artifacts.batches_root() / batch_id / "batch.json"
+    if not path.exists():
+        raise FileNotFoundError(batch_id)
+    return BatchRecord.parse_file(path)
+
+
+def batch_of(run_id: str) -> Optional[str]:
+    # batch items are named "<batch>-<nnn>" and run inside the queue job of their batch
+    batch_id, _, seq = run_id.rpartition("-")
+    if not batch_id or not seq.isdigit():
+        return None
+    try:
+        batch = load_batch(batch_id)
+    except (FileNotFoundError, ValueError):
+        return None
+    return batch_id if run_id in batch.items else None
+
+
+async def run_batch(runner: PipelineRunner, batch_id: str, resume: bool = False) -> None:
+    batch = load_batch(batch_id)
+    run_ids = list(dict.fromkeys(batch.items))
+    # more runs in flight than LLM slots keeps the limiter saturated: one run's analyst call
+    # overlaps another run's manual/autotests calls instead of the model idling between stages
+    gate = asyncio.Semaphore(max(1, get_settings().batch_concurrency))
+
+    async def run_item(run_id: str) -> bool:
+        async with gate:
+            inputs = RunInput.parse_file(artifacts.runs_root() / run_id / "input.json")
+            try:
+                await runner.run_and_record(run_id, inputs, resume=resume)
+            except Exception:  # noqa: BLE001
+                return False
+            return True
+
+    outcomes = await asyncio.gather(*(run_item(run_id) for run_id in run_ids))
+    failed = outcomes.count(False)
+    logger.info("Batch %s finished: %s/%s runs succeeded", batch_id, len(run_ids) - failed, len(run_ids))
+    if failed:
+        raise RuntimeError(f"{failed} of {len(run_ids)} runs in batch {batch_id} failed")
+
+
+def _run_progress(run_id: str) -> Dict[str, Any]:
+    base = artifacts.runs_root() / run_id
+    status = "failed" if (base / "error.txt").exists() else None
+    record = load_record(base)
+    if record is None and status is None:
+        return {"run_id": run_id, "status": "queued", "steps_finished": 0}
+    finished = sum(1 for step in record.steps.values() if step.status in FINISHED_STEPS) if record else 0
+    if status is None and any(step.status == StepStatus.cancelled for step in record.steps.values()):
+        status = "cancelled"
+    if status is None:
+        status = "completed" if finished == len(PIPELINE) else "running"
+    return {"run_id": run_id, "status": status, "steps_finished": finished}
+
+
+def batch_progress(batch: BatchRecord) -> Dict[str, Any]:
+    runs = [_run_progress(run_id) for run_id in dict.fromkeys(batch.items)]
+    counts: Dict[str, int] = {}
+    for run in runs:
+        counts[run["status"]] = counts.get(run["status"], 0) + 1
+    total_steps = len(runs) * len(PIPELINE)
+    finished_steps = sum(run["steps_finished"] for run in runs)
+    if counts.get("queued", 0) == len(runs):
+        status = "queued"
+    elif counts.get("queued", 0) or counts.get("running", 0):
+        status = "running"
+    elif counts.get("failed"):
+        status = "failed"
+    else:
+        status = "cancelled" if counts.get("cancelled") else "completed"
+    return {
+        "batch_id": batch.id,
+        "status": status,
+        "items": batch.items,
+        "runs": runs,
+        "progress": {
+            "runs": counts,
+            "steps_finished": finished_steps,
+            "steps_total": total_steps,
+            "percent": round(100 * finished_steps / total_steps, 1) if total_steps else 100.0,
+        },
+    }
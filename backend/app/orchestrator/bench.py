@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from typing import List
+
+# Offline throughput benchmark for PipelineRunner.run:
+#   LLM_TRANSPORT=stub LLM_STUB_LATENCY=0.5 LLM_STUB_JITTER=0.2 LLM_STUB_SEED=1 \
+#       python -m app.orchestrator.bench --runs 20 --concurrency 10
+
+
+async def _bench(runs: int, concurrency: int, requirements: str) -> None:
+    from app.llm.pool import registry
+    from app.orchestrator.runner import PipelineRunner
+    from app.schemas.pipeline import RunInput
+
+    runner = PipelineRunner()
+    gate = asyncio.Semaphore(concurrency)
+    durations: List[float] = []
+    prefix = f"bench-{uuid.uuid4().hex[:6]}"
+
+    async def one(idx: int) -> None:
+        async with gate:
+            started = time.monotonic()
+            await runner.run(f"{prefix}-{idx}", RunInput(requirements=f"{requirements} #{idx}", bypass_cache=True))
+            durations.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*(one(idx) for idx in range(runs)))
+    elapsed = time.monotonic() - started
+    await registry.aclose()
+    durations.sort()
+    print(f"runs={runs} concurrency={concurrency} wall={elapsed:.2f}s throughput={runs / elapsed:.2f} runs/s")
+    print(
+        f"latency p50={statistics.median(durations):.2f}s "
+        f"p95={durations[min(len(durations) - 1, int(len(durations) * 0.95))]:.2f}s max={durations[-1]:.2f}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark PipelineRunner.run against an offline LLM transport")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--requirements", default="Users can configure a VM and see the monthly price.")
+    args = parser.parse_args()
+    os.environ.setdefault("LLM_TRANSPORT", "stub")
+    asyncio.run(_bench(args.runs, args.concurrency, args.requirements))
+
+
+if __name__ == "__main__":
+    main()
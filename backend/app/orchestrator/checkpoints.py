@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from app.storage import artifacts
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+CHECKPOINT_FILE = "checkpoints.json"
+# bump when prompts or step semantics change so old checkpoints stop matching
+CHECKPOINT_VERSION = 2
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def digest(data: Any) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def step_fingerprint(step: str, model: Optional[str], inputs: Dict[str, Any]) -> str:
+    return digest({"version": CHECKPOINT_VERSION, "step": step, "model": model, "inputs": inputs})
+
+
+class CheckpointStore:
+    def __init__(self, base: Path):
+        self.path = base / CHECKPOINT_FILE
+        self.base = base
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # steps save and discard from worker threads concurrently
+        self._lock = threading.Lock()
+
+    def load(self) -> "CheckpointStore":
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except ValueError:
+                logger.warning("Ignoring unreadable checkpoints in %s", self.path)
+                self.entries = {}
+        return self
+
+    def reset(self) -> None:
+        self.entries = {}
+        self.path.unlink(missing_ok=True)
+
+    def restore(self, step: str, fingerprint: str, model: Type[ModelT]) -> Optional[ModelT]:
+        entry = self.entries.get(step)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+        # sealed runs keep their outputs in the blob store
+        raw = artifacts.read_artifact(self.base, entry["output"])
+        if raw is None:
+            return None
+        # partial files written while streaming never match the recorded digest
+        if hashlib.sha256(raw).hexdigest() != entry.get("sha256"):
+            logger.info("Checkpoint for step %s is stale: %s changed", step, entry["output"])
+            return None
+        try:
+            return model.parse_raw(raw)
+        except ValidationError:
+            return None
+
+    def save(self, step: str, fingerprint: str, output: str) -> None:
+        raw = (self.base / output).read_bytes()
+        with self._lock:
+            self.entries[step] = {
+                "fingerprint": fingerprint,
+                "output": output,
+                "sha256": hashlib.sha256(raw).hexdigest(),
+                "completed_at": artifacts.timestamp(),
+            }
+            artifacts.write_json(self.path, self.entries)
+
+    def discard(self, step: str) -> None:
+        with self._lock:
+            if self.entries.pop(step, None) is not None:
+                artifacts.write_json(self.path, self.entries)
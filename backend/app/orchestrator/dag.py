@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+StepFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class Step:
+    def __init__(self, name: str, fn: StepFn, deps: Sequence[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class DagResult:
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.skipped: Dict[str, str] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.skipped
+
+
+def validate_dag(steps: Sequence[Step]) -> None:
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate step names in {names}")
+    for step in steps:
+        unknown = set(step.deps) - set(names)
+        if unknown:
+            raise ValueError(f"Step {step.name} depends on unknown steps {sorted(unknown)}")
+    remaining = {step.name: set(step.deps) for step in steps}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between steps {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+async def run_dag(steps: Sequence[Step]) -> DagResult:
+    validate_dag(steps)
+    outcome = DagResult()
+    pending: List[Step] = list(steps)
+    running: Dict[asyncio.Task, str] = {}
+    try:
+        while pending or running:
+            for step in list(pending):
+                blocked = [dep for dep in step.deps if dep in outcome.errors or dep in outcome.skipped]
+                if blocked:
+                    outcome.skipped[step.name] = blocked[0]
+                    pending.remove(step)
+                elif all(dep in outcome.results for dep in step.deps):
+                    running[asyncio.ensure_future(step.fn(outcome.results))] = step.name
+                    pending.remove(step)
+            if not running:
+                continue
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                if task.cancelled():
+                    outcome.errors[name] = asyncio.CancelledError()
+                elif task.exception() is not None:
+                    outcome.errors[name] = task.exception()
+                else:
+                    outcome.results[name] = task.result()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    return outcome
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import math
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.generation.api_tests import parse_openapi_spec, split_operations
+from app.orchestrator.checkpoints import digest
+from app.schemas.pipeline import AnalystPlan, AutotestBundle, AutotestCase, ManualBundle, ManualTestCase, RunInput
+from app.storage import artifacts
+
+MIN_TOKEN_LENGTH = 3
+# share of an area's name tokens a changed paragraph/operation has to mention to mark the area affected
+AREA_MATCH_RATIO = 0.5
+
+
+class Baseline:
+    def __init__(
+        self,
+        run_id: str,
+        inputs: RunInput,
+        plan: AnalystPlan,
+        manual: Optional[ManualBundle],
+        autotests: Optional[AutotestBundle],
+    ):
+        self.run_id = run_id
+        self.inputs = inputs
+        self.plan = plan
+        self.manual = manual
+        self.autotests = autotests
+
+    @classmethod
+    def load(cls, base: Path) -> "Baseline":
+        inputs = artifacts.read_artifact(base, "input.json")
+        plan = artifacts.read_artifact(base, "analyst.json")
+        if inputs is None or plan is None:
+            raise FileNotFoundError(f"Base run {base.name} has no input.json/analyst.json")
+        manual = artifacts.read_artifact(base, "manual.json")
+        autotests = artifacts.read_artifact(base, "autotests.json")
+        return cls(
+            base.name,
+            RunInput.parse_raw(inputs),
+            AnalystPlan.parse_raw(plan),
+            ManualBundle.parse_raw(manual) if manual is not None else None,
+            AutotestBundle.parse_raw(autotests) if autotests is not None else None,
+        )
+
+
+def tokens(text: str) -> Set[str]:
+    return {
+        token
+        for token in re.findall(r"\w+", text.lower())
+        if len(token) >= MIN_TOKEN_LENGTH and not token.isdigit()
+    }
+
+
+def split_paragraphs(text: Optional[str]) -> Dict[str, str]:
+    paragraphs = [re.sub(r"\s+", " ", chunk).strip() for chunk in re.split(r"\n\s*\n", text or "")]
+    return {digest(paragraph): paragraph for paragraph in paragraphs if paragraph}
+
+
+def _operations(content: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    if not content:
+        return {}
+    spec = parse_openapi_spec(content)
+    return split_operations(spec) if isinstance(spec, dict) else {}
+
+
+def _operation_text(key: str, entry: Dict[str, Any]) -> str:
+    operation = entry["operation"]
+    parts = [key, entry["path"].replace("/", " "), operation.get("summary", ""), operation.get("operationId", "")]
+    parts.extend(str(tag) for tag in operation.get("tags", []))
+    return " ".join(str(part) for part in parts)
+
+
+def diff_inputs(old: RunInput, new: RunInput) -> Tuple[Dict[str, Any], List[str]]:
+    old_paragraphs = split_paragraphs(old.requirements)
+    new_paragraphs = split_paragraphs(new.requirements)
+    old_ops = _operations(old.openapi)
+    new_ops = _operations(new.openapi)
+    changed_ops = sorted(key for key in set(old_ops) & set(new_ops) if digest(old_ops[key]) != digest(new_ops[key]))
+    added = [new_paragraphs[key] for key in new_paragraphs if key not in old_paragraphs]
+    removed = [old_paragraphs[key] for key in old_paragraphs if key not in new_paragraphs]
+    report = {
+        "paragraphs": {
+            "added": added,
+            "removed": removed,
+            "unchanged": len(new_paragraphs) - len(added),
+        },
+        "operations": {
+            "added": sorted(set(new_ops) - set(old_ops)),
+            "removed": sorted(set(old_ops) - set(new_ops)),
+            "changed": changed_ops,
+            "unchanged": len(set(old_ops) & set(new_ops)) - len(changed_ops),
+        },
+    }
+    # everything that changed, as text, for matching against coverage areas
+    texts = (
+        added
+        + removed
+        + [_operation_text(key, new_ops[key]) for key in new_ops if key not in old_ops or key in changed_ops]
+        + [_operation_text(key, old_ops[key]) for key in old_ops if key not in new_ops]
+    )
+    return report, texts
+
+
+def _norm(value: str) -> str:
+    return re.sub(r"\s+", " ", value).strip().lower()
+
+
+def _matches(area_tokens: Set[str], text_tokens: Set[str]) -> bool:
+    if not area_tokens:
+        return False
+    return len(area_tokens & text_tokens) >= max(1, math.ceil(len(area_tokens) * AREA_MATCH_RATIO))
+
+
+def affected_areas(baseline: Baseline, plan: AnalystPlan, changed_texts: List[str]) -> Dict[str, List[str]]:
+    old_matrix = {
+        _norm(area): sorted(_norm(case) for case in cases) for area, cases in baseline.plan.coverage_matrix.items()
+    }
+    change_tokens = [tokens(text) for text in changed_texts]
+    affected, unchanged = [], []
+    for area, cases in plan.coverage_matrix.items():
+        key = _norm(area)
+        changed = key not in old_matrix or old_matrix[key] != sorted(_norm(case) for case in cases)
+        if not changed:
+            candidates = [tokens(area)] + [tokens(case) for case in cases]
+            changed = any(_matches(candidate, text) for candidate in candidates for text in change_tokens)
+        (affected if changed else unchanged).append(area)
+    new_keys = {_norm(area) for area in plan.coverage_matrix}
+    removed = [area for area in baseline.plan.coverage_matrix if _norm(area) not in new_keys]
+    return {"affected": affected, "unchanged": unchanged, "removed": removed}
+
+
+def _best_area(text: str, areas: Dict[str, List[str]]) -> Optional[str]:
+    case_tokens = tokens(text)
+    best, best_score = None, 0
+    for area, cases in areas.items():
+        score = len(tokens(area) & case_tokens) * 2 + max((len(tokens(c) & case_tokens) for c in cases), default=0)
+        if score > best_score:
+            best, best_score = area, score
+    return best
+
+
+def manual_area(case: ManualTestCase, areas: Dict[str, List[str]]) -> Optional[str]:
+    by_name = {_norm(area): area for area in areas}
+    for label in (case.story, case.feature):
+        if _norm(label) in by_name:
+            return by_name[_norm(label)]
+    for area, cases in areas.items():
+        if _norm(case.title) in {_norm(c) for c in cases}:
+            return area
+    return _best_area(f"{case.story} {case.feature} {case.title}", areas)
+
+
+def autotest_area(case: AutotestCase, areas: Dict[str, List[str]]) -> Optional[str]:
+    return _best_area(" ".join([case.name.replace("_", " ")] + case.steps), areas)
+
+
+class ChangeSet:
+    def __init__(self, baseline: Baseline, inputs: RunInput, plan: AnalystPlan):
+        self.baseline = baseline
+        self.diff, changed_texts = diff_inputs(baseline.inputs, inputs)
+        self.areas = affected_areas(baseline, plan, changed_texts)
+        self.plan = plan
+        self.outcome: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def full(self) -> bool:
+        # nothing to carry over from: fall back to a complete generation
+        return not self.baseline.plan.coverage_matrix or not self.plan.coverage_matrix
+
+    def focused_plan(self) -> AnalystPlan:
+        affected = set(self.areas["affected"])
+        return self.plan.copy(
+            update={"coverage_matrix": {a: c for a, c in self.plan.coverage_matrix.items() if a in affected}}
+        )
+
+    def _keeps(self, area: Optional[str]) -> bool:
+        # cases that cannot be attributed to any area are carried over unless their area was removed
+        dropped = {_norm(name) for name in self.areas["affected"] + self.areas["removed"]}
+        return area is None or _norm(area) not in dropped
+
+    def carried_manual(self) -> List[ManualTestCase]:
+        if self.full or self.baseline.manual is None:
+            return []
+        areas = self.baseline.plan.coverage_matrix
+        return [case for case in self.baseline.manual.cases if self._keeps(manual_area(case, areas))]
+
+    def carried_autotests(self) -> AutotestBundle:
+        if self.full or self.baseline.autotests is None:
+            return AutotestBundle()
+        areas = self.baseline.plan.coverage_matrix
+        return AutotestBundle(
+            ui=[case for case in self.baseline.autotests.ui if self._keeps(autotest_area(case, areas))],
+            api=[case for case in self.baseline.autotests.api if self._keeps(autotest_area(case, areas))],
+        )
+
+    def record(self, step: str, carried: int, regenerated: int) -> None:
+        self.outcome[step] = {"carried": carried, "regenerated": regenerated}
+
+    def needs_generation(self) -> bool:
+        return self.full or bool(self.areas["affected"])
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "base_run_id": self.baseline.run_id,
+            "full_regeneration": self.full,
+            "inputs": self.diff,
+            "areas": self.areas,
+            **self.outcome,
+        }
+
+
+def merge_cases(carried: Iterable[Any], generated: Iterable[Any], key: Callable[[Any], str]) -> List[Any]:
+    # regenerated cases replace carried ones with the same identity
+    generated = list(generated)
+    fresh = {_norm(key(case)) for case in generated}
+    return [case for case in carried if _norm(key(case)) not in fresh] + generated
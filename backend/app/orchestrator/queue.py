@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import get_settings
+from app.utils.logging import configure_logging
+from app.utils.metrics import registry as metrics
+
+logger = configure_logging()
+
+# lane -> rank; lower ranks are claimed first, waiting jobs age towards rank 0
+LANES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_DURATION = 60.0
+# how often running jobs check for cancellation requested from another process
+CANCEL_CHECK_INTERVAL = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, rank, enqueued_at);
+CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id, status);
+"""
+
+
+class QueueFull(Exception):
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Run queue is full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, row: sqlite3.Row):
+        self.id: str = row["id"]
+        self.run_id: str = row["run_id"]
+        self.kind: str = row["kind"]
+        self.payload: Dict[str, Any] = json.loads(row["payload"])
+        self.lane: str = row["lane"]
+        self.status: str = row["status"]
+        self.attempts: int = row["attempts"]
+
+    @property
+    def recovered(self) -> bool:
+        # a second attempt means a previous worker died or lost its lease mid-run
+        return self.attempts > 1
+
+
+class JobQueue:
+    def __init__(
+        self,
+        path: Path,
+        max_depth: int = 100,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        aging_seconds: float = 300.0,
+        retention: int = 7 * 24 * 3600,
+        workers: int = 1,
+    ):
+        self.path = path
+        self.max_depth = max_depth
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.aging_seconds = aging_seconds
+        self.retention = retention
+        self.workers = max(1, workers)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "cancel_requested" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+
+    @classmethod
+    def from_settings(cls) -> "JobQueue":
+        settings = get_settings()
+        return cls(
+            Path(settings.data_path or "./data") / "queue.sqlite3",
+            max_depth=settings.queue_max_depth,
+            lease_seconds=settings.queue_lease_seconds,
+            max_attempts=settings.queue_max_attempts,
+            aging_seconds=settings.queue_aging_seconds,
+            retention=settings.queue_retention,
+            workers=settings.queue_workers,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit mode: claims take an explicit write lock with BEGIN IMMEDIATE so
+        # several uvicorn worker processes can share one queue file
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def enqueue(self, run_id: str, payload: Dict[str, Any], lane: str = "normal", kind: str = "run") -> Job:
+        if lane not in LANES:
+            raise ValueError(f"Unknown queue lane {lane!r}")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if depth >= self.max_depth:
+                    raise QueueFull(depth, self._estimate_wait(conn, depth))
+                conn.execute(
+                    "INSERT INTO jobs (id, run_id, kind, payload, lane, rank, status, enqueued_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                    (job_id, run_id, kind, json.dumps(payload), lane, LANES[lane], now),
+                )
+                conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                    (now - self.retention,),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        self._notify()
+        return Job(row)
+
+    def _estimate_wait(self, conn: sqlite3.Connection, depth: int) -> int:
+        durations = [
+            row[0]
+            for row in conn.execute(
+                "SELECT finished_at - started_at FROM jobs WHERE status = 'done' AND started_at IS NOT NULL"
+                " ORDER BY finished_at DESC LIMIT 20"
+            )
+        ]
+        average = sum(durations) / len(durations) if durations else DEFAULT_DURATION
+        return max(1, math.ceil((depth + 1) * average / self.workers))
+
+    def claim(self, worker: str) -> Optional[Job]:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, lease_owner = NULL,"
+                    " error = 'Job lease expired ' || attempts || ' times'"
+                    " WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?)"
+                    " ORDER BY rank - (? - enqueued_at) / ?, enqueued_at LIMIT 1",
+                    (now, now, self.aging_seconds),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["status"] == "running":
+                    logger.warning(
+                        "Recovering job %s of run %s from expired lease of %s",
+                        row["id"],
+                        row["run_id"],
+                        row["lease_owner"],
+                    )
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, started_at = ?,"
+                    " attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.lease_seconds, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return Job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def heartbeat(self, job_id: str, worker: str) -> str:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker),
+            )
+            if cursor.rowcount == 0:
+                return "lost"
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return "cancelled" if row["cancel_requested"] else "ok"
+
+    def complete(self, job_id: str, worker: str, error: Optional[str] = None, status: Optional[str] = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease_owner = NULL, lease_expires = NULL"
+                " WHERE id = ? AND lease_owner = ?",
+                (status or ("failed" if error else "done"), time.time(), error, job_id, worker),
+            )
+
+    def cancel(self, run_id: str) -> Dict[str, int]:
+        # queued jobs are cancelled outright; running ones are flagged and stopped by their worker
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = [
+                    row["id"]
+                    for row in conn.execute("SELECT id FROM jobs WHERE run_id = ? AND status = 'running'", (run_id,))
+                ]
+                queued = conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ?, error = 'Cancelled before start'"
+                    " WHERE run_id = ? AND status = 'queued'",
+                    (now, run_id),
+                ).rowcount
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE run_id = ? AND status = 'running'", (run_id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if running:
+            # workers of this process stop right away; other processes notice on their next heartbeat
+            for pool in list(_pools):
+                pool.cancel(running)
+        return {"queued": queued, "running": len(running)}
+
+    def release(self, job_id: str, worker: str) -> None:
+        # graceful shutdown: hand the job back without burning an attempt
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_owner = NULL,"
+                " lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+                (job_id, worker),
+            )
+
+    def active(self, run_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE run_id = ? AND status IN ('queued', 'running') LIMIT 1", (run_id,)
+            ).fetchone()
+            return row is not None
+
+    def stats(self) -> Dict[Tuple[str, str], int]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT lane, status, COUNT(*) FROM jobs GROUP BY lane, status").fetchall()
+        return {(lane, status): count for lane, status, count in rows}
+
+    def _notify(self) -> None:
+        # enqueue may run in a worker thread; wake idle workers in this process without waiting for a poll
+        if self._wakeup is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def wait(self, timeout: float) -> None:
+        loop = asyncio.get_running_loop()
+        if self._wakeup is None or self._loop is not loop:
+            self._wakeup, self._loop = asyncio.Event(), loop
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class WorkerPool:
+    def __init__(self, queue: JobQueue, handler: JobHandler, workers: int, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: Set[str] = set()
+        # jobs whose lease another worker may already have reclaimed
+        self._lost: Set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._tasks = [asyncio.create_task(self._work(f"{self.name}:{idx}")) for idx in range(self.workers)]
+        _pools.add(self)
+        logger.info("Started %s queue workers (%s)", self.workers, self.name)
+
+    async def stop(self) -> None:
+        _pools.discard(self)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def cancel(self, job_ids: List[str]) -> None:
+        # JobQueue.cancel is called from worker threads; tasks may only be cancelled on their own loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if self._loop is not None and current is not self._loop:
+            self._loop.call_soon_threadsafe(self._cancel, job_ids)
+        else:
+            self._cancel(job_ids)
+
+    def _cancel(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            task = self._running.get(job_id)
+            if task is not None and not task.done():
+                self._cancelled.add(job_id)
+                task.cancel()
+
+    async def _work(self, worker: str) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, worker)
+            except sqlite3.Error as exc:
+                logger.error("Queue claim failed: %s", exc)
+                job = None
+            if job is None:
+                await self.queue.wait(self.poll_interval)
+                continue
+            await self._execute(job, worker)
+
+    async def _execute(self, job: Job, worker: str) -> None:
+        task = asyncio.create_task(self.handler(job))
+        self._running[job.id] = task
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker))
+        status, error = "done", None
+        try:
+            await task
+        except asyncio.CancelledError:
+            if job.id not in self._cancelled:
+                # the pool is shutting down: stop the run and hand the job back
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await asyncio.to_thread(self.queue.release, job.id, worker)
+                raise
+            status, error = "cancelled", "Cancelled while running"
+        except Exception as exc:  # noqa: BLE001
+            status, error = "failed", str(exc) or type(exc).__name__
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job.id, None)
+            self._cancelled.discard(job.id)
+        if job.id in self._lost:
+            # the job belongs to whichever worker reclaimed it now: this attempt leaves no trace in the queue
+            self._lost.discard(job.id)
+            return
+        await asyncio.to_thread(self.queue.complete, job.id, worker, error, status)
+
+    async def _heartbeat(self, job: Job, worker: str) -> None:
+        interval = min(self.queue.lease_seconds / 3, CANCEL_CHECK_INTERVAL)
+        while True:
+            await asyncio.sleep(interval)
+            state = await asyncio.to_thread(self.queue.heartbeat, job.id, worker)
+            if state == "cancelled":
+                logger.info("Cancelling job %s of run %s on request", job.id, job.run_id)
+                self.cancel([job.id])
+                return
+            if state == "lost":
+                # another worker may resume the same run folder: stop before both write its checkpoints
+                logger.warning("Worker %s lost the lease on job %s, stopping it", worker, job.id)
+                self._lost.add(job.id)
+                self.cancel([job.id])
+                return
+
+
+_pools: Set[WorkerPool] = set()
+
+
+_queues: Dict[str, JobQueue] = {}
+
+
+def get_job_queue() -> JobQueue:
+    settings = get_settings()
+    key = str(Path(settings.data_path or "./data").resolve())
+    queue = _queues.get(key)
+    if queue is None:
+        queue = JobQueue.from_settings()
+        _queues[key] = queue
+    return queue
+
+
+metrics.gauge(
+    "run_queue_jobs",
+    "Pipeline jobs in the persistent run queue by lane and status",
+    ("lane", "status"),
+    lambda: {key: count for queue in list(_queues.values()) for key, count in queue.stats().items()},
+)
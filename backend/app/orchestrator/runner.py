@@ -1,16 +1,25 @@
 from __future__ import annotations
 
-from typing import Dict
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
 
 from app.agents.analyst import AnalystAgent
-from app.agents.manual import ManualTestsAgent
-from app.agents.autotests import AutotestsAgent
+from app.agents.manual import ManualTestsAgent, estimate_case_count
+from app.agents.autotests import KINDS as AUTOTEST_KINDS, AutotestsAgent
 from app.agents.standards import StandardsAgent
 from app.agents.optimize import OptimizationAgent
+from app.config import get_settings
 from app.schemas.pipeline import (
     AnalystPlan,
     AutotestBundle,
+    AutotestCase,
     ManualBundle,
+    ManualTestCase,
     OptimizationReport,
     RunInput,
     RunRecord,
@@ -19,7 +28,23 @@ from app.schemas.pipeline import (
     StepStatus,
     StandardsReport,
 )
+from app.llm.metrics import track_run_usage
+from app.orchestrator.checkpoints import CheckpointStore, digest, step_fingerprint
+from app.orchestrator.dag import Step, StepFn, run_dag
+from app.orchestrator.incremental import Baseline, ChangeSet, merge_cases
 from app.storage import artifacts
+from app.storage.events import EVENTS_FILE, SNAPSHOT_FILE, EventLog, encode_snapshot, load_record
+from app.storage.run_index import get_run_index, record_row, run_status
+from app.storage.writer import ArtifactWriter
+from app.utils.logging import configure_logging
+from app.utils.metrics import registry
+from app.utils.tracing import Span, span, start_trace
+
+logger = configure_logging()
+
+SPECULATIONS = registry.counter(
+    "speculative_autotests_total", "Speculative autotest generations by outcome", ("outcome",)
+)
 
 
 def render_manual(bundle: ManualBundle) -> str:
@@ -83,6 +108,146 @@ def render_autotests(bundle: AutotestBundle) -> Dict[str, str]:
     return {"ui_tests.py": "\n".join(ui_lines), "api_tests.py": "\n".join(api_lines)}
 
 
+# Declarative pipeline: step name -> steps whose results it consumes. Independent steps run concurrently.
+PIPELINE: List[Tuple[str, Tuple[str, ...]]] = [
+    ("analyst", ()),
+    ("manual", ("analyst",)),
+    ("autotests", ("analyst", "manual")),
+    ("standards", ("manual", "autotests")),
+    ("optimize", ("analyst", "manual", "autotests")),
+]
+
+STEP_OUTPUTS: Dict[str, Tuple[str, Type[BaseModel]]] = {
+    "analyst": ("analyst.json", AnalystPlan),
+    "manual": ("manual.json", ManualBundle),
+    "autotests": ("autotests.json", AutotestBundle),
+    "standards": ("standards.json", StandardsReport),
+    "optimize": ("optimize.json", OptimizationReport),
+}
+
+
+class StepTimeoutError(Exception):
+    pass
+
+
+class RunContext:
+    def __init__(
+        self,
+        base: Path,
+        inputs: RunInput,
+        record: RunRecord,
+        checkpoints: CheckpointStore,
+        resume: bool,
+        baseline: Optional[Baseline] = None,
+    ):
+        self.base = base
+        self.inputs = inputs
+        self.record = record
+        self.checkpoints = checkpoints
+        self.resume = resume
+        self.baseline = baseline
+        self.use_cache = not inputs.bypass_cache
+        self._changes: Optional[ChangeSet] = None
+        self.trace: Optional[Span] = None
+        settings = get_settings()
+        self.writer = ArtifactWriter(fsync=settings.artifact_fsync)
+        self.events = EventLog(record)
+        self.snapshot_every = settings.run_snapshot_every
+        self._since_snapshot = 0
+        self.speculative = settings.speculative_autotests if inputs.speculative is None else inputs.speculative
+        self.speculative_tolerance = settings.speculative_tolerance
+        self.speculation: Optional[Tuple[int, asyncio.Task]] = None
+        self.step_timeout = settings.step_timeout
+        self.step_timeouts = settings.step_timeouts
+        self.run_timeout = settings.run_timeout
+        self.deadline = time.monotonic() + self.run_timeout if self.run_timeout > 0 else None
+
+    def timeout_for(self, step: str) -> Tuple[Optional[float], str]:
+        limits: List[Tuple[float, str]] = []
+        step_limit = self.step_timeouts.get(step, self.step_timeout)
+        if step_limit > 0:
+            limits.append((step_limit, f"Step '{step}' exceeded its {step_limit:g}s deadline"))
+        if self.deadline is not None:
+            limits.append((self.deadline - time.monotonic(), f"Run exceeded its {self.run_timeout:g}s deadline"))
+        return min(limits) if limits else (None, "")
+
+    def drop_speculation(self) -> None:
+        if self.speculation is None:
+            return
+        _, task = self.speculation
+        self.speculation = None
+        task.cancel()
+        if task.done() and not task.cancelled():
+            task.exception()
+
+    async def changes(self, plan: AnalystPlan) -> Optional[ChangeSet]:
+        if self.baseline is None:
+            return None
+        if self._changes is None or self._changes.plan is not plan:
+            # diffing parses both OpenAPI specs and digests every operation and paragraph
+            self._changes = await asyncio.to_thread(ChangeSet, self.baseline, self.inputs, plan)
+        return self._changes
+
+    def write_changes(self) -> None:
+        if self._changes is not None:
+            self.write_json("changes.json", self._changes.report())
+
+    async def flush(self, *names: str) -> None:
+        await self.writer.flush(*(self.base / name for name in names))
+
+    @property
+    def steps(self) -> Dict[str, StepResult]:
+        return self.record.steps
+
+    def persist(self, snapshot: bool = False) -> None:
+        # only what changed since the last call is appended to events.jsonl; run.json is a
+        # periodic snapshot that readers bring up to date with the events after it
+        ts = artifacts.timestamp()
+        self.record.updated_at = ts
+        events = self.events.diff(self.record, ts)
+        self._since_snapshot += len(events)
+        if not events and not snapshot:
+            return
+        index = get_run_index()
+        row = record_row(self.record)
+        if events:
+            self.writer.append(
+                self.base / EVENTS_FILE,
+                lambda: "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events),
+                after=lambda: index.write(row),
+            )
+        if snapshot or self._since_snapshot >= self.snapshot_every:
+            self._since_snapshot = 0
+            if self.trace is not None:
+                self.record.trace = self.trace.to_dict()
+            data = self.record.dict()
+            self.writer.submit(self.base / SNAPSHOT_FILE, lambda: encode_snapshot(data), after=lambda: index.write(row))
+
+    def write_json(self, name: str, content: Dict[str, Any]) -> None:
+        with span("write", file=name):
+            self.writer.submit(self.base / name, lambda: json.dumps(content, indent=2))
+
+    def write_artifact(self, step: str, name: str, content: str) -> None:
+        with span("write", file=name):
+            self.writer.submit(self.base / name, content)
+        if not any(artifact.name == name for artifact in self.steps[step].artifacts):
+            self.steps[step].artifacts.append(StepArtifact(name=name, path=str((self.base / name).resolve())))
+
+
+def seal_run(base: Path, record: RunRecord) -> int:
+    freed = artifacts.seal_run(base)
+    links = artifacts.read_links(base)
+    # the absolute paths recorded while the run wrote its files are gone now:
+    # sealed artifacts are named relative to the run and resolve through artifacts.find_artifact
+    for step in record.steps.values():
+        for artifact in step.artifacts:
+            if artifact.name in links and not (base / artifact.name).exists():
+                artifact.path = artifact.name
+    # the run has finished: the snapshot written at its end already holds every event
+    artifacts.atomic_write(base / SNAPSHOT_FILE, encode_snapshot(record.dict()), fsync=get_settings().artifact_fsync)
+    return freed
+
+
 class PipelineRunner:
     def __init__(self):
         self.analyst = AnalystAgent()
@@ -91,86 +256,358 @@ class PipelineRunner:
         self.standards = StandardsAgent()
         self.optimize = OptimizationAgent()
 
-    async def run(self, run_id: str, inputs: RunInput) -> RunRecord:
-        base = artifacts.create_run_folder(run_id)
-        steps = {
-            "analyst": StepResult(),
-            "manual": StepResult(),
-            "autotests": StepResult(),
-            "standards": StepResult(),
-            "optimize": StepResult(),
-        }
+    async def run(self, run_id: str, inputs: RunInput, resume: bool = False) -> RunRecord:
+        # checkpoints, the previous record and the baseline are all read from disk: keep that off the event loop
+        base = await asyncio.to_thread(artifacts.create_run_folder, run_id)
+        checkpoints = CheckpointStore(base)
+        previous = None
+        if resume:
+            await asyncio.to_thread(checkpoints.load)
+            previous = await asyncio.to_thread(load_record, base)
+        else:
+            await asyncio.to_thread(checkpoints.reset)
+            await asyncio.to_thread((base / EVENTS_FILE).unlink, missing_ok=True)
+        baseline = None
+        if inputs.base_run_id:
+            baseline = await asyncio.to_thread(Baseline.load, artifacts.runs_root() / inputs.base_run_id)
         record = RunRecord(
             id=run_id,
             input=inputs,
-            steps=steps,
-            created_at=artifacts.timestamp(),
+            steps={name: StepResult() for name, _ in PIPELINE},
+            created_at=previous.created_at if previous else artifacts.timestamp(),
             updated_at=artifacts.timestamp(),
+            # usage keeps accumulating across attempts so it reflects what the run really cost
+            usage=previous.usage if previous else {},
+            # the event history of earlier attempts stays in events.jsonl, numbering continues after it
+            event_seq=previous.event_seq if previous else 0,
+        )
+        await asyncio.to_thread(artifacts.write_json, base / "input.json", inputs.dict())
+        ctx = RunContext(base, inputs, record, checkpoints, resume, baseline)
+        ctx.persist(snapshot=True)
+        dag = [Step(name, self._step(ctx, name, deps), deps) for name, deps in PIPELINE]
+        try:
+            with track_run_usage(record.usage), start_trace("run", run_id=run_id, resume=resume) as trace:
+                ctx.trace = trace
+                try:
+                    outcome = await run_dag(dag)
+                finally:
+                    # manual failed or the run was cancelled before autotests could claim it
+                    ctx.drop_speculation()
+        except asyncio.CancelledError:
+            for step in record.steps.values():
+                if step.status == StepStatus.queued:
+                    step.status = StepStatus.cancelled
+            ctx.persist(snapshot=True)
+            await ctx.flush()
+            raise
+        for name, blocked_by in outcome.skipped.items():
+            record.steps[name].status = StepStatus.skipped
+            record.steps[name].error = f"Skipped because step '{blocked_by}' did not complete"
+        ctx.persist(snapshot=True)
+        await ctx.flush()
+        if outcome.errors:
+            first_failed = next(name for name, _ in PIPELINE if name in outcome.errors)
+            raise outcome.errors[first_failed]
+        return record
+
+    async def run_and_record(self, run_id: str, inputs: RunInput, resume: bool = False) -> RunRecord:
+        try:
+            record = await self.run(run_id, inputs, resume=resume)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Run %s failed: %s", run_id, exc)
+            await asyncio.to_thread(artifacts.write_text, artifacts.runs_root() / run_id / "error.txt", str(exc))
+            raise
+        # only completed runs: a failed one is resumed from its checkpoints, which stay plain files
+        if get_settings().artifact_store and run_status(record) == "completed":
+            try:
+                freed = await asyncio.to_thread(seal_run, artifacts.runs_root() / run_id, record)
+                logger.info("Sealed run %s into the blob store (%s bytes freed)", run_id, freed)
+            except OSError as exc:
+                logger.warning("Could not seal run %s: %s", run_id, exc)
+        return record
+
+    def _fingerprint(self, ctx: RunContext, name: str, deps: Tuple[str, ...], results: Dict[str, Any]) -> str:
+        if deps:
+            # hash what the dependencies actually produced, so a re-run upstream invalidates downstream
+            inputs = {dep: digest(results[dep].dict()) for dep in deps}
+        else:
+            inputs = {"requirements": ctx.inputs.requirements, "openapi": ctx.inputs.openapi}
+        if ctx.inputs.base_run_id:
+            inputs["base_run_id"] = ctx.inputs.base_run_id
+        return step_fingerprint(name, ctx.inputs.model, inputs)
+
+    def _step(self, ctx: RunContext, name: str, deps: Tuple[str, ...]) -> StepFn:
+        handler = getattr(self, f"_run_{name}")
+        publish = getattr(self, f"_publish_{name}")
+        output, model = STEP_OUTPUTS[name]
+
+        async def execute(results: Dict[str, Any]) -> Any:
+            with span(f"step.{name}", step=name) as step_span:
+                value = await run_step(results)
+                if step_span is not None:
+                    step_span.set(status=ctx.steps[name].status.value, restored=ctx.steps[name].restored)
+                return value
+
+        async def run_step(results: Dict[str, Any]) -> Any:
+            step = ctx.steps[name]
+            fingerprint = self._fingerprint(ctx, name, deps, results)
+            value = None
+            if ctx.resume:
+                with span("checkpoint.restore"):
+                    value = await asyncio.to_thread(ctx.checkpoints.restore, name, fingerprint, model)
+            step.started_at = artifacts.timestamp()
+            if value is not None:
+                step.status = StepStatus.success
+                step.restored = True
+                step.summary = "Restored from checkpoint"
+                publish(ctx, value)
+                step.finished_at = artifacts.timestamp()
+                ctx.persist()
+                return value
+
+            await asyncio.to_thread(ctx.checkpoints.discard, name)
+            step.status = StepStatus.running
+            ctx.persist()
+            timeout, reason = ctx.timeout_for(name)
+            try:
+                if timeout is not None and timeout <= 0:
+                    raise asyncio.TimeoutError()
+                value = await asyncio.wait_for(handler(ctx, results), timeout)
+            except asyncio.TimeoutError:
+                step.status = StepStatus.timed_out
+                step.error = reason
+                step.finished_at = artifacts.timestamp()
+                ctx.persist()
+                raise StepTimeoutError(reason) from None
+            except asyncio.CancelledError:
+                step.status = StepStatus.cancelled
+                step.error = "Run was cancelled"
+                step.finished_at = artifacts.timestamp()
+                ctx.persist()
+                raise
+            except Exception as exc:
+                step.status = StepStatus.failed
+                step.error = str(exc)
+                step.finished_at = artifacts.timestamp()
+                ctx.persist()
+                raise
+            step.status = StepStatus.success
+            with span("publish"):
+                publish(ctx, value)
+            # the checkpoint digests the file on disk, so it has to be written first
+            await ctx.flush(output)
+            await asyncio.to_thread(ctx.checkpoints.save, name, fingerprint, output)
+            step.finished_at = artifacts.timestamp()
+            ctx.persist()
+            return value
+
+        return execute
+
+    async def _run_analyst(self, ctx: RunContext, results: Dict[str, Any]) -> AnalystPlan:
+        inputs = ctx.inputs
+        known_areas = list(ctx.baseline.plan.coverage_matrix) if ctx.baseline else None
+        return await self.analyst.analyze(
+            inputs.requirements or "", inputs.openapi, inputs.model, use_cache=ctx.use_cache, known_areas=known_areas
         )
-        artifacts.write_json(base / "input.json", inputs.dict())
-
-        def persist():
-            record.updated_at = artifacts.timestamp()
-            artifacts.write_json(base / "run.json", record.dict())
-
-        # Analyst
-        steps["analyst"].status = StepStatus.running
-        steps["analyst"].started_at = artifacts.timestamp()
-        plan: AnalystPlan = await self.analyst.analyze(inputs.requirements or "", inputs.openapi, inputs.model)
-        steps["analyst"].data = plan.dict()
-        steps["analyst"].status = StepStatus.success
-        steps["analyst"].finished_at = artifacts.timestamp()
-        artifacts.write_json(base / "analyst.json", plan.dict())
-        persist()
-
-        # Manual
-        steps["manual"].status = StepStatus.running
-        steps["manual"].started_at = artifacts.timestamp()
-        manual_bundle: ManualBundle = await self.manual.generate(plan, model=inputs.model)
-        manual_code = render_manual(manual_bundle)
-        artifacts.write_json(base / "manual.json", manual_bundle.dict())
-        artifacts.write_text(base / "manual.py", manual_code)
-        steps["manual"].status = StepStatus.success
-        steps["manual"].finished_at = artifacts.timestamp()
-        steps["manual"].artifacts.append(
-            StepArtifact(name="manual.py", path=str((base / "manual.py").resolve()))
+
+    def _publish_analyst(self, ctx: RunContext, plan: AnalystPlan) -> None:
+        ctx.steps["analyst"].data = plan.dict()
+        ctx.write_json("analyst.json", plan.dict())
+
+    async def _run_manual(self, ctx: RunContext, results: Dict[str, Any]) -> ManualBundle:
+        plan = results["analyst"]
+        carried: List[ManualTestCase] = []
+        changes = await ctx.changes(plan)
+        if changes is not None:
+            carried = changes.carried_manual()
+            if not changes.full:
+                plan = changes.focused_plan()
+            if not changes.needs_generation():
+                return self._merge_manual(ctx, changes, carried, [])
+        elif ctx.speculative and not ctx.inputs.stream:
+            self._speculate_autotests(ctx, plan)
+
+        on_case = None
+        if ctx.inputs.stream:
+            partial = ManualBundle(cases=list(carried))
+
+            async def on_case(case: ManualTestCase):
+                partial.cases.append(case)
+                ctx.write_json("manual.json", partial.dict())
+                ctx.write_artifact("manual", "manual.py", render_manual(partial))
+                ctx.steps["manual"].summary = f"{len(partial.cases)} cases generated"
+                ctx.persist()
+
+        try:
+            bundle = await self.manual.generate(plan, model=ctx.inputs.model, use_cache=ctx.use_cache, on_case=on_case)
+        except BaseException:
+            # failed, timed out or cancelled: autotests will never claim the guess, stop it right away
+            ctx.drop_speculation()
+            raise
+        if changes is None:
+            return bundle
+        return self._merge_manual(ctx, changes, carried, bundle.cases)
+
+    def _speculate_autotests(self, ctx: RunContext, plan: AnalystPlan) -> None:
+        # the autotests prompt only needs the plan and a case count, so start it on an estimate
+        estimate = estimate_case_count(plan)
+
+        async def speculate() -> AutotestBundle:
+            with span("autotests.speculative", estimated_cases=estimate):
+                return await self.autotests.generate(plan, estimate, model=ctx.inputs.model, use_cache=ctx.use_cache)
+
+        ctx.speculation = (estimate, asyncio.create_task(speculate()))
+
+    async def _reconcile_speculation(self, ctx: RunContext, manual: ManualBundle) -> Optional[AutotestBundle]:
+        estimate, task = ctx.speculation
+        actual = len(manual.cases)
+        divergence = abs(actual - estimate) / max(actual, estimate, 1)
+        bundle = None
+        if divergence > ctx.speculative_tolerance:
+            outcome = "regenerated"
+            ctx.drop_speculation()
+        else:
+            ctx.speculation = None
+            try:
+                bundle = await task
+                outcome = "kept"
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Speculative autotests for run %s failed (%s); regenerating", ctx.record.id, exc)
+                outcome = "failed"
+        SPECULATIONS.inc((outcome,))
+        ctx.steps["autotests"].data = {
+            "speculation": {"estimated_cases": estimate, "actual_cases": actual, "outcome": outcome}
+        }
+        return bundle
+
+    def _merge_manual(
+        self, ctx: RunContext, changes: ChangeSet, carried: List[ManualTestCase], generated: List[ManualTestCase]
+    ) -> ManualBundle:
+        cases = merge_cases(carried, generated, key=lambda case: case.title)
+        changes.record("manual", len(cases) - len(generated), len(generated))
+        ctx.write_changes()
+        ctx.steps["manual"].summary = f"{len(cases) - len(generated)} carried over, {len(generated)} regenerated"
+        return ManualBundle(cases=cases)
+
+    def _publish_manual(self, ctx: RunContext, bundle: ManualBundle) -> None:
+        ctx.write_json("manual.json", bundle.dict())
+        with span("render", artifact="manual.py"):
+            code = render_manual(bundle)
+        ctx.write_artifact("manual", "manual.py", code)
+
+    async def _run_autotests(self, ctx: RunContext, results: Dict[str, Any]) -> AutotestBundle:
+        plan = results["analyst"]
+        carried = AutotestBundle()
+        changes = await ctx.changes(plan)
+        if changes is not None:
+            carried = changes.carried_autotests()
+            if not changes.full:
+                plan = changes.focused_plan()
+            if not changes.needs_generation():
+                return self._merge_autotests(ctx, changes, carried, AutotestBundle())
+        elif ctx.speculation is not None:
+            bundle = await self._reconcile_speculation(ctx, results["manual"])
+            if bundle is not None:
+                return bundle
+
+        on_case = None
+        if ctx.inputs.stream:
+            partial = carried.copy(deep=True)
+
+            async def on_case(kind: str, case: AutotestCase):
+                getattr(partial, kind).append(case)
+                ctx.write_json("autotests.json", partial.dict())
+                ctx.steps["autotests"].summary = f"ui={len(partial.ui)}, api={len(partial.api)}"
+                ctx.persist()
+
+        fingerprint = self._fingerprint(ctx, "autotests", dict(PIPELINE)["autotests"], results)
+        halves = await asyncio.gather(
+            *(
+                self._autotests_half(ctx, kind, fingerprint, plan, len(results["manual"].cases), on_case)
+                for kind in AUTOTEST_KINDS
+            ),
+            return_exceptions=True,
+        )
+        for half in halves:
+            if isinstance(half, BaseException):
+                raise half
+        bundle = AutotestBundle(**dict(zip(AUTOTEST_KINDS, halves)))
+        for kind in AUTOTEST_KINDS:
+            await asyncio.to_thread(ctx.checkpoints.discard, f"autotests.{kind}")
+            await asyncio.to_thread((ctx.base / f"autotests.{kind}.json").unlink, missing_ok=True)
+        if changes is None:
+            return bundle
+        return self._merge_autotests(ctx, changes, carried, bundle)
+
+    async def _autotests_half(
+        self,
+        ctx: RunContext,
+        kind: str,
+        fingerprint: str,
+        plan: AnalystPlan,
+        case_count: int,
+        on_case: Optional[Callable[[str, AutotestCase], Awaitable[None]]],
+    ) -> List[AutotestCase]:
+        # each half is checkpointed on its own, so resuming after one half failed keeps the other
+        key, output = f"autotests.{kind}", f"autotests.{kind}.json"
+        if ctx.resume:
+            restored = await asyncio.to_thread(ctx.checkpoints.restore, key, fingerprint, AutotestBundle)
+            if restored is not None:
+                cases = getattr(restored, kind)
+                if on_case is not None:
+                    for case in cases:
+                        await on_case(kind, case)
+                return cases
+        cases = await self.autotests.generate_half(
+            kind, plan, case_count, model=ctx.inputs.model, use_cache=ctx.use_cache, on_case=on_case
+        )
+        ctx.write_json(output, AutotestBundle(**{kind: cases}).dict())
+        await ctx.flush(output)
+        await asyncio.to_thread(ctx.checkpoints.save, key, fingerprint, output)
+        return cases
+
+    def _merge_autotests(
+        self, ctx: RunContext, changes: ChangeSet, carried: AutotestBundle, generated: AutotestBundle
+    ) -> AutotestBundle:
+        merged = AutotestBundle(
+            ui=merge_cases(carried.ui, generated.ui, key=lambda case: case.name),
+            api=merge_cases(carried.api, generated.api, key=lambda case: case.name),
         )
-        persist()
-
-        # Autotests
-        steps["autotests"].status = StepStatus.running
-        steps["autotests"].started_at = artifacts.timestamp()
-        auto_bundle: AutotestBundle = await self.autotests.generate(plan, manual_bundle, model=inputs.model)
-        rendered = render_autotests(auto_bundle)
-        artifacts.write_json(base / "autotests.json", auto_bundle.dict())
+        regenerated = len(generated.ui) + len(generated.api)
+        kept = len(merged.ui) + len(merged.api) - regenerated
+        changes.record("autotests", kept, regenerated)
+        ctx.write_changes()
+        ctx.steps["autotests"].summary = f"{kept} carried over, {regenerated} regenerated"
+        return merged
+
+    def _publish_autotests(self, ctx: RunContext, bundle: AutotestBundle) -> None:
+        ctx.write_json("autotests.json", bundle.dict())
+        with span("render", artifact="autotests"):
+            rendered = render_autotests(bundle)
         for fname, content in rendered.items():
-            artifacts.write_text(base / fname, content)
-            steps["autotests"].artifacts.append(
-                StepArtifact(name=fname, path=str((base / fname).resolve()))
-            )
-        steps["autotests"].status = StepStatus.success
-        steps["autotests"].finished_at = artifacts.timestamp()
-        persist()
-
-        # Standards
-        steps["standards"].status = StepStatus.running
-        steps["standards"].started_at = artifacts.timestamp()
-        combined_auto = "\n\n".join(rendered.values())
-        standards_report: StandardsReport = await self.standards.audit(manual_code, combined_auto, model=inputs.model)
-        artifacts.write_json(base / "standards.json", standards_report.dict())
-        steps["standards"].data = standards_report.dict()
-        steps["standards"].status = StepStatus.success if standards_report.valid else StepStatus.failed
-        steps["standards"].finished_at = artifacts.timestamp()
-        persist()
-
-        # Optimize
-        steps["optimize"].status = StepStatus.running
-        steps["optimize"].started_at = artifacts.timestamp()
-        optimization: OptimizationReport = await self.optimize.optimize(plan, manual_bundle, auto_bundle, model=inputs.model)
-        artifacts.write_json(base / "optimize.json", optimization.dict())
-        steps["optimize"].data = optimization.dict()
-        steps["optimize"].status = StepStatus.success
-        steps["optimize"].finished_at = artifacts.timestamp()
-        persist()
-        return record
+            ctx.write_artifact("autotests", fname, content)
+
+    async def _run_standards(self, ctx: RunContext, results: Dict[str, Any]) -> StandardsReport:
+        with span("render", artifact="standards input"):
+            manual_code = render_manual(results["manual"])
+            combined_auto = "\n\n".join(render_autotests(results["autotests"]).values())
+        return await self.standards.audit(manual_code, combined_auto, model=ctx.inputs.model, use_cache=ctx.use_cache)
+
+    def _publish_standards(self, ctx: RunContext, report: StandardsReport) -> None:
+        ctx.write_json("standards.json", report.dict())
+        ctx.steps["standards"].data = report.dict()
+        if not report.valid:
+            ctx.steps["standards"].status = StepStatus.failed
+
+    async def _run_optimize(self, ctx: RunContext, results: Dict[str, Any]) -> OptimizationReport:
+        return await self.optimize.optimize(
+            results["analyst"],
+            results["manual"],
+            results["autotests"],
+            model=ctx.inputs.model,
+            use_cache=ctx.use_cache,
+        )
 
+    def _publish_optimize(self, ctx: RunContext, report: OptimizationReport) -> None:
+        ctx.write_json("optimize.json", report.dict())
+        ctx.steps["optimize"].data = report.dict()
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -10,6 +10,9 @@ class StepStatus(str, Enum):
     running = "running"
     success = "success"
     failed = "failed"
+    skipped = "skipped"
+    cancelled = "cancelled"
+    timed_out = "timed_out"
 
 
 class StepArtifact(BaseModel):
@@ -24,14 +27,43 @@ class StepResult(BaseModel):
     error: Optional[str] = None
     started_at: Optional[str] = None
     finished_at: Optional[str] = None
+    restored: bool = False
     artifacts: List[StepArtifact] = Field(default_factory=list)
     data: Dict[str, Any] = Field(default_factory=dict)
 
 
+class LLMUsage(BaseModel):
+    calls: int = 0
+    cached: int = 0
+    failed: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_seconds: float = 0.0
+    packed_tokens_before: int = 0
+    packed_tokens_after: int = 0
+
+
 class RunInput(BaseModel):
     requirements: Optional[str] = None
     openapi: Optional[str] = None
     model: Optional[str] = None
+    bypass_cache: bool = False
+    stream: bool = False
+    speculative: Optional[bool] = None
+    base_run_id: Optional[str] = None
+    priority: Literal["high", "normal", "low"] = "normal"
+
+
+class BatchInput(BaseModel):
+    items: List[RunInput] = Field(..., min_items=1)
+    priority: Literal["high", "normal", "low"] = "normal"
+
+
+class BatchRecord(BaseModel):
+    id: str
+    # run id per submitted item; identical items share one run
+    items: List[str]
+    created_at: str
 
 
 class RunRecord(BaseModel):
@@ -40,6 +72,9 @@ class RunRecord(BaseModel):
     steps: Dict[str, StepResult]
     created_at: str
     updated_at: str
+    usage: Dict[str, LLMUsage] = Field(default_factory=dict)
+    trace: Optional[Dict[str, Any]] = None
+    event_seq: int = 0
 
 
 class AnalystPlan(BaseModel):
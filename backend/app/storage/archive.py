@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.config import get_settings
+from app.storage.artifacts import CHUNK_SIZE, StoredArtifact, batches_root, is_artifact, run_artifacts, runs_root
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+# already compressed formats and tiny files gain nothing from deflate
+STORED_SUFFIXES = {".zip", ".gz", ".bz2", ".xz", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".pdf"}
+MIN_DEFLATE_SIZE = 512
+ETAG_LENGTH = 32
+
+
+def archives_root() -> Path:
+    root = Path(get_settings().data_path or "./data") / "archives"
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def archive_run_id(path: Path) -> Optional[str]:
+    # cached archives are named "<run or batch>-<etag>.zip"; ids like "<run>-001" belong to other runs
+    run_id, _, etag = path.stem.rpartition("-")
+    return run_id if run_id and len(etag) == ETAG_LENGTH else None
+
+
+def compress_type(path: Path, size: int) -> int:
+    if path.suffix.lower() in STORED_SUFFIXES or size < MIN_DEFLATE_SIZE:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _Sink:
+    # write-only, unseekable target: zipfile then streams entries with data descriptors
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class RunArchive:
+    def __init__(self, run_id: str, base: Path):
+        self.run_id = run_id
+        self.base = base
+        self.files = list(self._entries())
+        content = hashlib.sha256()
+        for name, artifact in self.files:
+            content.update(f"{name}\0{artifact.sha256}\n".encode("utf-8"))
+        self.etag = content.hexdigest()[:ETAG_LENGTH]
+
+    def _entries(self) -> Iterable[Tuple[str, StoredArtifact]]:
+        return [(artifact.name, artifact) for artifact in run_artifacts(self.base)]
+
+    def _root(self) -> Path:
+        return archives_root()
+
+    @property
+    def cache_path(self) -> Path:
+        return self._root() / f"{self.run_id}-{self.etag}.zip"
+
+    def cached(self) -> Optional[Path]:
+        path = self.cache_path
+        return path if path.exists() else None
+
+    def stream(self, cache: bool = False) -> Iterator[bytes]:
+        sink = _Sink()
+        tmp = self.cache_path.with_name(f".{self.cache_path.name}.{uuid.uuid4().hex[:8]}.tmp") if cache else None
+        out = open(tmp, "wb") if tmp else None
+        completed = False
+
+        def emit() -> Iterator[bytes]:
+            data = sink.drain()
+            if data:
+                if out is not None:
+                    out.write(data)
+                yield data
+
+        try:
+            with zipfile.ZipFile(sink, "w") as archive:
+                for name, artifact in self.files:
+                    try:
+                        source = artifact.open()
+                    except FileNotFoundError:
+                        continue
+                    with source:
+                        info = zipfile.ZipInfo(name, date_time=time.localtime(artifact.mtime)[:6])
+                        info.external_attr = 0o644 << 16
+                        info.file_size = artifact.size
+                        info.compress_type = compress_type(Path(name), artifact.size)
+                        with archive.open(info, "w") as target:
+                            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                                target.write(chunk)
+                                yield from emit()
+                    yield from emit()
+            yield from emit()
+            completed = True
+        finally:
+            if out is not None:
+                out.close()
+                if completed:
+                    os.replace(tmp, self.cache_path)
+                    self._prune()
+                else:
+                    tmp.unlink(missing_ok=True)
+
+    def _prune(self) -> None:
+        # archives of earlier states of the run are never served again
+        for path in self._root().glob(f"{self.run_id}-*.zip"):
+            if archive_run_id(path) == self.run_id and path != self.cache_path:
+                path.unlink(missing_ok=True)
+
+
+class BatchArchive(RunArchive):
+    # the batch folder plus every run of the batch under its own directory; cached next to the batch
+    def __init__(self, batch_id: str, run_ids: List[str]):
+        self.run_ids = sorted(set(run_ids))
+        super().__init__(batch_id, batches_root() / batch_id)
+
+    def _entries(self) -> Iterable[Tuple[str, StoredArtifact]]:
+        for file in sorted(self.base.rglob("*")):
+            if is_artifact(file):
+                name = file.relative_to(self.base).as_posix()
+                yield name, StoredArtifact.from_file(name, file)
+        for run_id in self.run_ids:
+            try:
+                artifacts = run_artifacts(runs_root() / run_id)
+            except FileNotFoundError:
+                continue
+            for artifact in artifacts:
+                yield f"{run_id}/{artifact.name}", artifact
+
+    def _root(self) -> Path:
+        return batches_root()
@@ -1,12 +1,33 @@
+import hashlib
 import json
+import mimetypes
 import os
+import threading
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List
-import zipfile
+from typing import BinaryIO, Dict, Any, List, Optional, Tuple, Union
 
 from app.config import get_settings
+from app.storage.blobs import BlobStore
+from app.utils.logging import configure_logging
+from app.utils.metrics import registry
+
+logger = configure_logging()
+
+CHUNK_SIZE = 64 * 1024
+DIGEST_CACHE_SIZE = 4096
+MEDIA_TYPES = {".jsonl": "application/x-ndjson", ".py": "text/x-python", ".feature": "text/plain", ".md": "text/markdown"}
+
+LINKS_FILE = ".blobs.json"
+# control files stay plain: resumes, the queue and the run index keep rewriting or reading them directly
+PLAIN_FILES = {"run.json", "events.jsonl", "input.json", "checkpoints.json", "error.txt"}
+
+BLOBS_LINKED = registry.counter("artifact_blobs_total", "Artifacts moved into the blob store", ("outcome",))
+
+_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_digests_lock = threading.Lock()
 
 
 def runs_root() -> Path:
@@ -16,6 +37,32 @@ def runs_root() -> Path:
     return root
 
 
+def batches_root() -> Path:
+    settings = get_settings()
+    root = Path(settings.data_path or "./data") / "batches"
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def blobs_root() -> Path:
+    settings = get_settings()
+    root = Path(settings.data_path or "./data") / "blobs"
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+_stores: Dict[str, BlobStore] = {}
+
+
+def get_blob_store() -> BlobStore:
+    root = blobs_root()
+    store = _stores.get(str(root.resolve()))
+    if store is None:
+        store = BlobStore(root, fsync=get_settings().artifact_fsync)
+        _stores[str(root.resolve())] = store
+    return store
+
+
 def create_run_folder(run_id: str | None = None) -> Path:
     rid = run_id or str(uuid.uuid4())
     path = runs_root() / rid
@@ -23,14 +70,42 @@ def create_run_folder(run_id: str | None = None) -> Path:
     return path
 
 
-def write_json(path: Path, content: Dict[str, Any]) -> Path:
-    path.write_text(json.dumps(content, indent=2))
+def atomic_write(path: Path, data: Union[str, bytes], fsync: bool = False) -> Path:
+    # write next to the target and rename over it, so readers and crashes never see a truncated file
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp, "wb") as handle:
+            handle.write(raw)
+            if fsync:
+                handle.flush()
+                os.fsync(handle.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
     return path
 
 
+def write_json(path: Path, content: Dict[str, Any]) -> Path:
+    return atomic_write(path, json.dumps(content, indent=2), fsync=get_settings().artifact_fsync)
+
+
 def write_text(path: Path, content: str) -> Path:
-    path.write_text(content)
-    return path
+    return atomic_write(path, content, fsync=get_settings().artifact_fsync)
+
+
+def is_artifact(file: Path) -> bool:
+    # skip temp files of writes that are still in flight
+    if file.name == LINKS_FILE or (file.name.startswith(".") and file.name.endswith(".tmp")):
+        return False
+    return file.is_file()
 
 
 def list_runs() -> List[str]:
@@ -38,29 +113,170 @@ def list_runs() -> List[str]:
     return sorted([p.name for p in root.iterdir() if p.is_dir()])
 
 
-def load_run(run_id: str) -> Dict[str, Any]:
-    base = runs_root() / run_id
+def file_digest(path: Path) -> str:
+    # unchanged files (same size and mtime) are hashed once
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if key in _digests:
+            _digests.move_to_end(key)
+            return _digests[key]
+    sha = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _digests_lock:
+        _digests[key] = digest
+        while len(_digests) > DIGEST_CACHE_SIZE:
+            _digests.popitem(last=False)
+    return digest
+
+
+def media_type(path: Path) -> str:
+    return MEDIA_TYPES.get(path.suffix.lower()) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+class StoredArtifact:
+    # a run artifact: a plain file in the run folder, or a link into the blob store once the run is sealed
+    def __init__(self, name: str, size: int, mtime: float, sha256: str, path: Optional[Path] = None):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.sha256 = sha256
+        self.path = path
+
+    @classmethod
+    def from_file(cls, name: str, path: Path) -> "StoredArtifact":
+        stat = path.stat()
+        return cls(name, stat.st_size, stat.st_mtime, file_digest(path), path=path)
+
+    @property
+    def linked(self) -> bool:
+        return self.path is None
+
+    @property
+    def media_type(self) -> str:
+        return media_type(Path(self.name))
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb") if self.path is not None else get_blob_store().open(self.sha256)
+
+    def read_bytes(self) -> bytes:
+        with self.open() as handle:
+            return handle.read()
+
+    def entry(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": self.size,
+            "mtime": datetime.utcfromtimestamp(self.mtime).isoformat() + "Z",
+            "sha256": self.sha256,
+            "media_type": self.media_type,
+        }
+
+
+def read_links(base: Path) -> Dict[str, Dict[str, Any]]:
+    path = base / LINKS_FILE
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except ValueError:
+        logger.warning("Ignoring unreadable blob links in %s", path)
+        return {}
+
+
+def _linked(name: str, link: Dict[str, Any]) -> StoredArtifact:
+    return StoredArtifact(name, link["size"], link["mtime"], link["sha256"])
+
+
+def run_artifacts(base: Path) -> List[StoredArtifact]:
     if not base.exists():
-        raise FileNotFoundError(run_id)
-    files = {}
+        raise FileNotFoundError(base.name)
+    found = {name: _linked(name, link) for name, link in read_links(base).items()}
+    # a plain file overrides its link: a resumed step rewrites its output in the run folder
     for file in base.rglob("*"):
-        if file.is_file():
-            rel = str(file.relative_to(base))
-            try:
-                files[rel] = file.read_text()
-            except UnicodeDecodeError:
-                files[rel] = str(file)
-    return files
-
-
-def zip_run(run_id: str) -> Path:
-    base = runs_root() / run_id
-    zip_path = base.with_suffix('.zip')
-    with zipfile.ZipFile(zip_path, 'w') as zf:
-        for file in base.rglob('*'):
-            if file.is_file():
-                zf.write(file, arcname=file.relative_to(base))
-    return zip_path
+        if not is_artifact(file):
+            continue
+        name = str(file.relative_to(base))
+        try:
+            found[name] = StoredArtifact.from_file(name, file)
+        except FileNotFoundError:
+            continue
+    return [found[name] for name in sorted(found)]
+
+
+def run_manifest(base: Path) -> List[Dict[str, Any]]:
+    return [artifact.entry() for artifact in run_artifacts(base)]
+
+
+def find_artifact(base: Path, name: str) -> Optional[StoredArtifact]:
+    # names come from the URL: anything outside the run folder is treated as missing
+    root = base.resolve()
+    path = (root / name).resolve()
+    if not path.is_relative_to(root) or path == root:
+        return None
+    rel = str(path.relative_to(root))
+    if is_artifact(path):
+        try:
+            return StoredArtifact.from_file(rel, path)
+        except FileNotFoundError:
+            pass
+    link = read_links(base).get(rel)
+    return _linked(rel, link) if link is not None else None
+
+
+def has_artifact(base: Path, name: str) -> bool:
+    return (base / name).exists() or name in read_links(base)
+
+
+def read_artifact(base: Path, name: str) -> Optional[bytes]:
+    artifact = find_artifact(base, name)
+    if artifact is None:
+        return None
+    try:
+        return artifact.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def seal_run(base: Path) -> int:
+    # moves the artifacts of a finished run into the blob store; returns the bytes freed in the run folder
+    store = get_blob_store()
+    links = read_links(base)
+    sealed = []
+    for file in sorted(base.rglob("*")):
+        name = str(file.relative_to(base))
+        if not is_artifact(file) or name in PLAIN_FILES:
+            continue
+        try:
+            stat = file.stat()
+            digest = file_digest(file)
+            stored = store.put_file(file, digest)
+        except (FileNotFoundError, ValueError) as exc:
+            logger.warning("Not sealing %s: %s", file, exc)
+            continue
+        BLOBS_LINKED.inc(("stored" if stored else "deduplicated",))
+        links[name] = {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+        sealed.append((file, stat))
+    if not sealed:
+        return 0
+    atomic_write(base / LINKS_FILE, json.dumps(links, indent=2, sort_keys=True), fsync=get_settings().artifact_fsync)
+    freed = 0
+    for file, stat in sealed:
+        # a file rewritten while it was being sealed stays, and overrides its link
+        try:
+            current = file.stat()
+        except FileNotFoundError:
+            continue
+        if (current.st_size, current.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            file.unlink()
+            freed += stat.st_size
+    for folder in sorted((p for p in base.rglob("*") if p.is_dir()), key=lambda p: len(p.parts), reverse=True):
+        if not any(folder.iterdir()):
+            folder.rmdir()
+    return freed
 
 
 def timestamp() -> str:
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterator, Tuple
+
+CHUNK_SIZE = 64 * 1024
+BLOB_SUFFIX = ".gz"
+
+
+class BlobStore:
+    # content-addressed: a blob is named by the sha256 of its uncompressed bytes and stored gzip-compressed,
+    # so identical artifacts of different runs share one file
+    def __init__(self, root: Path, level: int = 6, fsync: bool = False):
+        self.root = root
+        self.level = level
+        self.fsync = fsync
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{BLOB_SUFFIX}"
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put_file(self, source: Path, digest: str) -> bool:
+        target = self.path(digest)
+        if target.exists():
+            # a fresh mtime tells the collector the blob was just linked again
+            os.utime(target)
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            sha = hashlib.sha256()
+            with open(source, "rb") as src, open(tmp, "wb") as raw:
+                # mtime=0 keeps the compressed bytes a pure function of the content
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.level, mtime=0) as out:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        sha.update(chunk)
+                        out.write(chunk)
+                if self.fsync:
+                    raw.flush()
+                    os.fsync(raw.fileno())
+            # the source changed after it was hashed: storing it under that digest would corrupt every link to it
+            if sha.hexdigest() != digest:
+                raise ValueError(f"{source} changed while it was stored")
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return True
+
+    def open(self, digest: str) -> BinaryIO:
+        return gzip.open(self.path(digest), "rb")
+
+    def open_compressed(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+    def stored_size(self, digest: str) -> int:
+        return self.path(digest).stat().st_size
+
+    def delete(self, digest: str) -> int:
+        path = self.path(digest)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def blobs(self) -> Iterator[Tuple[str, int, float]]:
+        for path in self.root.glob(f"??/*{BLOB_SUFFIX}"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield path.name[: -len(BLOB_SUFFIX)], stat.st_size, stat.st_mtime
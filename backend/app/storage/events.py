@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import copy
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.schemas.pipeline import RunRecord, StepResult
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+EVENTS_FILE = "events.jsonl"
+SNAPSHOT_FILE = "run.json"
+STEP_FIELDS = [name for name in StepResult.__fields__ if name != "artifacts"]
+
+
+def encode_snapshot(record: Dict[str, Any]) -> str:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+
+
+class EventLog:
+    # turns successive states of a RunRecord into the events that lead from one to the next
+    def __init__(self, record: RunRecord):
+        self.seq = record.event_seq
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._artifacts: Dict[str, int] = {}
+        self._usage: Dict[str, Any] = {}
+        self.mark(record)
+
+    def mark(self, record: RunRecord) -> None:
+        for name, step in record.steps.items():
+            self._steps[name] = {field: copy.deepcopy(getattr(step, field)) for field in STEP_FIELDS}
+            self._artifacts[name] = len(step.artifacts)
+        self._usage = {agent: usage.dict() for agent, usage in record.usage.items()}
+
+    def diff(self, record: RunRecord, ts: str) -> List[Dict[str, Any]]:
+        events: List[Dict[str, Any]] = []
+        for name, step in record.steps.items():
+            last = self._steps.setdefault(name, {})
+            changes = {}
+            for field in STEP_FIELDS:
+                value = getattr(step, field)
+                if field not in last or last[field] != value:
+                    last[field] = copy.deepcopy(value)
+                    changes[field] = value.value if field == "status" else copy.deepcopy(value)
+            # artifacts are published before a step reports its final status
+            for artifact in step.artifacts[self._artifacts.get(name, 0) :]:
+                events.append({"type": "artifact.added", "step": name, "artifact": artifact.dict()})
+            self._artifacts[name] = len(step.artifacts)
+            if changes:
+                kind = f"step.{changes['status']}" if "status" in changes else "step.progress"
+                events.append({"type": kind, "step": name, "changes": changes})
+        usage = {agent: value.dict() for agent, value in record.usage.items()}
+        if usage != self._usage:
+            self._usage = usage
+            events.append({"type": "usage", "usage": usage})
+        for event in events:
+            self.seq += 1
+            event.update(seq=self.seq, ts=ts)
+        record.event_seq = self.seq
+        return events
+
+
+def apply_event(record: Dict[str, Any], event: Dict[str, Any]) -> None:
+    kind = event.get("type", "")
+    if kind.startswith("step."):
+        step = record["steps"].setdefault(event["step"], StepResult().dict())
+        step.update(event.get("changes", {}))
+    elif kind == "artifact.added":
+        artifacts = record["steps"].setdefault(event["step"], StepResult().dict())["artifacts"]
+        if not any(item["name"] == event["artifact"]["name"] for item in artifacts):
+            artifacts.append(event["artifact"])
+    elif kind == "usage":
+        record["usage"] = event["usage"]
+    record["updated_at"] = event.get("ts", record["updated_at"])
+    record["event_seq"] = event["seq"]
+
+
+def read_events(base: Path, after: int = 0) -> Iterator[Dict[str, Any]]:
+    path = base / EVENTS_FILE
+    if not path.exists():
+        return
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash; everything before it is intact
+                logger.warning("Ignoring truncated event in %s", path)
+                break
+            if event.get("seq", 0) > after:
+                yield event
+
+
+def load_record(base: Path) -> Optional[RunRecord]:
+    snapshot = base / SNAPSHOT_FILE
+    if not snapshot.exists():
+        return None
+    record = json.loads(snapshot.read_text())
+    for event in read_events(base, after=record.get("event_seq", 0)):
+        apply_event(record, event)
+    return RunRecord.parse_obj(record)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import shutil
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import get_settings
+from app.storage import artifacts
+from app.storage.archive import archive_run_id, archives_root
+from app.storage.events import load_record
+from app.storage.run_index import get_run_index, run_status
+from app.utils.logging import configure_logging
+from app.utils.metrics import registry
+
+logger = configure_logging()
+
+GC_RECLAIMED = registry.counter("artifact_gc_reclaimed_bytes_total", "Bytes freed by the retention collector", ("kind",))
+GC_DELETED = registry.counter("artifact_gc_deleted_total", "Runs, blobs and archives deleted by the retention collector", ("kind",))
+# blobs and zips younger than this may belong to a seal or a download that is still in flight
+GRACE_SECONDS = 600
+FINISHED_RUNS = {"completed", "failed", "cancelled"}
+
+ActiveCheck = Callable[[str], bool]
+
+
+class RetentionPolicy:
+    def __init__(self, max_age_seconds: float = 0, max_bytes: int = 0, keep_last: int = 0):
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.keep_last = max(0, keep_last)
+
+    @classmethod
+    def from_settings(cls) -> "RetentionPolicy":
+        settings = get_settings()
+        return cls(settings.retention_max_age_days * 86400, settings.retention_max_bytes, settings.retention_keep_last)
+
+
+class RunUsage:
+    def __init__(self, base: Path, created: float, updated: float, finished: bool, size: int, blobs: Set[str]):
+        self.base = base
+        self.created = created
+        self.updated = updated
+        self.finished = finished
+        self.size = size
+        self.blobs = blobs
+
+
+def _timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.rstrip("Z")).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _tree_size(base: Path) -> int:
+    size = 0
+    for path in base.rglob("*"):
+        try:
+            if path.is_file():
+                size += path.stat().st_size
+        except FileNotFoundError:
+            continue
+    return size
+
+
+def _scan_runs(is_active: ActiveCheck) -> List[RunUsage]:
+    runs = []
+    for base in artifacts.runs_root().iterdir():
+        if not base.is_dir():
+            continue
+        created = updated = base.stat().st_mtime
+        finished = False
+        try:
+            record = load_record(base)
+            if record is not None:
+                created, updated = _timestamp(record.created_at), _timestamp(record.updated_at)
+                finished = run_status(record) in FINISHED_RUNS
+        except ValueError as exc:
+            logger.warning("Keeping unreadable run %s: %s", base.name, exc)
+        blobs = {link["sha256"] for link in artifacts.read_links(base).values()}
+        runs.append(RunUsage(base, created, updated, finished and not is_active(base.name), _tree_size(base), blobs))
+    runs.sort(key=lambda run: (run.created, run.base.name), reverse=True)
+    return runs
+
+
+def _zip_files() -> List[Tuple[Path, int, float]]:
+    # cached run and batch archives, plus the zips old versions of the download routes left behind
+    found = []
+    for root in (archives_root(), artifacts.runs_root(), artifacts.batches_root()):
+        for path in [*root.glob("*.zip"), *root.glob(".*.tmp")]:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            found.append((path, stat.st_size, stat.st_mtime))
+    return found
+
+
+def collect_garbage(
+    policy: Optional[RetentionPolicy] = None,
+    is_active: ActiveCheck = lambda run_id: False,
+    now: Optional[float] = None,
+) -> Dict[str, int]:
+    policy = policy or RetentionPolicy.from_settings()
+    now = time.time() if now is None else now
+    store = artifacts.get_blob_store()
+    runs = _scan_runs(is_active)
+    refs = Counter(digest for run in runs for digest in run.blobs)
+    blobs = {digest: (size, mtime) for digest, size, mtime in store.blobs()}
+    zips = _zip_files()
+    total = sum(run.size for run in runs) + sum(size for size, _ in blobs.values()) + sum(size for _, size, _ in zips)
+    report = {"runs": 0, "blobs": 0, "archives": 0, "reclaimed_bytes": 0}
+
+    def reclaim(kind: str, size: int) -> None:
+        nonlocal total
+        total -= size
+        report[kind] += 1
+        report["reclaimed_bytes"] += size
+        GC_DELETED.inc((kind,))
+        GC_RECLAIMED.inc((kind,), size)
+
+    def drop_blob(digest: str) -> None:
+        # a blob linked again since the scan has a fresh mtime and survives until the next pass
+        size, mtime = blobs[digest]
+        if refs[digest] <= 0 and now - mtime > GRACE_SECONDS:
+            del blobs[digest]
+            reclaim("blobs", store.delete(digest))
+
+    deleted: Set[str] = set()
+    # the newest keep_last runs are never touched; the rest go oldest first
+    for run in reversed(runs[policy.keep_last :]):
+        expired = policy.max_age_seconds > 0 and now - run.updated > policy.max_age_seconds
+        over_budget = policy.max_bytes > 0 and total > policy.max_bytes
+        if not run.finished or not (expired or over_budget) or is_active(run.base.name):
+            continue
+        shutil.rmtree(run.base, ignore_errors=True)
+        deleted.add(run.base.name)
+        reclaim("runs", run.size)
+        for digest in run.blobs:
+            refs[digest] -= 1
+            if digest in blobs:
+                drop_blob(digest)
+    if deleted:
+        get_run_index().delete(deleted)
+
+    # blobs nothing links to, e.g. stored by a seal that crashed before it wrote the run's links
+    for digest in list(blobs):
+        drop_blob(digest)
+
+    # a cached archive lives as long as the run or batch it was built from
+    owners = {archives_root(): artifacts.runs_root(), artifacts.batches_root(): artifacts.batches_root()}
+    for path, size, mtime in zips:
+        if now - mtime <= GRACE_SECONDS:
+            continue
+        if path.parent in owners and path.suffix == ".zip":
+            owner = archive_run_id(path)
+            expired = policy.max_age_seconds > 0 and now - mtime > policy.max_age_seconds
+            if owner is not None and owner not in deleted and (owners[path.parent] / owner).is_dir() and not expired:
+                continue
+        path.unlink(missing_ok=True)
+        reclaim("archives", size)
+
+    report["total_bytes"] = total
+    logger.info(
+        "Retention GC removed %s runs, %s blobs and %s archives, reclaimed %s bytes (%s bytes in use)",
+        report["runs"],
+        report["blobs"],
+        report["archives"],
+        report["reclaimed_bytes"],
+        total,
+    )
+    return report
+
+
+class RetentionCollector:
+    def __init__(self, interval: float, is_active: ActiveCheck, policy: Optional[RetentionPolicy] = None):
+        self.interval = interval
+        self.is_active = is_active
+        self.policy = policy
+        self.last_report: Optional[Dict[str, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info("Started retention GC every %ss", self.interval)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self.last_report = await asyncio.to_thread(collect_garbage, self.policy, self.is_active)
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Retention GC failed: %s", exc)
+            await asyncio.sleep(self.interval)
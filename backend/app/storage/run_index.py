@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.schemas.pipeline import RunInput, RunRecord, StepStatus
+from app.storage.events import load_record
+from app.utils.logging import configure_logging
+
+logger = configure_logging()
+
+RUN_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+MAX_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    model TEXT,
+    base_run_id TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    steps TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at, id);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status, created_at, id);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (model, created_at, id);
+"""
+
+FAILED_STEPS = {StepStatus.failed, StepStatus.timed_out}
+FINISHED_STEPS = {StepStatus.success, StepStatus.skipped, *FAILED_STEPS}
+
+
+def run_status(record: RunRecord) -> str:
+    statuses = [step.status for step in record.steps.values()]
+    if any(status in FAILED_STEPS for status in statuses):
+        return "failed"
+    if StepStatus.cancelled in statuses:
+        return "cancelled"
+    if statuses and all(status in FINISHED_STEPS for status in statuses):
+        return "completed"
+    if all(status == StepStatus.queued for status in statuses):
+        return "queued"
+    return "running"
+
+
+def record_row(record: RunRecord, status: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "id": record.id,
+        "status": status or run_status(record),
+        "model": record.input.model,
+        "base_run_id": record.input.base_run_id,
+        "created_at": record.created_at,
+        "updated_at": record.updated_at,
+        "steps": json.dumps({name: step.status.value for name, step in record.steps.items()}),
+    }
+
+
+def encode_cursor(created_at: str, run_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, run_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, run_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    return str(created_at), str(run_id)
+
+
+def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "status": row["status"],
+        "model": row["model"],
+        "base_run_id": row["base_run_id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "steps": json.loads(row["steps"]),
+    }
+
+
+class RunIndex:
+    def __init__(self, path: Path, runs_root: Optional[Path] = None):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        fresh = conn.execute("SELECT name FROM sqlite_master WHERE name = 'runs'").fetchone() is None
+        conn.executescript(SCHEMA)
+        if fresh and runs_root is not None:
+            self.rebuild(runs_root)
+
+    @classmethod
+    def from_settings(cls) -> "RunIndex":
+        root = Path(get_settings().data_path or "./data")
+        return cls(root / "runs.sqlite3", runs_root=root / "runs")
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per thread: the writer threads and request handlers reuse theirs instead of reopening
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _upsert(self, conn: sqlite3.Connection, row: Dict[str, Any]) -> None:
+        # created_at is fixed by the first write, so a run keeps its place in the listing when it is resumed;
+        # writes landing out of order from the writer threads never move a run back to an older state
+        conn.execute(
+            "INSERT INTO runs (id, status, model, base_run_id, created_at, updated_at, steps)"
+            " VALUES (:id, :status, :model, :base_run_id, :created_at, :updated_at, :steps)"
+            " ON CONFLICT(id) DO UPDATE SET status = excluded.status, model = excluded.model,"
+            " base_run_id = excluded.base_run_id, updated_at = excluded.updated_at, steps = excluded.steps"
+            " WHERE excluded.updated_at >= runs.updated_at",
+            row,
+        )
+
+    def record(self, record: RunRecord) -> None:
+        self.write(record_row(record))
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self._upsert(self._connect(), row)
+
+    def register(self, run_id: str, inputs: RunInput, created_at: str) -> None:
+        row = {
+            "id": run_id,
+            "status": "queued",
+            "model": inputs.model,
+            "base_run_id": inputs.base_run_id,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "steps": "{}",
+        }
+        self._upsert(self._connect(), row)
+
+    def mark_cancelled(self, run_ids: Iterable[str]) -> None:
+        # only runs that never started: started runs get their status from their own run.json
+        conn = self._connect()
+        conn.executemany(
+            "UPDATE runs SET status = 'cancelled' WHERE id = ? AND status = 'queued'",
+            [(run_id,) for run_id in run_ids],
+        )
+
+    def delete(self, run_ids: Iterable[str]) -> None:
+        self._connect().executemany("DELETE FROM runs WHERE id = ?", [(run_id,) for run_id in run_ids])
+
+    def rebuild(self, runs_root: Path) -> int:
+        count = 0
+        if not runs_root.exists():
+            return count
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for base in runs_root.iterdir():
+                row = self._row_from_disk(base)
+                if row is not None:
+                    self._upsert(conn, row)
+                    count += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Indexed %s existing runs from %s", count, runs_root)
+        return count
+
+    def _row_from_disk(self, base: Path) -> Optional[Dict[str, Any]]:
+        if not base.is_dir():
+            return None
+        try:
+            record = load_record(base)
+            if record is not None:
+                return record_row(record, status="failed" if (base / "error.txt").exists() else None)
+            if (base / "input.json").exists():
+                inputs = RunInput.parse_file(base / "input.json")
+                created_at = datetime.utcfromtimestamp((base / "input.json").stat().st_mtime).isoformat() + "Z"
+                return {
+                    "id": base.name,
+                    "status": "queued",
+                    "model": inputs.model,
+                    "base_run_id": inputs.base_run_id,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                    "steps": "{}",
+                }
+        except ValueError as exc:
+            logger.warning("Skipping unreadable run %s: %s", base.name, exc)
+        return None
+
+    def query(
+        self,
+        status: Optional[List[str]] = None,
+        model: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if status:
+            clauses.append(f"status IN ({', '.join('?' for _ in status)})")
+            params.extend(status)
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        if created_after:
+            clauses.append("created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        if cursor:
+            created_at, run_id = decode_cursor(cursor)
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([created_at, created_at, run_id])
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT * FROM runs {where} ORDER BY created_at DESC, id DESC LIMIT ?", [*params, limit + 1]
+        ).fetchall()
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"]) if len(rows) > limit else None
+        return {"runs": [_summary(row) for row in page], "next_cursor": next_cursor}
+
+
+_indexes: Dict[str, RunIndex] = {}
+
+
+def get_run_index() -> RunIndex:
+    settings = get_settings()
+    key = str(Path(settings.data_path or "./data").resolve())
+    index = _indexes.get(key)
+    if index is None:
+        index = RunIndex.from_settings()
+        _indexes[key] = index
+    return index
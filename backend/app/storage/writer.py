@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from app.storage.artifacts import atomic_write
+from app.utils.logging import configure_logging
+from app.utils.metrics import registry
+
+logger = configure_logging()
+
+Content = Union[str, bytes, Callable[[], Union[str, bytes]]]
+
+ARTIFACT_WRITES = registry.counter("artifact_writes_total", "Artifact files written by the async writer", ("outcome",))
+
+
+class ArtifactWriter:
+    def __init__(self, fsync: bool = False):
+        self.fsync = fsync
+        self._pending: Dict[Path, Tuple[Content, Optional[Callable[[], None]]]] = {}
+        self._appends: Dict[Path, List[Tuple[Content, Optional[Callable[[], None]]]]] = {}
+        self._tasks: Dict[Path, asyncio.Task] = {}
+
+    def submit(self, path: Path, content: Content, after: Optional[Callable[[], None]] = None) -> None:
+        # writes to the same path that queue up behind an in-flight write collapse into the latest;
+        # content may be a callable so serialisation also happens off the event loop
+        if path in self._pending:
+            ARTIFACT_WRITES.inc(("coalesced",))
+        self._pending[path] = (content, after)
+        task = self._tasks.get(path)
+        if task is None or task.done():
+            self._tasks[path] = asyncio.get_running_loop().create_task(self._drain(path))
+
+    def append(self, path: Path, content: Content, after: Optional[Callable[[], None]] = None) -> None:
+        # appends are never dropped: everything queued behind an in-flight write goes out in one write
+        self._appends.setdefault(path, []).append((content, after))
+        task = self._tasks.get(path)
+        if task is None or task.done():
+            self._tasks[path] = asyncio.get_running_loop().create_task(self._drain_appends(path))
+
+    async def _drain_appends(self, path: Path) -> None:
+        while self._appends.get(path):
+            batch = self._appends.pop(path)
+            if len(batch) > 1:
+                ARTIFACT_WRITES.inc(("coalesced",), len(batch) - 1)
+            await asyncio.to_thread(self._append, path, batch)
+
+    def _append(self, path: Path, batch: List[Tuple[Content, Optional[Callable[[], None]]]]) -> None:
+        try:
+            text = "".join(content() if callable(content) else content for content, _ in batch)
+            with open(path, "a", encoding="utf-8") as handle:
+                handle.write(text)
+                if self.fsync:
+                    handle.flush()
+                    os.fsync(handle.fileno())
+        except Exception:
+            ARTIFACT_WRITES.inc(("failed",))
+            logger.exception("Failed to append to %s", path)
+            raise
+        ARTIFACT_WRITES.inc(("written",))
+        for _, after in batch:
+            if after is not None:
+                after()
+
+    async def _drain(self, path: Path) -> None:
+        while path in self._pending:
+            content, after = self._pending.pop(path)
+            await asyncio.to_thread(self._write, path, content, after)
+
+    def _write(self, path: Path, content: Content, after: Optional[Callable[[], None]]) -> None:
+        try:
+            atomic_write(path, content() if callable(content) else content, fsync=self.fsync)
+        except Exception:
+            ARTIFACT_WRITES.inc(("failed",))
+            logger.exception("Failed to write artifact %s", path)
+            raise
+        ARTIFACT_WRITES.inc(("written",))
+        if after is not None:
+            after()
+
+    async def flush(self, *paths: Path) -> None:
+        tasks = [self._tasks[path] for path in paths if path in self._tasks] if paths else list(self._tasks.values())
+        try:
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for path, task in list(self._tasks.items()):
+                if task.done():
+                    self._tasks.pop(path, None)
@@ -9,3 +9,7 @@ class LLMServiceError(HTTPException):
 class ValidationError(HTTPException):
     def __init__(self, detail: str, status_code: int = status.HTTP_422_UNPROCESSABLE_ENTITY):
         super().__init__(status_code=status_code, detail=detail)
+
+
+class InvalidLLMOutput(LLMServiceError):
+    pass
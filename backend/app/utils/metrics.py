@@ -0,0 +1,125 @@
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: LabelValues, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: LabelValues, value: float) -> None:
+        with self._lock:
+            counts = self.counts.setdefault(labels, [0] * (len(self.buckets) + 1))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+            counts[-1] += 1
+            self.sums[labels] = self.sums.get(labels, 0.0) + value
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for key, counts in sorted(self.counts.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(self.sums[key])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], collect: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self.collect().items())]
+
+
+class CollectedCounter(Gauge):
+    # a monotonic total kept elsewhere (e.g. by the LLM clients) and read at scrape time
+    kind = "counter"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help_text, labelnames))
+
+    def gauge(
+        self, name: str, help_text: str, labelnames: Sequence[str], collect: Callable[[], Dict[LabelValues, float]]
+    ) -> Gauge:
+        self.metrics[name] = Gauge(name, help_text, labelnames, collect)
+        return self.metrics[name]
+
+    def collected_counter(
+        self, name: str, help_text: str, labelnames: Sequence[str], collect: Callable[[], Dict[LabelValues, float]]
+    ) -> CollectedCounter:
+        self.metrics[name] = CollectedCounter(name, help_text, labelnames, collect)
+        return self.metrics[name]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
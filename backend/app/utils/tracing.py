@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+SERVICE_NAME = "testops-copilot"
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.children: List[Span] = []
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.end_ns
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": end,
+            "duration_ms": round((end - self.start_ns) / 1e6, 3) if end is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in list(self.children)],
+        }
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    # no-op outside a trace so agents and the client can be used standalone
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent, attributes)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.finish(exc)
+        raise
+    else:
+        child.finish()
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Span]:
+    # asyncio tasks copy the context when created, so spans opened in concurrent steps nest under this root
+    root = Span(name, secrets.token_hex(16), attributes=attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as exc:
+        root.finish(exc)
+        raise
+    else:
+        root.finish()
+    finally:
+        _current.reset(token)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _flatten(node: Dict[str, Any], spans: List[Dict[str, Any]]) -> None:
+    spans.append(
+        {
+            "traceId": node["trace_id"],
+            "spanId": node["span_id"],
+            "parentSpanId": node["parent_id"] or "",
+            "name": node["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(node["start_ns"]),
+            "endTimeUnixNano": str(node["end_ns"] or node["start_ns"]),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in node["attributes"].items()],
+            "status": {"code": 2, "message": node["error"]} if node["status"] == "error" else {"code": 1},
+        }
+    )
+    for child in node["children"]:
+        _flatten(child, spans)
+
+
+def to_otlp(trace: Dict[str, Any]) -> Dict[str, Any]:
+    spans: List[Dict[str, Any]] = []
+    _flatten(trace, spans)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+            }
+        ]
+    }
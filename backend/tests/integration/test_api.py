@@ -11,6 +11,17 @@ from app.main import app  # noqa: E402
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def data_path(tmp_path, monkeypatch):
+    # every test gets its own runs, index and queue instead of the working tree's ./data
+    from app.storage import artifacts
+
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    artifacts.get_settings.cache_clear()
+    yield tmp_path
+    artifacts.get_settings.cache_clear()
+
+
 @pytest.fixture(autouse=True)
 def mock_llm(monkeypatch):
     async def fake_chat_completion(*args, **kwargs):
@@ -38,3 +49,193 @@ def test_create_run():
     assert resp.status_code == 200
     run_id = resp.json()["run_id"]
     assert run_id
+
+
+def test_metrics():
+    resp = client.get("/api/metrics")
+    assert resp.status_code == 200
+    assert "# TYPE llm_calls_total counter" in resp.text
+
+
+def test_resume_unknown_run():
+    resp = client.post("/api/runs/missing-run/resume")
+    assert resp.status_code == 404
+
+
+def test_trace_unknown_run():
+    resp = client.get("/api/runs/missing-run/trace", params={"format": "otlp"})
+    assert resp.status_code == 404
+
+
+def test_create_run_rejected_when_queue_full(monkeypatch):
+    from app.orchestrator.queue import get_job_queue
+
+    monkeypatch.setattr(get_job_queue(), "max_depth", 0)
+    resp = client.post("/api/runs", json={"requirements": "backpressure"})
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert resp.json()["detail"]["estimated_wait_seconds"] >= 1
+
+
+def test_create_batch():
+    resp = client.post("/api/runs/batch", json={"items": [{"requirements": "a"}, {"requirements": "b"}]})
+    assert resp.status_code == 200
+    batch_id = resp.json()["batch_id"]
+    assert len(resp.json()["runs"]) == 2
+    progress = client.get(f"/api/runs/batch/{batch_id}")
+    assert progress.status_code == 200
+    assert progress.json()["progress"]["steps_total"] == 10
+    assert client.get("/api/runs/batch/missing").status_code == 404
+
+
+def test_cancel_queued_run():
+    run_id = client.post("/api/runs", json={"requirements": "cancel me"}).json()["run_id"]
+    resp = client.delete(f"/api/runs/{run_id}")
+    assert resp.status_code == 200
+    assert resp.json()["cancelled"]["queued"] >= 1
+    assert client.delete(f"/api/runs/{run_id}").status_code == 409
+    assert client.delete("/api/runs/unknown-run").status_code == 404
+    listed = client.get("/api/runs", params={"status": "cancelled"}).json()["runs"]
+    assert run_id in [run["id"] for run in listed]
+
+
+def test_cancel_batch_item_points_to_the_batch():
+    created = client.post("/api/runs/batch", json={"items": [{"requirements": "one"}, {"requirements": "two"}]}).json()
+    batch_id, run_id = created["batch_id"], created["runs"][0]
+    resp = client.delete(f"/api/runs/{run_id}")
+    assert resp.status_code == 409
+    assert f"DELETE /api/runs/batch/{batch_id}" in resp.json()["detail"]
+    assert client.delete(f"/api/runs/batch/{batch_id}").status_code == 200
+    # nothing left to point at once the batch job is gone
+    assert client.delete(f"/api/runs/{run_id}").json()["detail"] == "Run is not queued or running"
+
+
+def test_list_runs_paginates_and_validates():
+    from app.storage import artifacts
+
+    since = artifacts.timestamp()
+    # identical submissions still get a run each
+    run_ids = [client.post("/api/runs", json={"requirements": "Users can page"}).json()["run_id"] for _ in range(3)]
+    assert len(set(run_ids)) == 3
+    first = client.get("/api/runs", params={"created_after": since, "limit": 2}).json()
+    assert [run["status"] for run in first["runs"]] == ["queued", "queued"]
+    second = client.get("/api/runs", params={"created_after": since, "limit": 2, "cursor": first["next_cursor"]}).json()
+    assert second["next_cursor"] is None
+    assert {run["id"] for run in first["runs"] + second["runs"]} == set(run_ids)
+    assert client.get("/api/runs", params={"status": "bogus"}).status_code == 422
+    assert client.get("/api/runs", params={"cursor": "not-a-cursor"}).status_code == 422
+
+
+def test_download_streams_zip_with_etag():
+    from app.storage import artifacts
+
+    base = artifacts.runs_root() / "download-etag"
+    base.mkdir(parents=True, exist_ok=True)
+    (base / "manual.json").write_text('{"cases": []}')
+    resp = client.get("/api/runs/download-etag/download")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+    assert resp.content.startswith(b"PK")
+    etag = resp.headers["etag"]
+    cached = client.get("/api/runs/download-etag/download", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    (base / "manual.json").write_text('{"cases": [1]}')
+    changed = client.get("/api/runs/download-etag/download", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert client.get("/api/runs/unknown-run/download").status_code == 404
+
+
+def test_run_detail_returns_manifest_and_inlines_on_request():
+    from app.storage import artifacts
+
+    base = artifacts.runs_root() / "manifest-run"
+    base.mkdir(parents=True, exist_ok=True)
+    (base / "manual.json").write_text('{"cases": []}')
+    (base / "autotests").mkdir(exist_ok=True)
+    (base / "autotests" / "test_api.py").write_text("def test_ok():\n    assert True\n" * 100)
+    data = client.get("/api/runs/manifest-run").json()
+    assert data["files"] == {}
+    manifest = {entry["name"]: entry for entry in data["manifest"]}
+    assert set(manifest) == {"manual.json", "autotests/test_api.py"}
+    assert manifest["manual.json"]["size"] == len('{"cases": []}')
+    assert manifest["manual.json"]["media_type"] == "application/json"
+    assert len(manifest["autotests/test_api.py"]["sha256"]) == 64
+
+    data = client.get("/api/runs/manifest-run", params={"include": "manual.json,missing.txt"}).json()
+    assert data["files"] == {"manual.json": '{"cases": []}'}
+    assert client.get("/api/runs/unknown-run").status_code == 404
+
+
+def test_run_file_supports_range_gzip_and_etag():
+    from app.storage import artifacts
+
+    base = artifacts.runs_root() / "file-run"
+    base.mkdir(parents=True, exist_ok=True)
+    body = "def test_ok():\n    assert True\n" * 200
+    (base / "test_api.py").write_text(body)
+    url = "/api/runs/file-run/files/test_api.py"
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.headers["content-encoding"] == "gzip"
+    assert full.text == body
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["content-length"] == str(len(body))
+
+    part = client.get(url, headers={"Range": "bytes=4-11"})
+    assert part.status_code == 206
+    assert part.content == body[4:12].encode()
+    assert part.headers["content-range"] == f"bytes 4-11/{len(body)}"
+    assert client.get(url, headers={"Range": "bytes=-5"}).content == body[-5:].encode()
+    assert client.get(url, headers={"Range": f"bytes={len(body)}-"}).status_code == 416
+
+    assert client.get(url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+    assert client.get("/api/runs/file-run/files/..%2F..%2Fruns.sqlite3").status_code == 404
+    assert client.get("/api/runs/file-run/files/missing.py").status_code == 404
+
+
+def test_sealed_run_files_are_served_from_the_blob_store():
+    from app.storage import artifacts
+
+    base = artifacts.runs_root() / "sealed-run"
+    base.mkdir(parents=True, exist_ok=True)
+    body = "import allure\n" * 300
+    (base / "manual.py").write_text(body)
+    artifacts.seal_run(base)
+    assert not (base / "manual.py").exists()
+
+    url = "/api/runs/sealed-run/files/manual.py"
+    compressed = client.get(url)
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.text == body
+    part = client.get(url, headers={"Range": "bytes=7-12", "Accept-Encoding": "identity"})
+    assert part.status_code == 206
+    assert part.content == body[7:13].encode()
+    manifest = client.get("/api/runs/sealed-run", params={"include": "manual.py"}).json()
+    assert manifest["files"]["manual.py"] == body
+
+    report = client.post("/api/storage/gc").json()
+    assert report["runs"] == 0
+    assert "reclaimed_bytes" in report
+
+
+def test_run_routes_reject_ids_outside_the_runs_folder(data_path):
+    client.get("/api/runs")
+    assert (data_path / "runs.sqlite3").exists()
+    for method, url in [
+        ("GET", "/api/runs/%2E%2E"),
+        ("GET", "/api/runs/%2E%2E/files/runs.sqlite3"),
+        ("GET", "/api/runs/%2E/files/runs.sqlite3"),
+        ("GET", "/api/runs/%2E%2E/trace"),
+        ("GET", "/api/runs/%2E%2E/download"),
+        ("DELETE", "/api/runs/%2E%2E"),
+        ("POST", "/api/runs/%2E%2E/resume"),
+    ]:
+        assert client.request(method, url).status_code == 404, url
+    resp = client.post("/api/runs", json={"requirements": "sample", "base_run_id": ".."})
+    assert resp.status_code == 404
+    assert not list((data_path / "archives").glob("*.zip"))
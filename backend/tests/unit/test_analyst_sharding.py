@@ -0,0 +1,50 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+from app.agents.analyst import AnalystAgent, merge_plans
+from app.llm import client as llm_client
+from app.schemas.pipeline import AnalystPlan
+
+
+def test_merge_plans_is_deterministic_and_dedupes():
+    first = AnalystPlan(
+        features=["VM lifecycle"],
+        coverage_matrix={"VMs": ["create vm", "delete vm"]},
+        gaps=["Disks", "rate limits"],
+    )
+    second = AnalystPlan(
+        features=["vm lifecycle", "Disk attach"],
+        coverage_matrix={"vms": ["Create VM", "resize vm"], "Disks": ["attach disk"]},
+        gaps=["Rate limits"],
+    )
+    merged = merge_plans([first, second])
+    assert merged.features == ["VM lifecycle", "Disk attach"]
+    assert merged.coverage_matrix == {"VMs": ["create vm", "delete vm", "resize vm"], "Disks": ["attach disk"]}
+    assert merged.gaps == ["rate limits"]
+
+
+@pytest.mark.asyncio
+async def test_analyze_shards_large_spec(monkeypatch):
+    spec = {"openapi": "3.0.0", "paths": {f"/{name}": {"get": {"tags": [name]}} for name in ("vms", "disks", "nets")}}
+    prompts = []
+
+    async def fake_chat_completion(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        prompts.append(prompt)
+        area = next(name for name in ("vms", "disks", "nets") if f"'{name}'" in prompt)
+        return json.dumps({"features": [area], "coverage_matrix": {area: [f"list {area}"]}, "gaps": []})
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    from app.agents import analyst
+
+    settings = analyst.get_settings()
+    monkeypatch.setattr(settings, "analyst_shard_size", 1)
+    plan = await AnalystAgent().analyze("req", json.dumps(spec), sharded=True)
+    assert len(prompts) == 3
+    assert plan.features == ["disks", "nets", "vms"]
+    assert list(plan.coverage_matrix) == ["disks", "nets", "vms"]
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.storage import artifacts
+from app.storage.writer import ArtifactWriter
+
+
+@pytest.mark.asyncio
+async def test_writer_coalesces_bursts_into_latest_content(tmp_path, monkeypatch):
+    written = []
+    original = artifacts.atomic_write
+
+    def tracking_write(path, data, fsync=False):
+        written.append(data)
+        return original(path, data, fsync=fsync)
+
+    monkeypatch.setattr("app.storage.writer.atomic_write", tracking_write)
+    writer = ArtifactWriter()
+    target = tmp_path / "run.json"
+    indexed = []
+    for idx in range(10):
+        writer.submit(target, lambda idx=idx: f"version {idx}", after=lambda idx=idx: indexed.append(idx))
+    await writer.flush()
+    assert target.read_text() == "version 9"
+    assert written == ["version 9"]
+    assert indexed == [9]
+
+
+@pytest.mark.asyncio
+async def test_failed_write_keeps_previous_file_and_surfaces_on_flush(tmp_path):
+    target = tmp_path / "manual.json"
+    artifacts.atomic_write(target, "old")
+    writer = ArtifactWriter()
+
+    def broken():
+        raise ValueError("cannot serialise")
+
+    writer.submit(target, broken)
+    with pytest.raises(ValueError):
+        await writer.flush(target)
+    assert target.read_text() == "old"
+    assert [path.name for path in tmp_path.iterdir()] == ["manual.json"]
+
+
+def test_atomic_write_ignores_temp_files_in_listings(tmp_path):
+    (tmp_path / ".run.json.1.abc.tmp").write_text("partial")
+    artifacts.atomic_write(tmp_path / "run.json", b"{}", fsync=True)
+    assert [path.name for path in tmp_path.iterdir() if artifacts.is_artifact(path)] == ["run.json"]
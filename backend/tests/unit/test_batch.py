@@ -0,0 +1,72 @@
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.llm import client as llm_client
+from app.orchestrator.batch import batch_progress, create_batch, load_batch, run_batch
+from app.orchestrator.runner import PipelineRunner
+from app.schemas.pipeline import BatchInput, RunInput
+from app.storage import artifacts
+from app.storage.archive import BatchArchive
+
+RESPONSES = {
+    "analyst": '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+    "manual": '{"cases":[{"title":"case1","severity":"NORMAL","owner":"qa","priority":"P2","feature":"f","story":"s","suite":"manual","tags":[],"steps":["Arrange"],"expected":["Assert"]}]}',
+    "autotests": '{"ui":[],"api":[{"name":"api1","steps":["call"],"assertions":["status"],"target":"api"}]}',
+    "standards": '{"issues":[],"valid":true}',
+    "optimize": '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
+}
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_unique_items_and_reports_progress(monkeypatch, tmp_path):
+    requirements = []
+
+    async def fake_chat_completion(self, messages, *args, agent=None, **kwargs):
+        if agent == "analyst":
+            requirements.append(messages[-1]["content"])
+            if "broken" in messages[-1]["content"]:
+                return "not json"
+        return RESPONSES[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    body = BatchInput(
+        items=[RunInput(requirements="orders"), RunInput(requirements="billing"), RunInput(requirements="orders")]
+    )
+    batch = create_batch("b1", body)
+    assert batch.items == ["b1-001", "b1-002", "b1-001"]
+    assert batch_progress(load_batch("b1"))["status"] == "queued"
+
+    await run_batch(PipelineRunner(), "b1")
+    assert len(requirements) == 2
+    progress = batch_progress(load_batch("b1"))
+    assert progress["status"] == "completed"
+    assert progress["progress"]["percent"] == 100.0
+
+    archive = BatchArchive("b1", batch.items)
+    data = b"".join(archive.stream(cache=True))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = zf.namelist()
+    assert "batch.json" in names
+    assert "b1-001/manual.py" in names and "b1-002/run.json" in names
+    again = BatchArchive("b1", batch.items)
+    assert again.etag == archive.etag
+    assert again.cached().read_bytes() == data
+
+    create_batch("b2", BatchInput(items=[RunInput(requirements="fine"), RunInput(requirements="broken")]))
+    with pytest.raises(RuntimeError, match="1 of 2 runs"):
+        await run_batch(PipelineRunner(), "b2")
+    progress = batch_progress(load_batch("b2"))
+    assert progress["status"] == "failed"
+    assert progress["progress"]["runs"] == {"completed": 1, "failed": 1}
@@ -0,0 +1,84 @@
+import io
+import json
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.orchestrator.checkpoints import CheckpointStore
+from app.orchestrator.incremental import Baseline
+from app.schemas.pipeline import AnalystPlan, RunInput
+from app.storage import artifacts
+from app.storage.archive import RunArchive
+
+
+@pytest.fixture(autouse=True)
+def data_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    artifacts.get_settings.cache_clear()
+    yield tmp_path
+    artifacts.get_settings.cache_clear()
+
+
+def _run(run_id, manual="import allure\n" * 200):
+    base = artifacts.create_run_folder(run_id)
+    (base / "input.json").write_text(RunInput(requirements="req").json())
+    (base / "analyst.json").write_text(AnalystPlan().json())
+    (base / "manual.py").write_text(manual)
+    (base / "autotests").mkdir()
+    (base / "autotests" / "test_api.py").write_text("def test_ok():\n    assert True\n")
+    return base
+
+
+def test_seal_deduplicates_identical_artifacts_across_runs():
+    first, second = _run("seal-a"), _run("seal-b")
+    freed = artifacts.seal_run(first)
+    artifacts.seal_run(second)
+    assert freed > 0
+    assert not (first / "manual.py").exists()
+    assert not (first / "autotests").exists()
+    assert (first / "input.json").exists()
+    links = json.loads((first / artifacts.LINKS_FILE).read_text())
+    other = json.loads((second / artifacts.LINKS_FILE).read_text())
+    assert {name: link["sha256"] for name, link in links.items()} == {name: link["sha256"] for name, link in other.items()}
+    blobs = list(artifacts.get_blob_store().blobs())
+    assert len(blobs) == 3
+    stored = {digest: size for digest, size, _ in blobs}
+    assert stored[links["manual.py"]["sha256"]] < links["manual.py"]["size"]
+
+
+def test_sealed_artifacts_read_through_the_layer():
+    base = _run("seal-read")
+    before = {entry["name"]: entry for entry in artifacts.run_manifest(base)}
+    artifacts.seal_run(base)
+    after = {entry["name"]: entry for entry in artifacts.run_manifest(base)}
+    assert after == before
+    assert artifacts.LINKS_FILE not in after
+    assert artifacts.read_artifact(base, "manual.py") == ("import allure\n" * 200).encode()
+    assert artifacts.has_artifact(base, "analyst.json")
+    assert artifacts.find_artifact(base, "../seal-read/manual.py").linked
+    assert artifacts.find_artifact(base, "../other/manual.py") is None
+
+    (base / "manual.py").write_text("rewritten by a resume")
+    assert artifacts.read_artifact(base, "manual.py") == b"rewritten by a resume"
+
+    baseline = Baseline.load(base)
+    assert baseline.plan == AnalystPlan()
+
+
+def test_archive_and_checkpoints_survive_sealing():
+    base = _run("seal-zip")
+    store = CheckpointStore(base)
+    store.save("analyst", "fp", "analyst.json")
+    etag = RunArchive("seal-zip", base).etag
+    artifacts.seal_run(base)
+    archive = RunArchive("seal-zip", base)
+    assert archive.etag == etag
+    with zipfile.ZipFile(io.BytesIO(b"".join(archive.stream()))) as zf:
+        assert zf.read("manual.py") == ("import allure\n" * 200).encode()
+        assert zf.read("autotests/test_api.py").startswith(b"def test_ok")
+    assert CheckpointStore(base).load().restore("analyst", "fp", AnalystPlan) == AnalystPlan()
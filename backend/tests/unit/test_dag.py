@@ -0,0 +1,74 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.orchestrator.dag import Step, run_dag, validate_dag
+
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_concurrently():
+    active = []
+    peak = []
+
+    def sleeper(name):
+        async def fn(results):
+            active.append(name)
+            peak.append(len(active))
+            await asyncio.sleep(0.05)
+            active.remove(name)
+            return name
+
+        return fn
+
+    async def join(results):
+        return sorted([results["left"], results["right"]])
+
+    outcome = await run_dag(
+        [
+            Step("root", sleeper("root")),
+            Step("left", sleeper("left"), ["root"]),
+            Step("right", sleeper("right"), ["root"]),
+            Step("join", join, ["left", "right"]),
+        ]
+    )
+    assert outcome.ok
+    assert outcome.results["join"] == ["left", "right"]
+    assert max(peak) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_step_skips_dependents_only():
+    async def boom(results):
+        raise RuntimeError("boom")
+
+    async def ok(results):
+        return "ok"
+
+    outcome = await run_dag(
+        [
+            Step("a", ok),
+            Step("b", boom, ["a"]),
+            Step("c", ok, ["b"]),
+            Step("d", ok, ["c"]),
+            Step("e", ok, ["a"]),
+        ]
+    )
+    assert isinstance(outcome.errors["b"], RuntimeError)
+    assert outcome.skipped == {"c": "b", "d": "c"}
+    assert outcome.results["e"] == "ok"
+    assert not outcome.ok
+
+
+def test_validate_dag_rejects_cycles_and_unknown_deps():
+    async def noop(results):
+        return None
+
+    with pytest.raises(ValueError, match="cycle"):
+        validate_dag([Step("a", noop, ["b"]), Step("b", noop, ["a"])])
+    with pytest.raises(ValueError, match="unknown"):
+        validate_dag([Step("a", noop, ["missing"])])
@@ -0,0 +1,132 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.llm import client as llm_client
+from app.orchestrator.incremental import diff_inputs
+from app.orchestrator.runner import PipelineRunner
+from app.schemas.pipeline import RunInput
+from app.storage import artifacts
+from app.storage.events import load_record
+
+SPEC = {
+    "openapi": "3.0.0",
+    "paths": {
+        "/cart": {"get": {"tags": ["cart"], "summary": "Show cart", "responses": {"200": {"description": "ok"}}}},
+        "/login": {"post": {"tags": ["auth"], "summary": "Login", "responses": {"200": {"description": "ok"}}}},
+    },
+}
+
+
+def test_diff_inputs_by_paragraph_and_operation():
+    changed = json.loads(json.dumps(SPEC))
+    changed["paths"]["/login"]["post"]["responses"]["401"] = {"description": "bad password"}
+    changed["paths"]["/orders"] = {"get": {"summary": "List orders", "responses": {}}}
+    old = RunInput(requirements="Cart keeps items.\n\nLogin by password.", openapi=json.dumps(SPEC))
+    new = RunInput(requirements="Cart keeps items.\n\nLogin by password or SMS code.", openapi=json.dumps(changed))
+
+    report, texts = diff_inputs(old, new)
+    assert report["paragraphs"]["added"] == ["Login by password or SMS code."]
+    assert report["paragraphs"]["removed"] == ["Login by password."]
+    assert report["paragraphs"]["unchanged"] == 1
+    assert report["operations"] == {
+        "added": ["GET /orders"],
+        "removed": [],
+        "changed": ["POST /login"],
+        "unchanged": 1,
+    }
+    assert any("login" in text.lower() for text in texts)
+
+
+def _case(title, story):
+    return {
+        "title": title,
+        "severity": "NORMAL",
+        "owner": "qa",
+        "priority": "P2",
+        "feature": "shop",
+        "story": story,
+        "suite": "manual",
+        "tags": [],
+        "steps": ["Arrange"],
+        "expected": ["Assert"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_regenerates_only_affected_areas(monkeypatch, tmp_path):
+    plan = {"features": ["shop"], "coverage_matrix": {"Cart": ["Add item to cart"], "Login": ["Login by password"]}}
+    responses = {
+        "analyst": json.dumps(plan),
+        "manual": json.dumps({"cases": [_case("Add item to cart", "Cart"), _case("Login by password", "Login")]}),
+        "autotests": json.dumps(
+            {
+                "ui": [{"name": "cart_add_item", "steps": ["add item to cart"], "assertions": [], "target": "ui"}],
+                "api": [{"name": "login_password", "steps": ["post login"], "assertions": [], "target": "api"}],
+            }
+        ),
+        "standards": '{"issues":[],"valid":true}',
+        "optimize": '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
+    }
+    prompts = {}
+
+    async def fake_chat_completion(self, messages, *args, agent=None, **kwargs):
+        prompts[agent] = messages[-1]["content"]
+        return responses[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    monkeypatch.setenv("ARTIFACT_STORE", "1")
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    runner = PipelineRunner()
+    # run_and_record seals the finished base run: the baseline is read back from the blob store
+    await runner.run_and_record("base", RunInput(requirements="Cart keeps items.\n\nLogin by password."))
+    assert not (artifacts.runs_root() / "base" / "manual.json").exists()
+    sealed = load_record(artifacts.runs_root() / "base")
+    assert [artifact.path for artifact in sealed.steps["manual"].artifacts] == ["manual.py"]
+    assert artifacts.find_artifact(artifacts.runs_root() / "base", "manual.py").linked
+
+    plan["coverage_matrix"]["Login"].append("Login by SMS code")
+    responses["analyst"] = json.dumps(plan)
+    responses["manual"] = json.dumps(
+        {"cases": [_case("Login by password", "Login"), _case("Login by SMS code", "Login")]}
+    )
+    responses["autotests"] = json.dumps(
+        {"ui": [], "api": [{"name": "login_sms", "steps": ["post login code"], "assertions": [], "target": "api"}]}
+    )
+    from app.orchestrator import runner as runner_module
+
+    diff_threads = []
+    change_set = runner_module.ChangeSet
+
+    def spy_change_set(*args):
+        diff_threads.append(threading.current_thread() is threading.main_thread())
+        return change_set(*args)
+
+    monkeypatch.setattr(runner_module, "ChangeSet", spy_change_set)
+    record = await runner.run(
+        "next", RunInput(requirements="Cart keeps items.\n\nLogin by password or SMS code.", base_run_id="base")
+    )
+
+    assert "Cart" in prompts["analyst"]
+    assert "Add item to cart" not in prompts["manual"]
+    manual = json.loads((artifacts.runs_root() / "next" / "manual.json").read_text())
+    assert [case["title"] for case in manual["cases"]] == ["Add item to cart", "Login by password", "Login by SMS code"]
+    autotests = json.loads((artifacts.runs_root() / "next" / "autotests.json").read_text())
+    assert [test["name"] for test in autotests["ui"]] == ["cart_add_item"]
+    assert [test["name"] for test in autotests["api"]] == ["login_sms"]
+    changes = json.loads((artifacts.runs_root() / "next" / "changes.json").read_text())
+    assert changes["areas"] == {"affected": ["Login"], "unchanged": ["Cart"], "removed": []}
+    assert changes["manual"] == {"carried": 1, "regenerated": 2}
+    assert record.steps["manual"].summary == "1 carried over, 2 regenerated"
+    # built once, in a worker thread, and shared by the manual and autotests steps
+    assert diff_threads == [False]
@@ -0,0 +1,172 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.orchestrator.queue import JobQueue, QueueFull, WorkerPool
+
+
+def test_claims_follow_priority_lanes(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3")
+    queue.enqueue("low", {}, lane="low")
+    queue.enqueue("normal", {})
+    queue.enqueue("high", {}, lane="high")
+    claimed = [queue.claim("w").run_id for _ in range(3)]
+    assert claimed == ["high", "normal", "low"]
+    assert queue.claim("w") is None
+
+
+def test_waiting_jobs_age_into_higher_lanes(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3", aging_seconds=0.05)
+    queue.enqueue("old-low", {}, lane="low")
+    time.sleep(0.2)
+    queue.enqueue("fresh-high", {}, lane="high")
+    assert queue.claim("w").run_id == "old-low"
+
+
+def test_full_queue_rejects_with_estimated_wait(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3", max_depth=2, workers=2)
+    queue.enqueue("a", {})
+    queue.enqueue("b", {})
+    with pytest.raises(QueueFull) as exc:
+        queue.enqueue("c", {})
+    assert exc.value.depth == 2
+    assert exc.value.retry_after == 90  # (2 waiting + 1) * 60s default / 2 workers
+
+
+def test_expired_lease_is_recovered_by_another_process(tmp_path):
+    path = tmp_path / "queue.sqlite3"
+    first = JobQueue(path, lease_seconds=0.05, max_attempts=2)
+    second = JobQueue(path, lease_seconds=0.05, max_attempts=2)
+    first.enqueue("run", {"input": {}})
+    job = first.claim("dead-worker")
+    assert second.claim("other") is None
+    time.sleep(0.1)
+    recovered = second.claim("other")
+    assert recovered.id == job.id and recovered.recovered
+    assert first.heartbeat(job.id, "dead-worker") == "lost"
+    time.sleep(0.1)
+    # out of attempts: the job is failed instead of being handed out forever
+    assert first.claim("third") is None
+    assert first.stats() == {("normal", "failed"): 1}
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_stops_job_whose_lease_was_lost(tmp_path):
+    from contextlib import closing
+
+    queue = JobQueue(tmp_path / "queue.sqlite3", lease_seconds=0.15)
+    started = asyncio.Event()
+    stopped = []
+
+    async def handler(job):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            stopped.append(job.run_id)
+            raise
+
+    pool = WorkerPool(queue, handler, workers=1, poll_interval=0.01)
+    pool.start()
+    job = queue.enqueue("stolen", {})
+    await asyncio.wait_for(started.wait(), 5)
+    # another process reclaimed the lease, e.g. after this one stalled past its expiry
+    with closing(queue._connect()) as conn:
+        conn.execute("UPDATE jobs SET lease_owner = 'other' WHERE id = ?", (job.id,))
+    for _ in range(500):
+        if stopped:
+            break
+        await asyncio.sleep(0.01)
+    assert stopped == ["stolen"]
+    await asyncio.sleep(0.05)
+    await pool.stop()
+    # the new owner's attempt is left alone
+    assert queue.active("stolen")
+    assert queue.stats() == {("normal", "running"): 1}
+
+
+def test_enqueue_purges_finished_jobs_past_retention(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3", retention=0.05)
+    queue.enqueue("cancelled", {})
+    queue.cancel("cancelled")
+    queue.enqueue("done", {})
+    queue.complete(queue.claim("w").id, "w")
+    time.sleep(0.1)
+    queue.enqueue("fresh", {})
+    assert queue.stats() == {("normal", "queued"): 1}
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_jobs_with_bounded_concurrency(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3")
+    running, peak, done = set(), [], []
+
+    async def handler(job):
+        running.add(job.run_id)
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.discard(job.run_id)
+        if job.run_id == "bad":
+            raise RuntimeError("boom")
+        done.append(job.run_id)
+
+    pool = WorkerPool(queue, handler, workers=2, poll_interval=0.01)
+    pool.start()
+    for run_id in ["a", "b", "c", "bad"]:
+        queue.enqueue(run_id, {})
+    for _ in range(200):
+        if queue.stats().get(("normal", "done"), 0) == 3 and queue.stats().get(("normal", "failed")) == 1:
+            break
+        await asyncio.sleep(0.01)
+    await pool.stop()
+    assert sorted(done) == ["a", "b", "c"]
+    assert max(peak) == 2
+    assert not queue.active("a")
+
+
+def test_cancel_flags_running_and_drops_queued_jobs(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3")
+    queue.enqueue("run", {})
+    job = queue.claim("w")
+    queue.enqueue("run", {})
+    assert queue.cancel("run") == {"queued": 1, "running": 1}
+    assert queue.heartbeat(job.id, "w") == "cancelled"
+    assert queue.claim("w") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("threaded", [False, True])
+async def test_worker_pool_cancels_running_job_immediately(tmp_path, threaded):
+    queue = JobQueue(tmp_path / "queue.sqlite3")
+    started = asyncio.Event()
+    stopped = []
+
+    async def handler(job):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            stopped.append(job.run_id)
+            raise
+
+    pool = WorkerPool(queue, handler, workers=1, poll_interval=0.01)
+    pool.start()
+    queue.enqueue("long", {})
+    await asyncio.wait_for(started.wait(), 5)
+    if threaded:
+        await asyncio.to_thread(queue.cancel, "long")
+    else:
+        queue.cancel("long")
+    for _ in range(100):
+        if queue.stats().get(("normal", "cancelled")):
+            break
+        await asyncio.sleep(0.01)
+    await pool.stop()
+    assert stopped == ["long"]
+    assert queue.stats() == {("normal", "cancelled"): 1}
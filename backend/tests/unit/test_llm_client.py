@@ -59,3 +59,295 @@ async def test_missing_api_key(monkeypatch):
     client = CloudRuLLMClient()
     with pytest.raises(LLMServiceError):
         await client.list_models()
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_cache(monkeypatch, tmp_path):
+    from app.llm import cache as llm_cache
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "1")
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    llm_cache.get_settings.cache_clear()
+    calls = []
+
+    class FakeChat:
+        async def create(self, **kwargs):
+            calls.append(kwargs)
+            return type("Y", (), {"choices": [type("C", (), {"message": type("M", (), {"content": "cached"})()})()]})()
+
+    client = CloudRuLLMClient()
+    monkeypatch.setattr(client, "client", type("X", (), {"chat": type("Z", (), {"completions": FakeChat()})()})())
+    messages = [{"role": "user", "content": "hi"}]
+    assert await client.chat_completion(messages, max_tokens=10) == "cached"
+    assert await client.chat_completion(messages, max_tokens=10) == "cached"
+    assert len(calls) == 1
+    assert client.cache.stats()["hits"] == 1
+
+    await client.chat_completion(messages, max_tokens=20)
+    await client.chat_completion(messages, max_tokens=10, use_cache=False)
+    assert len(calls) == 3
+    llm_cache.get_settings.cache_clear()
+
+
+def test_response_cache_evicts_on_running_size(monkeypatch, tmp_path):
+    from app.llm.cache import ResponseCache
+
+    scans = []
+    glob = Path.glob
+    monkeypatch.setattr(Path, "glob", lambda self, pattern: scans.append(pattern) or glob(self, pattern))
+    entry = len('{"content": "xxxxxxxxxx"}')
+    cache = ResponseCache(tmp_path, max_bytes=entry * 3, max_age=0)
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put(key, "x" * 10)
+    assert cache.get("aa1") == "x" * 10
+    cache.put("dd4", "x" * 10)
+    # bb2 was the least recently read entry
+    assert cache.get("bb2") is None
+    assert [cache.get(key) for key in ("aa1", "cc3", "dd4")] == ["x" * 10] * 3
+    cache.put("dd4", "x" * 10)
+    assert cache.stats()["evictions"] == 1
+    assert len(scans) == 1
+
+
+@pytest.mark.asyncio
+async def test_registry_shares_pooled_client():
+    from app.llm.pool import LLMClientRegistry
+
+    registry = LLMClientRegistry()
+    first = registry.get()
+    assert registry.get() is first
+    assert first.http_client is not None
+    await registry.aclose()
+    assert registry.get() is not first
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_retries_rate_limit(monkeypatch):
+    import httpx
+    from openai import RateLimitError
+
+    attempts = []
+
+    class FakeChat:
+        async def create(self, **kwargs):
+            attempts.append(kwargs)
+            if len(attempts) == 1:
+                response = httpx.Response(
+                    429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://llm.test")
+                )
+                raise RateLimitError("slow down", response=response, body=None)
+            return type("Y", (), {"choices": [type("C", (), {"message": type("M", (), {"content": "ok"})()})()]})()
+
+    client = CloudRuLLMClient()
+    monkeypatch.setattr(client.settings, "llm_retry_backoff", 0.0)
+    monkeypatch.setattr(client, "client", type("X", (), {"chat": type("Z", (), {"completions": FakeChat()})()})())
+    assert await client.chat_completion([{"role": "user", "content": "hi"}], model="retry-model") == "ok"
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_a_minimum_wait(monkeypatch):
+    import httpx
+    from openai import RateLimitError
+
+    from app.llm import client as client_module
+
+    attempts = []
+    sleeps = []
+
+    class FakeChat:
+        async def create(self, **kwargs):
+            attempts.append(kwargs)
+            request = httpx.Request("POST", "https://llm.test")
+            response = httpx.Response(429, headers={"retry-after": wait}, request=request)
+            raise RateLimitError("slow down", response=response, body=None)
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    client = CloudRuLLMClient()
+    monkeypatch.setattr(client_module.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(client.settings, "llm_retry_backoff", 0.5)
+    monkeypatch.setattr(client.settings, "llm_retry_backoff_max", 30.0)
+    monkeypatch.setattr(client.settings, "retries", 1)
+    monkeypatch.setattr(client, "client", type("X", (), {"chat": type("Z", (), {"completions": FakeChat()})()})())
+
+    wait = "20"
+    with pytest.raises(LLMServiceError):
+        await client.chat_completion([{"role": "user", "content": "wait"}], model="retry-after-model", use_cache=False)
+    assert len(attempts) == 2
+    assert len(sleeps) == 1 and 20 <= sleeps[0] <= 20.5
+
+    # longer than the cap: fail now instead of retrying early into another 429
+    attempts.clear()
+    sleeps.clear()
+    wait = "60"
+    with pytest.raises(LLMServiceError):
+        await client.chat_completion([{"role": "user", "content": "later"}], model="retry-after-model", use_cache=False)
+    assert len(attempts) == 1
+    assert sleeps == []
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_backs_off_on_throttle():
+    from app.llm.limits import AdaptiveLimiter
+
+    limiter = AdaptiveLimiter(initial=8, minimum=1, maximum=16, latency_target=1.0)
+    await limiter.acquire()
+    await limiter.release(0.1, "throttled")
+    assert limiter.limit == 4
+    await limiter.acquire()
+    await limiter.release(0.1, "ok")
+    assert limiter.limit == 4.25
+    await limiter.acquire()
+    await limiter.release(5.0, "ok")
+    assert limiter.limit < 4.25
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_requests_are_coalesced(monkeypatch):
+    import asyncio
+
+    calls = []
+    release = asyncio.Event()
+
+    class FakeChat:
+        async def create(self, **kwargs):
+            calls.append(kwargs)
+            await release.wait()
+            return type("Y", (), {"choices": [type("C", (), {"message": type("M", (), {"content": "shared"})()})()]})()
+
+    client = CloudRuLLMClient()
+    monkeypatch.setattr(client, "client", type("X", (), {"chat": type("Z", (), {"completions": FakeChat()})()})())
+    messages = [{"role": "user", "content": "same"}]
+    pending = [asyncio.ensure_future(client.chat_completion(messages, model="m")) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*pending) == ["shared"] * 3
+    assert len(calls) == 1
+    assert client.stats()["coalesced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_records_usage(monkeypatch):
+    from app.llm.metrics import track_run_usage
+    from app.utils.metrics import registry
+
+    class FakeChat:
+        async def create(self, **kwargs):
+            usage = type("U", (), {"prompt_tokens": 12, "completion_tokens": 5})()
+            message = type("M", (), {"content": "hello"})()
+            return type("Y", (), {"choices": [type("C", (), {"message": message})()], "usage": usage})()
+
+    client = CloudRuLLMClient()
+    monkeypatch.setattr(client, "client", type("X", (), {"chat": type("Z", (), {"completions": FakeChat()})()})())
+    usage = {}
+    with track_run_usage(usage):
+        await client.chat_completion([{"role": "user", "content": "usage"}], model="metrics-model", agent="analyst")
+    assert usage["analyst"].calls == 1
+    assert usage["analyst"].prompt_tokens == 12
+    assert usage["analyst"].completion_tokens == 5
+    rendered = registry.render()
+    assert 'llm_prompt_tokens_total{model="metrics-model",agent="analyst"} 12' in rendered
+    assert 'llm_call_latency_seconds_count{model="metrics-model",agent="analyst"} 1' in rendered
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_transport(tmp_path):
+    import json
+
+    import httpx
+
+    from app.llm.transport import RecordingTransport, ReplayTransport, StubTransport
+
+    cassette = tmp_path / "llm.jsonl"
+    payload = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    async with httpx.AsyncClient(transport=RecordingTransport(StubTransport(content="recorded"), cassette)) as http:
+        recorded = await http.post("https://llm.test/v1/chat/completions", json=payload)
+    async with httpx.AsyncClient(transport=ReplayTransport(cassette)) as http:
+        replayed = await http.post("https://llm.test/v1/chat/completions", json=payload)
+        missing = await http.post("https://llm.test/v1/chat/completions", json={**payload, "model": "other"})
+    assert replayed.json()["choices"][0]["message"]["content"] == "recorded"
+    assert replayed.json() == recorded.json()
+    assert missing.status_code == 404
+    assert len(cassette.read_text().splitlines()) == 1
+    assert json.loads(cassette.read_text())["status"] == 200
+
+
+@pytest.mark.asyncio
+async def test_stub_transport_serves_offline_client(monkeypatch):
+    import httpx
+
+    from app.llm.transport import StubTransport
+
+    monkeypatch.delenv("CLOUDRU_API_KEY", raising=False)
+    client = CloudRuLLMClient(http_client=httpx.AsyncClient(transport=StubTransport(latency=0.01, jitter=0.01, seed=1)))
+    monkeypatch.setattr(client.settings, "llm_transport", "stub")
+    monkeypatch.setattr(client.settings, "cloudru_api_key", "")
+    content = await client.chat_completion([{"role": "user", "content": "stub"}], model="stub-model")
+    assert '"cases"' in content and '"valid": true' in content
+    stream = client.chat_completion_stream([{"role": "user", "content": "streamed"}], model="stub-model")
+    assert "".join([chunk async for chunk in stream]) == content
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_streamed_call_holds_limiter_slot_until_consumed(monkeypatch):
+    import httpx
+
+    from app.llm.limits import limiter_for
+    from app.llm.transport import StubTransport
+
+    monkeypatch.delenv("CLOUDRU_API_KEY", raising=False)
+    client = CloudRuLLMClient(http_client=httpx.AsyncClient(transport=StubTransport(seed=1)))
+    monkeypatch.setattr(client.settings, "llm_transport", "stub")
+    monkeypatch.setattr(client.settings, "cloudru_api_key", "")
+    monkeypatch.setattr(client, "cache", None)
+    limiter = limiter_for("held-stream-model").concurrency
+
+    stream = client.chat_completion_stream([{"role": "user", "content": "held"}], model="held-stream-model")
+    await stream.__anext__()
+    assert limiter.inflight == 1
+    async for _ in stream:
+        pass
+    assert limiter.inflight == 0
+
+    # a consumer that stops early still gives the slot back
+    stream = client.chat_completion_stream([{"role": "user", "content": "dropped"}], model="held-stream-model")
+    await stream.__anext__()
+    assert limiter.inflight == 1
+    await stream.aclose()
+    assert limiter.inflight == 0
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_streamed_call_records_usage(monkeypatch):
+    import httpx
+
+    from app.llm import pool
+    from app.llm.metrics import track_run_usage
+    from app.llm.transport import StubTransport
+    from app.utils.metrics import registry
+
+    monkeypatch.delenv("CLOUDRU_API_KEY", raising=False)
+    client = CloudRuLLMClient(http_client=httpx.AsyncClient(transport=StubTransport(seed=1)))
+    monkeypatch.setattr(client.settings, "llm_transport", "stub")
+    monkeypatch.setattr(client.settings, "cloudru_api_key", "")
+    monkeypatch.setattr(client, "cache", None)
+    usage = {}
+    with track_run_usage(usage):
+        messages = [{"role": "user", "content": "count me"}]
+        stream = client.chat_completion_stream(messages, model="stream-usage-model", agent="manual")
+        content = "".join([chunk async for chunk in stream])
+    assert usage["manual"].completion_tokens == len(content) // 4 > 0
+    assert usage["manual"].prompt_tokens > 0
+    await client.aclose()
+
+    monkeypatch.setattr(pool.registry, "stats", lambda: {"coalesced": 3, "cache_hits": 2, "inflight": 1})
+    rendered = registry.render()
+    assert "# TYPE llm_client_events_total counter" in rendered
+    assert 'llm_client_events_total{stat="coalesced"} 3' in rendered
+    assert "# TYPE llm_client_inflight gauge" in rendered
+    assert "llm_client_inflight 1" in rendered
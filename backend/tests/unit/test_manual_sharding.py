@@ -0,0 +1,73 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+from app.agents.manual import ManualTestsAgent, merge_manual_bundles, partition_plan
+from app.llm import client as llm_client
+from app.schemas.pipeline import AnalystPlan, ManualBundle, ManualTestCase
+
+
+def _case(title):
+    return ManualTestCase(
+        title=title, severity="NORMAL", owner="qa", priority="P2", feature="f", story="s", suite="manual", tags=[], steps=["Act"], expected=["Ok"]
+    )
+
+
+def test_partition_plan_by_area_and_feature():
+    plan = AnalystPlan(
+        features=["VM lifecycle", "Disk management"],
+        coverage_matrix={"VM create": ["a"], "VM delete": ["b"], "Disk attach": ["c"], "Billing": ["d"]},
+    )
+    by_area = partition_plan(plan)
+    assert list(by_area) == ["VM create", "VM delete", "Disk attach", "Billing"]
+    assert by_area["Billing"].coverage_matrix == {"Billing": ["d"]}
+    assert by_area["Billing"].features == plan.features
+
+    by_feature = partition_plan(plan, by="feature")
+    assert list(by_feature) == ["VM lifecycle", "Disk management", "Billing"]
+    assert list(by_feature["VM lifecycle"].coverage_matrix) == ["VM create", "VM delete"]
+
+
+def test_merge_manual_bundles_keeps_order_and_dedupes_titles():
+    merged = merge_manual_bundles(
+        [
+            ManualBundle(cases=[_case("Create VM"), _case("Delete VM")]),
+            ManualBundle(cases=[_case("create  vm"), _case("Attach disk")]),
+        ]
+    )
+    assert [case.title for case in merged.cases] == ["Create VM", "Delete VM", "Attach disk"]
+
+
+@pytest.mark.asyncio
+async def test_generate_fans_out_per_area(monkeypatch):
+    areas = [f"area{idx:02d}" for idx in range(6)]
+    plan = AnalystPlan(features=["f"], coverage_matrix={area: [f"{area} case"] for area in areas})
+    active = {"now": 0, "peak": 0}
+
+    async def fake_chat_completion(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        area = next(area for area in areas if f"'{area}'" in prompt)
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        # later areas answer first, the merged order must still follow the plan
+        await asyncio.sleep(0.01 * (len(areas) - areas.index(area)))
+        active["now"] -= 1
+        cases = [_case(f"{area} check").dict(), _case("Shared smoke").dict()]
+        return json.dumps({"cases": cases})
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    from app.agents import manual
+
+    settings = manual.get_settings()
+    monkeypatch.setattr(settings, "manual_shard_min_areas", 5)
+    monkeypatch.setattr(settings, "manual_shard_concurrency", 3)
+    bundle = await ManualTestsAgent().generate(plan, use_cache=False)
+    assert [case.title for case in bundle.cases] == ["area00 check", "Shared smoke"] + [
+        f"{area} check" for area in areas[1:]
+    ]
+    assert active["peak"] == 3
@@ -5,7 +5,12 @@ import pytest
 
 ROOT = Path(__file__).resolve().parents[2]
 sys.path.append(str(ROOT))
-from app.generation.api_tests import parse_openapi_spec, generate_api_tests_from_spec
+from app.generation.api_tests import (
+    count_operations,
+    generate_api_tests_from_spec,
+    parse_openapi_spec,
+    partition_openapi_spec,
+)
 
 
 def test_parse_openapi_spec_reads_paths():
@@ -22,6 +27,19 @@ paths:
     assert "/vms" in spec["paths"]
 
 
+def test_parse_openapi_spec_cache_is_thread_safe(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.generation import api_tests
+
+    monkeypatch.setattr(api_tests, "SPEC_CACHE_SIZE", 4)
+    specs = [f'{{"paths": {{"/p{idx}": {{}}}}}}' for idx in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(parse_openapi_spec, specs * 50))
+    assert [next(iter(spec["paths"])) for spec in results[:16]] == [f"/p{idx}" for idx in range(16)]
+    assert len(api_tests._spec_cache) <= 4
+
+
 @pytest.mark.asyncio
 async def test_generate_api_tests_has_negative_case():
     content = """
@@ -38,3 +56,28 @@ paths:
     code = await generate_api_tests_from_spec(content)
     assert "negative" in code
     assert "401" in code
+
+
+def test_partition_openapi_spec_by_tag_with_referenced_components():
+    spec = {
+        "openapi": "3.0.0",
+        "paths": {
+            "/vms": {"get": {"tags": ["vms"], "responses": {"200": {"$ref": "#/components/responses/VmList"}}}},
+            "/vms/{id}": {"parameters": [{"name": "id"}], "delete": {"tags": ["vms"]}},
+            "/disks": {"get": {"responses": {}}, "post": {"responses": {}}},
+        },
+        "components": {
+            "responses": {"VmList": {"content": {"schema": {"$ref": "#/components/schemas/Vm"}}}},
+            "schemas": {"Vm": {"type": "object"}, "Disk": {"type": "object"}},
+        },
+    }
+    shards = partition_openapi_spec(spec, by="tag", max_operations=2)
+    assert list(shards) == ["disks", "vms"]
+    assert set(shards["disks"]["paths"]["/disks"]) == {"get", "post"}
+    vms = shards["vms"]
+    assert vms["paths"]["/vms/{id}"]["parameters"] == [{"name": "id"}]
+    assert vms["components"] == {
+        "responses": spec["components"]["responses"],
+        "schemas": {"Vm": {"type": "object"}},
+    }
+    assert sum(count_operations(shard) for shard in shards.values()) == count_operations(spec) == 4
@@ -0,0 +1,58 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+from app.agents.prompt import PromptPacker, compact_openapi, count_tokens
+
+SPEC = """
+openapi: 3.0.0
+info:
+  title: Compute
+  description: Very long marketing description of the API.
+paths:
+  /vms:
+    get:
+      description: Lists virtual machines.
+      responses:
+        '200':
+          description: ok
+          content:
+            application/json:
+              schema:
+                $ref: '#/components/schemas/VmCopy'
+components:
+  schemas:
+    Vm:
+      type: object
+      properties:
+        description:
+          type: string
+          example: my vm
+    VmCopy:
+      type: object
+      properties:
+        description:
+          type: string
+          example: my vm
+"""
+
+
+def test_compact_openapi_strips_noise_and_dedupes_schemas():
+    compact = json.loads(compact_openapi(SPEC))
+    assert "description" not in compact["info"]
+    assert "description" not in compact["paths"]["/vms"]["get"]
+    assert compact["components"]["schemas"] == {"Vm": {"type": "object", "properties": {"description": {"type": "string"}}}}
+    schema = compact["paths"]["/vms"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema == {"$ref": "#/components/schemas/Vm"}
+
+
+def test_packer_enforces_budget_on_optional_sections():
+    packer = PromptPacker("test", budget=50)
+    packer.add("rules", "Keep this intact.", required=True)
+    packer.add("spec", "word " * 400)
+    sections = packer.pack()
+    assert sections["rules"] == "Keep this intact."
+    assert "[truncated" in sections["spec"]
+    assert count_tokens(sections["rules"]) + count_tokens(sections["spec"]) <= 50
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.schemas.pipeline import RunInput, RunRecord, StepResult, StepStatus
+from app.storage import artifacts
+from app.storage.archive import BatchArchive, RunArchive, archives_root
+from app.storage.retention import GRACE_SECONDS, RetentionPolicy, collect_garbage
+from app.storage.run_index import get_run_index
+
+DAY = 86400
+
+
+@pytest.fixture(autouse=True)
+def data_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    artifacts.get_settings.cache_clear()
+    yield tmp_path
+    artifacts.get_settings.cache_clear()
+
+
+def _age(path: Path, seconds: float) -> None:
+    stamp = time.time() - seconds
+    for item in [path, *path.rglob("*")] if path.is_dir() else [path]:
+        os.utime(item, (stamp, stamp))
+
+
+def _finished_run(run_id, days_old, body="shared\n" * 100, status=StepStatus.success):
+    stamp = datetime.utcfromtimestamp(time.time() - days_old * DAY).isoformat() + "Z"
+    base = artifacts.create_run_folder(run_id)
+    record = RunRecord(
+        id=run_id,
+        input=RunInput(requirements=run_id),
+        steps={"manual": StepResult(status=status)},
+        created_at=stamp,
+        updated_at=stamp,
+    )
+    (base / "run.json").write_text(record.json())
+    (base / "manual.py").write_text(body)
+    (base / "unique.txt").write_text(run_id * 50)
+    artifacts.seal_run(base)
+    get_run_index().record(record)
+    _age(artifacts.blobs_root(), GRACE_SECONDS * 2)
+    return base
+
+
+def test_max_age_keeps_newest_runs_and_shared_blobs():
+    old = _finished_run("old", days_old=10)
+    older = _finished_run("older", days_old=20)
+    recent = _finished_run("recent", days_old=1)
+    running = _finished_run("running", days_old=30, status=StepStatus.running)
+
+    report = collect_garbage(RetentionPolicy(max_age_seconds=5 * DAY, keep_last=1))
+    assert report["runs"] == 2
+    assert not old.exists() and not older.exists()
+    assert recent.exists() and running.exists()
+    # the two unique.txt blobs go, manual.py is still linked from the kept runs
+    assert report["blobs"] == 2
+    assert report["reclaimed_bytes"] > 0
+    assert artifacts.read_artifact(recent, "manual.py") == ("shared\n" * 100).encode()
+    assert {run["id"] for run in get_run_index().query()["runs"]} == {"recent", "running"}
+
+
+def test_keep_last_and_active_runs_are_protected():
+    first = _finished_run("first", days_old=10)
+    second = _finished_run("second", days_old=9)
+    report = collect_garbage(RetentionPolicy(max_age_seconds=DAY, keep_last=1), is_active=lambda run_id: run_id == "first")
+    assert report["runs"] == 0
+    assert first.exists() and second.exists()
+
+
+def test_max_bytes_deletes_oldest_first():
+    oldest = _finished_run("oldest", days_old=3, body="a" * 20000)
+    middle = _finished_run("middle", days_old=2, body="b" * 20000)
+    newest = _finished_run("newest", days_old=1, body="c" * 20000)
+    usage = collect_garbage(RetentionPolicy())["total_bytes"]
+    per_run = usage // 3
+
+    report = collect_garbage(RetentionPolicy(max_bytes=usage - per_run // 2))
+    assert report["runs"] == 1
+    assert not oldest.exists()
+    assert middle.exists() and newest.exists()
+    assert report["total_bytes"] <= usage - per_run // 2
+
+
+def test_orphan_blobs_and_stale_archives_are_swept():
+    kept = _finished_run("kept", days_old=1)
+    store = artifacts.get_blob_store()
+    orphan = kept / "orphan.bin"
+    orphan.write_bytes(b"orphan" * 100)
+    orphan_digest = artifacts.file_digest(orphan)
+    store.put_file(orphan, orphan_digest)
+    orphan.unlink()
+    _age(store.path(orphan_digest), GRACE_SECONDS * 2)
+    # a blob stored moments ago may be about to be linked by a seal in flight
+    fresh = artifacts.create_run_folder("fresh-blob") / "young.bin"
+    fresh.write_bytes(b"young" * 100)
+    store.put_file(fresh, artifacts.file_digest(fresh))
+
+    b"".join(RunArchive("kept", kept).stream(cache=True))
+    gone = archives_root() / f"deleted-{'0' * 32}.zip"
+    gone.write_bytes(b"zip")
+    legacy = artifacts.runs_root() / "kept.zip"
+    legacy.write_bytes(b"zip")
+    (artifacts.batches_root() / "batch1").mkdir()
+    (artifacts.batches_root() / "batch1" / "batch.json").write_text("{}")
+    batch = BatchArchive("batch1", ["kept"])
+    b"".join(batch.stream(cache=True))
+    legacy_batch = artifacts.batches_root() / "batch1.zip"
+    legacy_batch.write_bytes(b"zip")
+    for path in (gone, legacy, legacy_batch, batch.cache_path, *archives_root().glob("kept-*.zip")):
+        _age(path, GRACE_SECONDS * 2)
+
+    report = collect_garbage(RetentionPolicy())
+    assert report["runs"] == 0
+    assert report["blobs"] == 1
+    assert report["archives"] == 3
+    assert not gone.exists() and not legacy.exists() and not legacy_batch.exists()
+    assert RunArchive("kept", kept).cached() is not None
+    assert BatchArchive("batch1", ["kept"]).cached() is not None
+    assert not store.exists(orphan_digest)
+    assert store.exists(artifacts.file_digest(fresh))
@@ -0,0 +1,72 @@
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.storage import artifacts
+from app.storage.archive import RunArchive, archives_root
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    artifacts.get_settings.cache_clear()
+    base = tmp_path / "runs" / "arch"
+    base.mkdir(parents=True)
+    (base / "run.json").write_text('{"id": "arch"}')
+    (base / "manual.json").write_text('{"cases": []}' + " " * 4096)
+    (base / "report.png").write_bytes(b"\x89PNG" + b"\x00" * 2048)
+    (base / ".manual.json.abcd1234.tmp").write_text("partial")
+    yield base
+    artifacts.get_settings.cache_clear()
+
+
+def test_stream_builds_valid_zip_with_per_file_compression(run_dir):
+    archive = RunArchive("arch", run_dir)
+    data = b"".join(archive.stream())
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        infos = {info.filename: info for info in zf.infolist()}
+        assert sorted(infos) == ["manual.json", "report.png", "run.json"]
+        assert infos["manual.json"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["report.png"].compress_type == zipfile.ZIP_STORED
+        assert infos["run.json"].compress_type == zipfile.ZIP_STORED
+        assert zf.read("manual.json") == (run_dir / "manual.json").read_bytes()
+
+
+def test_etag_follows_content(run_dir):
+    first = RunArchive("arch", run_dir).etag
+    assert RunArchive("arch", run_dir).etag == first
+    (run_dir / "run.json").write_text('{"id": "arch", "updated": true}')
+    assert RunArchive("arch", run_dir).etag != first
+
+
+def test_cached_archive_replaces_older_states(run_dir):
+    other = archives_root() / f"arch-001-{'0' * 32}.zip"
+    other.write_bytes(b"other run")
+    first = RunArchive("arch", run_dir)
+    assert first.cached() is None
+    streamed = b"".join(first.stream(cache=True))
+    assert first.cached().read_bytes() == streamed
+
+    (run_dir / "run.json").write_text('{"id": "arch", "updated": true}')
+    second = RunArchive("arch", run_dir)
+    b"".join(second.stream(cache=True))
+    assert second.cached() is not None
+    assert not first.cache_path.exists()
+    assert other.exists()
+    assert not list(archives_root().glob("*.tmp"))
+
+
+def test_abandoned_stream_leaves_no_cache(run_dir):
+    archive = RunArchive("arch", run_dir)
+    chunks = archive.stream(cache=True)
+    next(chunks)
+    chunks.close()
+    assert archive.cached() is None
+    assert not list(archives_root().glob("*.tmp"))
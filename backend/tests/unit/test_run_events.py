@@ -0,0 +1,80 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.llm import client as llm_client
+from app.orchestrator.runner import PipelineRunner
+from app.schemas.pipeline import LLMUsage, RunInput, RunRecord, StepArtifact, StepResult, StepStatus
+from app.storage import artifacts
+from app.storage.events import EVENTS_FILE, EventLog, encode_snapshot, load_record
+
+
+def _record():
+    return RunRecord(
+        id="r1",
+        input=RunInput(requirements="req"),
+        steps={"analyst": StepResult(), "manual": StepResult()},
+        created_at="2026-01-01T00:00:00Z",
+        updated_at="2026-01-01T00:00:00Z",
+    )
+
+
+def test_event_log_emits_only_changes_and_rebuilds(tmp_path):
+    record = _record()
+    log = EventLog(record)
+    (tmp_path / "run.json").write_text(encode_snapshot(record.dict()))
+    assert log.diff(record, "t0") == []
+
+    record.steps["analyst"].status = StepStatus.running
+    started = log.diff(record, "t1")
+    assert [(event["type"], event["seq"]) for event in started] == [("step.running", 1)]
+    assert started[0]["changes"] == {"status": "running"}
+
+    record.steps["analyst"].status = StepStatus.success
+    record.steps["analyst"].data = {"features": ["f"]}
+    record.steps["analyst"].artifacts.append(StepArtifact(name="analyst.json", path="/tmp/analyst.json"))
+    record.usage["analyst"] = LLMUsage(calls=1)
+    finished = log.diff(record, "t2")
+    assert [event["type"] for event in finished] == ["artifact.added", "step.success", "usage"]
+    assert record.event_seq == 4
+
+    lines = [json.dumps(event) for event in started + finished]
+    (tmp_path / EVENTS_FILE).write_text("\n".join(lines) + '\n{"seq": 5, "type": "step.ru')
+    rebuilt = load_record(tmp_path)
+    assert rebuilt.dict() == {**record.dict(), "updated_at": "t2"}
+
+
+@pytest.mark.asyncio
+async def test_runner_appends_events_and_writes_compact_snapshot(monkeypatch, tmp_path):
+    responses = {
+        "analyst": '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        "manual": '{"cases":[]}',
+        "autotests": '{"ui":[],"api":[]}',
+        "standards": '{"issues":[],"valid":true}',
+        "optimize": '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
+    }
+
+    async def fake_chat_completion(*args, agent=None, **kwargs):
+        return responses[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    record = await PipelineRunner().run("events", RunInput(requirements="req"))
+    base = artifacts.runs_root() / "events"
+    events = [json.loads(line) for line in (base / EVENTS_FILE).read_text().splitlines()]
+    assert [event["seq"] for event in events] == list(range(1, len(events) + 1))
+    manual = [event["type"] for event in events if event.get("step") == "manual"]
+    assert manual == ["step.running", "artifact.added", "step.success"]
+    snapshot = (base / "run.json").read_text()
+    assert "\n" not in snapshot
+    assert json.loads(snapshot)["event_seq"] == events[-1]["seq"] == record.event_seq
+    assert load_record(base) == record
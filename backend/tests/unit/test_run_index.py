@@ -0,0 +1,86 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.schemas.pipeline import RunInput, RunRecord, StepResult, StepStatus
+from app.storage.run_index import RunIndex, run_status
+
+
+def _record(run_id, created_at, model="m1", **steps):
+    return RunRecord(
+        id=run_id,
+        input=RunInput(requirements="req", model=model),
+        steps={name: StepResult(status=status) for name, status in steps.items()},
+        created_at=created_at,
+        updated_at=created_at,
+    )
+
+
+def test_run_status_from_steps():
+    assert run_status(_record("a", "t", analyst=StepStatus.queued)) == "queued"
+    assert run_status(_record("a", "t", analyst=StepStatus.success, manual=StepStatus.running)) == "running"
+    assert run_status(_record("a", "t", analyst=StepStatus.success, manual=StepStatus.success)) == "completed"
+    assert run_status(_record("a", "t", analyst=StepStatus.timed_out, manual=StepStatus.skipped)) == "failed"
+    assert run_status(_record("a", "t", analyst=StepStatus.success, manual=StepStatus.cancelled)) == "cancelled"
+
+
+def test_query_filters_and_cursor_pagination(tmp_path):
+    index = RunIndex(tmp_path / "runs.sqlite3")
+    for idx in range(5):
+        status = StepStatus.success if idx % 2 else StepStatus.failed
+        index.record(_record(f"run{idx}", f"2026-01-0{idx + 1}T00:00:00Z", model="m1" if idx < 4 else "m2", analyst=status))
+    index.register("queued1", RunInput(model="m1"), "2026-01-09T00:00:00Z")
+
+    seen = []
+    cursor = None
+    while True:
+        page = index.query(limit=2, cursor=cursor)
+        seen.extend(run["id"] for run in page["runs"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["queued1", "run4", "run3", "run2", "run1", "run0"]
+
+    assert [run["id"] for run in index.query(status=["completed"])["runs"]] == ["run3", "run1"]
+    assert [run["id"] for run in index.query(model="m2")["runs"]] == ["run4"]
+    window = index.query(created_after="2026-01-02", created_before="2026-01-04")
+    assert [run["id"] for run in window["runs"]] == ["run2", "run1"]
+    assert window["runs"][0]["steps"] == {"analyst": "failed"}
+
+    # resuming keeps the original position, cancelling only touches runs that never started
+    index.record(_record("run0", "2026-02-01T00:00:00Z", analyst=StepStatus.success))
+    index.mark_cancelled(["queued1", "run0"])
+    runs = {run["id"]: run for run in index.query()["runs"]}
+    assert runs["run0"]["created_at"] == "2026-01-01T00:00:00Z" and runs["run0"]["status"] == "completed"
+    assert runs["queued1"]["status"] == "cancelled"
+
+
+def test_index_backfills_existing_runs(tmp_path):
+    runs_root = tmp_path / "runs"
+    (runs_root / "done").mkdir(parents=True)
+    (runs_root / "done" / "run.json").write_text(
+        _record("done", "2026-01-01T00:00:00Z", analyst=StepStatus.success).json()
+    )
+    (runs_root / "waiting").mkdir()
+    (runs_root / "waiting" / "input.json").write_text(json.dumps({"requirements": "x"}))
+    (runs_root / "broken").mkdir()
+    (runs_root / "broken" / "run.json").write_text("{")
+
+    index = RunIndex(tmp_path / "runs.sqlite3", runs_root=runs_root)
+    statuses = {run["id"]: run["status"] for run in index.query()["runs"]}
+    assert statuses == {"done": "completed", "waiting": "queued"}
+
+
+def test_connections_are_reused_per_thread(tmp_path):
+    import threading
+
+    index = RunIndex(tmp_path / "runs.sqlite3")
+    assert index._connect() is index._connect()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(index._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not index._connect()
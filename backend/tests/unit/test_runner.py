@@ -1,3 +1,4 @@
+import json
 import sys
 from pathlib import Path
 import pytest
@@ -8,6 +9,7 @@ sys.path.append(str(ROOT))
 from app.orchestrator.runner import PipelineRunner
 from app.schemas.pipeline import RunInput
 from app.llm import client as llm_client
+from app.storage import artifacts
 
 
 @pytest.mark.asyncio
@@ -15,7 +17,8 @@ async def test_pipeline_runner(monkeypatch, tmp_path):
     responses = [
         '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
         '{"cases":[{"title":"case1","severity":"CRITICAL","owner":"qa","priority":"P1","feature":"f","story":"s","suite":"manual","tags":["CRITICAL"],"steps":["Arrange"],"expected":["Assert"]}]}',
-        '{"ui":[{"name":"ui1","steps":["go"],"assertions":["ok"],"target":"ui","negative":false}],"api":[{"name":"api1","steps":["call"],"assertions":["status"],"target":"api","negative":true}]}',
+        '{"ui":[{"name":"ui1","steps":["go"],"assertions":["ok"],"target":"ui","negative":false}]}',
+        '{"api":[{"name":"api1","steps":["call"],"assertions":["status"],"target":"api","negative":true}]}',
         '{"issues":[],"valid":true}',
         '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
     ]
@@ -33,3 +36,334 @@ async def test_pipeline_runner(monkeypatch, tmp_path):
     record = await runner.run("test", RunInput(requirements="req"))
     assert record.id == "test"
     assert record.steps["analyst"].status.value == "success"
+    step_spans = {child["name"]: child for child in record.trace["children"]}
+    assert set(step_spans) == {f"step.{name}" for name in record.steps}
+    assert record.trace["end_ns"] is not None
+    publish = next(span for span in step_spans["step.manual"]["children"] if span["name"] == "publish")
+    assert {span["name"] for span in publish["children"]} >= {"write", "render"}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runner_streams_cases(monkeypatch, tmp_path):
+    responses = [
+        '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        '{"issues":[],"valid":true}',
+        '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
+    ]
+    streams = [
+        '{"cases":[{"title":"case1","severity":"CRITICAL","owner":"qa","priority":"P1","feature":"f","story":"s","suite":"manual","tags":[],"steps":["Arrange"],"expected":["Assert"]},'
+        '{"title":"case2","severity":"NORMAL","owner":"qa","priority":"P2","feature":"f","story":"s","suite":"manual","tags":[],"steps":["Act"],"expected":["Assert"]}]}',
+        '{"ui":[{"name":"ui1","steps":["go"],"assertions":["ok"],"target":"ui"}]}',
+        '{"api":[]}',
+    ]
+    seen = []
+
+    async def fake_chat_completion(*args, **kwargs):
+        return responses.pop(0)
+
+    async def fake_stream(*args, **kwargs):
+        text = streams.pop(0)
+        for idx in range(0, len(text), 7):
+            yield text[idx : idx + 7]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion_stream", fake_stream)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    runner = PipelineRunner()
+    original = runner.manual.generate
+
+    async def tracking_generate(*args, on_case=None, **kwargs):
+        async def wrapped(case):
+            seen.append(case.title)
+            await on_case(case)
+
+        return await original(*args, on_case=wrapped, **kwargs)
+
+    monkeypatch.setattr(runner.manual, "generate", tracking_generate)
+    record = await runner.run("stream", RunInput(requirements="req", stream=True))
+    assert seen == ["case1", "case2"]
+    assert record.steps["manual"].summary == "2 cases generated"
+    assert record.steps["autotests"].summary == "ui=1, api=0"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runner_skips_dependents_of_failed_step(monkeypatch, tmp_path):
+    responses = [
+        '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        '{"cases":[{"title":"case1","severity":"CRITICAL","owner":"qa","priority":"P1","feature":"f","story":"s","suite":"manual","tags":[],"steps":["Arrange"],"expected":["Assert"]}]}',
+    ]
+
+    async def fake_chat_completion(*args, **kwargs):
+        if not responses:
+            raise RuntimeError("upstream down")
+        return responses.pop(0)
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    runner = PipelineRunner()
+    with pytest.raises(Exception):
+        await runner.run("failing", RunInput(requirements="req"))
+
+    record = json.loads((artifacts.runs_root() / "failing" / "run.json").read_text())
+    assert record["steps"]["manual"]["status"] == "success"
+    assert record["steps"]["autotests"]["status"] == "failed"
+    assert record["steps"]["standards"]["status"] == "skipped"
+    assert record["steps"]["optimize"]["status"] == "skipped"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runner_resumes_from_checkpoints(monkeypatch, tmp_path):
+    responses = {
+        "analyst": '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        "manual": '{"cases":[{"title":"case1","severity":"CRITICAL","owner":"qa","priority":"P1","feature":"f","story":"s","suite":"manual","tags":[],"steps":["Arrange"],"expected":["Assert"]}]}',
+        "autotests": '{"ui":[],"api":[{"name":"api1","steps":["call"],"assertions":["status"],"target":"api"}]}',
+        "standards": '{"issues":[],"valid":true}',
+        "optimize": "not json",
+    }
+    calls = []
+
+    async def fake_chat_completion(*args, agent=None, **kwargs):
+        calls.append(agent)
+        return responses[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    runner = PipelineRunner()
+    with pytest.raises(Exception):
+        await runner.run("resume", RunInput(requirements="req"))
+    assert sorted(calls) == ["analyst", "autotests", "autotests", "manual", "optimize", "standards"]
+
+    calls.clear()
+    responses["optimize"] = '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":["merge"]}'
+    record = await runner.run("resume", RunInput(requirements="req"), resume=True)
+    assert calls == ["optimize"]
+    assert all(record.steps[name].restored for name in ("analyst", "manual", "autotests", "standards"))
+    assert record.steps["optimize"].status.value == "success"
+    assert record.steps["optimize"].data["suggestions"] == ["merge"]
+
+    # a tampered checkpoint is regenerated, and new output invalidates everything downstream of it
+    calls.clear()
+    (artifacts.runs_root() / "resume" / "manual.json").write_text('{"cases": []}')
+    responses["manual"] = responses["manual"].replace("case1", "case2")
+    await runner.run("resume", RunInput(requirements="req"), resume=True)
+    assert sorted(calls) == ["autotests", "autotests", "manual", "optimize", "standards"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runner_resume_keeps_successful_autotest_half(monkeypatch, tmp_path):
+    responses = {
+        "analyst": '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        "manual": '{"cases":[]}',
+        "ui": '{"ui":[{"name":"ui1","steps":["go"],"assertions":["ok"],"target":"ui"}]}',
+        "api": "not json",
+        "standards": '{"issues":[],"valid":true}',
+        "optimize": '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
+    }
+    calls = []
+
+    async def fake_chat_completion(self, messages, *args, agent=None, **kwargs):
+        if agent == "autotests":
+            agent = "ui" if "'ui'" in messages[0]["content"] else "api"
+        calls.append(agent)
+        return responses[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    runner = PipelineRunner()
+    with pytest.raises(Exception):
+        await runner.run("halves", RunInput(requirements="req"))
+    # the invalid api half is retried once on its own, the ui half is not repeated
+    assert calls.count("ui") == 1 and calls.count("api") == 2
+    assert (artifacts.runs_root() / "halves" / "autotests.ui.json").exists()
+
+    calls.clear()
+    responses["api"] = '{"api":[{"name":"api1","steps":["call"],"assertions":["status"],"target":"api"}]}'
+    record = await runner.run("halves", RunInput(requirements="req"), resume=True)
+    assert sorted(calls) == ["api", "optimize", "standards"]
+    assert record.steps["autotests"].status.value == "success"
+    autotests = json.loads((artifacts.runs_root() / "halves" / "autotests.json").read_text())
+    assert [test["name"] for test in autotests["ui"]] == ["ui1"]
+    assert [test["name"] for test in autotests["api"]] == ["api1"]
+    assert not (artifacts.runs_root() / "halves" / "autotests.ui.json").exists()
+
+
+def _manual_cases(count):
+    case = '{"title":"case%d","severity":"NORMAL","owner":"qa","priority":"P2","feature":"f","story":"s","suite":"manual","tags":[],"steps":["Act"],"expected":["Ok"]}'
+    return '{"cases":[' + ",".join(case % idx for idx in range(count)) + "]}"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("manual_count,outcome,autotest_calls", [(10, "kept", 2), (3, "regenerated", 4)])
+async def test_pipeline_runner_speculative_autotests(monkeypatch, tmp_path, manual_count, outcome, autotest_calls):
+    import asyncio
+
+    responses = {
+        "analyst": '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        "manual": _manual_cases(manual_count),
+        "autotests": '{"ui":[],"api":[{"name":"api1","steps":["call"],"assertions":["status"],"target":"api"}]}',
+        "standards": '{"issues":[],"valid":true}',
+        "optimize": '{"duplicates":[],"conflicts":[],"gaps":[],"suggestions":[]}',
+    }
+    events = []
+
+    async def fake_chat_completion(self, messages, *args, agent=None, **kwargs):
+        events.append(f"{agent}:start")
+        if agent == "manual":
+            await asyncio.sleep(0.05)
+        events.append(f"{agent}:end")
+        return responses[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    record = await PipelineRunner().run("speculative", RunInput(requirements="req", speculative=True))
+    # both autotest halves start while manual generation is still in flight
+    assert events.index("autotests:start") < events.index("manual:end")
+    assert events.count("autotests:start") == autotest_calls
+    assert record.steps["autotests"].data["speculation"] == {
+        "estimated_cases": 10,
+        "actual_cases": manual_count,
+        "outcome": outcome,
+    }
+    autotests = json.loads((artifacts.runs_root() / "speculative" / "autotests.json").read_text())
+    assert [test["name"] for test in autotests["api"]] == ["api1"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("failure", ["failed", "timed_out"])
+async def test_failed_manual_step_cancels_speculation(monkeypatch, tmp_path, failure):
+    import asyncio
+
+    from app.orchestrator.runner import RunContext
+
+    speculating = asyncio.Event()
+    cancelled = []
+    finished = []
+    pending_at_failure = []
+
+    async def fake_chat_completion(self, messages, *args, agent=None, **kwargs):
+        if agent == "analyst":
+            return '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}'
+        if agent == "manual":
+            await speculating.wait()
+            if failure == "failed":
+                raise RuntimeError("manual broke")
+            await asyncio.sleep(5)
+        speculating.set()
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(agent)
+            raise
+        finished.append(agent)
+
+    persist = RunContext.persist
+
+    def spy(ctx, *args, **kwargs):
+        if ctx.steps["manual"].status.value == failure:
+            pending_at_failure.append(ctx.speculation is not None)
+        return persist(ctx, *args, **kwargs)
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setattr(RunContext, "persist", spy)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    monkeypatch.setenv("STEP_TIMEOUTS", '{"manual": 0.2}')
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+    _clear_runner_settings()
+    try:
+        with pytest.raises(Exception):
+            await PipelineRunner().run(f"spec-{failure}", RunInput(requirements="req", speculative=True))
+    finally:
+        _clear_runner_settings()
+    await asyncio.sleep(0)
+    assert pending_at_failure and not any(pending_at_failure)
+    # the second half may still be preparing its prompt when manual gives up; either way nothing finishes
+    assert cancelled and set(cancelled) == {"autotests"}
+    assert finished == []
+
+
+def _clear_runner_settings():
+    from app.orchestrator import runner as runner_module
+
+    runner_module.get_settings.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runner_times_out_slow_step(monkeypatch, tmp_path):
+    import asyncio
+
+    from app.orchestrator.runner import StepTimeoutError
+
+    responses = {
+        "analyst": '{"features":["feat"],"flows":[],"entities":[],"constraints":[],"risks":[],"coverage_matrix":{},"gaps":[]}',
+        "manual": '{"cases":[]}',
+        "autotests": '{"ui":[],"api":[]}',
+        "standards": '{"issues":[],"valid":true}',
+    }
+
+    async def fake_chat_completion(*args, agent=None, **kwargs):
+        if agent == "optimize":
+            await asyncio.sleep(5)
+        return responses[agent]
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", fake_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    monkeypatch.setenv("STEP_TIMEOUTS", '{"optimize": 0.05}')
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+    _clear_runner_settings()
+    try:
+        with pytest.raises(StepTimeoutError, match="optimize"):
+            await PipelineRunner().run("slow", RunInput(requirements="req"))
+    finally:
+        _clear_runner_settings()
+    record = json.loads((artifacts.runs_root() / "slow" / "run.json").read_text())
+    assert record["steps"]["optimize"]["status"] == "timed_out"
+    assert record["steps"]["standards"]["status"] == "success"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runner_cancellation_marks_steps(monkeypatch, tmp_path):
+    import asyncio
+
+    started = asyncio.Event()
+
+    async def hanging_chat_completion(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(llm_client.CloudRuLLMClient, "chat_completion", hanging_chat_completion)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path))
+    import app.config as app_config
+
+    app_config.get_settings.cache_clear()
+
+    task = asyncio.create_task(PipelineRunner().run("cancel", RunInput(requirements="req")))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    record = json.loads((artifacts.runs_root() / "cancel" / "run.json").read_text())
+    assert {step["status"] for step in record["steps"].values()} == {"cancelled"}
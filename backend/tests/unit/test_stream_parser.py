@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+from app.llm.stream import IncrementalJsonParser
+
+
+def test_parser_yields_cases_as_they_close():
+    parser = IncrementalJsonParser(["cases"])
+    doc = '{"meta": {"cases": [{"x": 1}]}, "cases": [{"title": "a {b}", "steps": ["say \\"}\\""]}, {"title": "c"}]}'
+    first_close = doc.index('{"title": "c"}')
+    items = []
+    for idx, char in enumerate(doc):
+        items.extend(parser.feed(char))
+        if idx == first_close:
+            assert len(items) == 1
+    assert items == [
+        ("cases", {"title": "a {b}", "steps": ['say "}"']}),
+        ("cases", {"title": "c"}),
+    ]
+
+
+def test_parser_tracks_multiple_keys():
+    parser = IncrementalJsonParser(["ui", "api"])
+    items = parser.feed('{"ui": [{"name": "u1"}], "other": [{"n": 0}], "api": [{"name": "a1"}, {"name": "a2"}]}')
+    assert [kind for kind, _ in items] == ["ui", "api", "api"]
@@ -0,0 +1,51 @@
+import asyncio
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from app.utils.tracing import current_span, span, start_trace, to_otlp
+
+
+def test_span_is_noop_outside_trace():
+    with span("orphan") as child:
+        assert child is None
+    assert current_span() is None
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks():
+    async def step(name):
+        with span(f"step.{name}", step=name):
+            await asyncio.sleep(0)
+            with span("llm.call", agent=name) as call:
+                call.set(tokens=3)
+
+    with start_trace("run", run_id="r1") as root:
+        await asyncio.gather(step("a"), step("b"))
+    trace = root.to_dict()
+    assert [child["name"] for child in trace["children"]] == ["step.a", "step.b"]
+    for child in trace["children"]:
+        assert child["parent_id"] == trace["span_id"]
+        assert child["children"][0]["attributes"]["tokens"] == 3
+        assert child["children"][0]["trace_id"] == trace["trace_id"]
+    assert current_span() is None
+
+
+def test_failed_span_and_otlp_export():
+    with pytest.raises(ValueError):
+        with start_trace("run") as root:
+            with span("step.x", retries=1, cached=False):
+                raise ValueError("boom")
+    trace = root.to_dict()
+    assert trace["status"] == "error"
+    assert trace["children"][0]["error"] == "ValueError: boom"
+
+    spans = to_otlp(trace)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [item["name"] for item in spans] == ["run", "step.x"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[1]["status"]["code"] == 2
+    attributes = {attr["key"]: attr["value"] for attr in spans[1]["attributes"]}
+    assert attributes == {"retries": {"intValue": "1"}, "cached": {"boolValue": False}}
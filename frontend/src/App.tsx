@@ -19,6 +19,15 @@ type RunRecord = {
   updated_at: string
 }
 
+type RunSummary = {
+  id: string
+  status: string
+  model?: string | null
+  created_at: string
+  updated_at: string
+  steps: Record<string, string>
+}
+
 const stepOrder = ['analyst', 'manual', 'autotests', 'standards', 'optimize']
 
 const statusBadge = (status: string) => {
@@ -36,7 +45,7 @@ function App() {
   const [openapi, setOpenapi] = useState('')
   const [model, setModel] = useState('')
   const [models, setModels] = useState<string[]>([])
-  const [runs, setRuns] = useState<string[]>([])
+  const [runs, setRuns] = useState<RunSummary[]>([])
   const [currentRun, setCurrentRun] = useState<RunRecord | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
@@ -58,7 +67,7 @@ function App() {
   }, [])
 
   const fetchRun = async (id: string) => {
-    const resp = await fetch(`${backend}/runs/${id}`)
+    const resp = await fetch(`${backend}/runs/${id}?include=run.json`)
     const data = await resp.json()
     const runRaw = data.files?.['run.json']
     if (runRaw) {
@@ -130,8 +139,9 @@ function App() {
           <div className="text-xs uppercase text-slate-400">Runs</div>
           <div className="space-y-2">
             {runs.map((r) => (
-              <button key={r} className="w-full text-left bg-slate-800 hover:bg-slate-700 p-2 rounded" onClick={() => fetchRun(typeof r === 'string' ? r : JSON.parse(r).id)}>
-                {typeof r === 'string' ? r : JSON.parse(r).id}
+              <button key={r.id} className="w-full text-left bg-slate-800 hover:bg-slate-700 p-2 rounded flex justify-between gap-2" onClick={() => fetchRun(r.id)}>
+                <span className="truncate">{r.id}</span>
+                <span className="text-xs text-slate-400">{r.status}</span>
               </button>
             ))}
           </div>